@@ -146,6 +146,76 @@ class Utils():
         return co + (no.normalized() * v)
 
 
+class TextureSampler():
+    # pixels of images read once, key is checked for changes, images with unsaved changes are always read again
+    cache = {}
+    
+    def __init__(self, image, interpolation='Closest', extension='REPEAT', ):
+        # interpolation and extension as in image texture node, anything else than 'Closest' is bilinear, 'REPEAT' wraps uvs, anything else clamps
+        self.pixels = self.image_pixels(image)
+        self.bilinear = (interpolation != 'Closest')
+        self.wrap = (extension == 'REPEAT')
+    
+    @classmethod
+    def image_pixels(cls, image, ):
+        # image has no update counter exposed, so size, source and file is what can be checked
+        key = (tuple(image.size), image.source, image.filepath_raw, )
+        c = cls.cache.get(image.name)
+        if(c is not None and c[0] == key and not image.is_dirty):
+            return c[1]
+        
+        image.update()
+        w, h = image.size
+        a = np.zeros(w * h * 4, dtype=np.float32, )
+        image.pixels.foreach_get(a)
+        a.shape = (h, w, 4)
+        if(image.is_dirty):
+            cls.cache.pop(image.name, None)
+        else:
+            cls.cache[image.name] = (key, a, )
+        return a
+    
+    @classmethod
+    def clear(cls):
+        cls.cache = {}
+    
+    def _index(self, i, n, ):
+        if(self.wrap):
+            return i % n
+        return np.clip(i, 0, n - 1, )
+    
+    def sample(self, uvs, ):
+        # rgba at uv coordinates, (n, 2) in, (n, 4) float32 out
+        a = self.pixels
+        h, w = a.shape[:2]
+        x = np.asarray(uvs[:, 0], dtype=np.float64, ) * w
+        y = np.asarray(uvs[:, 1], dtype=np.float64, ) * h
+        if(not self.bilinear):
+            return a[self._index(np.floor(y).astype(np.int64), h), self._index(np.floor(x).astype(np.int64), w)]
+        
+        # bilinear between centers of four nearest pixels
+        x -= 0.5
+        y -= 0.5
+        x0 = np.floor(x)
+        y0 = np.floor(y)
+        fx = (x - x0).astype(np.float32)[:, np.newaxis]
+        fy = (y - y0).astype(np.float32)[:, np.newaxis]
+        x0 = x0.astype(np.int64)
+        y0 = y0.astype(np.int64)
+        xa = self._index(x0, w)
+        xb = self._index(x0 + 1, w)
+        ya = self._index(y0, h)
+        yb = self._index(y0 + 1, h)
+        r = a[ya, xa] * (1.0 - fx)
+        r += a[ya, xb] * fx
+        r *= (1.0 - fy)
+        t = a[yb, xa] * (1.0 - fx)
+        t += a[yb, xb] * fx
+        t *= fy
+        r += t
+        return r
+
+
 class Progress():
     def __init__(self, total, indent=0, prefix="> ", ):
         self.current = 0
@@ -775,57 +845,21 @@ class CARBON_OT_texture_to_vertex_colors(Operator):
     def execute(self, context):
         log(self.bl_idname, 0)
         
-        def remap(v, min1, max1, min2, max2):
-            def clamp(v, vmin, vmax):
-                if(vmax <= vmin):
-                    raise ValueError("Maximum value is smaller than or equal to minimum.")
-                if(v <= vmin):
-                    return vmin
-                if(v >= vmax):
-                    return vmax
-                return v
-            
-            def normalize(v, vmin, vmax):
-                return (v - vmin) / (vmax - vmin)
-            
-            def interpolate(nv, vmin, vmax):
-                return vmin + (vmax - vmin) * nv
-            
-            v = clamp(v, min1, max1)
-            r = interpolate(normalize(v, min1, max1), min2, max2)
-            r = clamp(r, min2, max2)
-            return r
-        
         o = context.active_object
         m = o.active_material
         n = m.node_tree.nodes.active
         im = n.image
-        im.update()
-        w, h = im.size
-        
-        a = np.asarray(im.pixels)
-        a = a.reshape((h, w, 4))
-        
-        o.data.vertex_colors.new(name=im.name)
-        bm = bmesh.new()
-        bm.from_mesh(o.data)
-        col_layer = bm.loops.layers.color.active
-        uvl = bm.loops.layers.uv.active
-        fs = bm.faces
-        uv_layers = o.data.uv_layers
+        texture = TextureSampler(im, n.interpolation, n.extension, )
         
-        prgs = Progress(len(fs), 1)
-        for f in fs:
-            prgs.step()
-            ls = f.loops
-            for l in ls:
-                x, y = l[uvl].uv.to_tuple()
-                xx = int(round(remap(x, 0.0, 1.0, 0, w - 1)))
-                yy = int(round(remap(y, 0.0, 1.0, 0, h - 1)))
-                l[col_layer] = a[yy][xx]
+        me = o.data
+        uvs = np.zeros(len(me.loops) * 2, dtype=np.float32, )
+        me.uv_layers.active.data.foreach_get("uv", uvs, )
+        uvs.shape = (-1, 2)
+        cs = texture.sample(uvs)
         
-        bm.to_mesh(o.data)
-        bm.free()
+        col_layer = me.vertex_colors.new(name=im.name)
+        col_layer.data.foreach_set("color", cs.ravel(), )
+        me.update()
         log("done.", 1)
         
         return {'FINISHED'}
@@ -1409,6 +1443,7 @@ def register():
 def unregister():
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
+    TextureSampler.clear()
 
 
 if __name__ == "__main__":
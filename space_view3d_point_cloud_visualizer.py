@@ -38,20 +38,22 @@ import numpy as np
 import re
 import shutil
 import sys
-import random
-import statistics
+import itertools
+import zlib
+import concurrent.futures
+import threading
+import collections
 
 import bpy
 import bmesh
 from bpy.props import PointerProperty, BoolProperty, StringProperty, FloatProperty, IntProperty, FloatVectorProperty, EnumProperty, CollectionProperty
 from bpy.types import PropertyGroup, Panel, Operator, AddonPreferences, UIList
 import gpu
-from gpu.types import GPUOffScreen, GPUShader, GPUBatch, GPUVertBuf, GPUVertFormat
+from gpu.types import GPUOffScreen, GPUShader, GPUBatch, GPUVertBuf, GPUVertFormat, GPUIndexBuf
 from gpu_extras.batch import batch_for_shader
 from bpy.app.handlers import persistent
 import bgl
-from mathutils import Matrix, Vector, Quaternion, Color
-from bpy_extras.object_utils import world_to_camera_view
+from mathutils import Matrix, Vector, Color
 from bpy_extras.io_utils import axis_conversion, ExportHelper
 from mathutils.kdtree import KDTree
 from mathutils.geometry import barycentric_transform
@@ -173,218 +175,93 @@ class PCMeshInstancerMeshGenerator():
             return [(0, 0, 0, ), ], [], []
 
 
-class PCMeshInstancer():
-    def __init__(self, name, points, generator=None, matrix=None, size=0.01, normal_align=False, vcols=False, ):
-        log("{}:".format(self.__class__.__name__), 0, )
-        
-        self.name = name
-        self.points = points
-        if(generator is None):
-            generator = PCMeshInstancerMeshGenerator()
-        self.generator = generator
-        if(matrix is None):
-            matrix = Matrix()
-        self.matrix = matrix
-        self.size = size
-        self.normal_align = normal_align
-        self.vcols = vcols
-        
-        self.uuid = uuid.uuid1()
-        
-        log("calculating matrices..", 1)
-        self.calc_matrices()
-        
-        log("calculating mesh..", 1)
-        self.calc_mesh_data()
-        
-        log("creating mesh..", 1)
-        self.mesh = bpy.data.meshes.new(self.name)
-        self.mesh.from_pydata(self.verts, self.edges, self.faces)
-        self.object = self.add_object(self.name, self.mesh)
-        self.object.matrix_world = self.matrix
-        self.activate_object(self.object)
-        
-        if(self.vcols):
-            log("making vertex colors..", 1)
-            self.make_vcols()
-        
-        log("cleanup..", 1)
-        
-        context = bpy.context
-        view_layer = context.view_layer
-        collection = view_layer.active_layer_collection.collection
-        collection.objects.unlink(self.def_object)
-        bpy.data.objects.remove(self.def_object)
-        bpy.data.meshes.remove(self.def_mesh)
-        
-        log("done.", 1)
+class PCMeshWriter():
+    # bulk mesh writing from numpy arrays, everything goes through foreach_set, no per element python
+    normal_attribute = 'pcv_normal'
+    color_attribute = 'pcv_color'
     
-    def add_object(self, name, data, ):
-        so = bpy.context.scene.objects
-        for i in so:
-            i.select_set(False)
-        o = bpy.data.objects.new(name, data)
-        context = bpy.context
-        view_layer = context.view_layer
-        collection = view_layer.active_layer_collection.collection
-        collection.objects.link(o)
-        o.select_set(True)
-        view_layer.objects.active = o
-        return o
+    @staticmethod
+    def _flat(a, dtype=np.float32, ):
+        return np.ascontiguousarray(a, dtype=dtype, ).reshape(-1)
     
-    def activate_object(self, obj, ):
-        bpy.ops.object.select_all(action='DESELECT')
-        context = bpy.context
-        view_layer = context.view_layer
-        obj.select_set(True)
-        view_layer.objects.active = obj
+    @classmethod
+    def vertices(cls, me, vs, ):
+        me.vertices.add(len(vs))
+        me.vertices.foreach_set("co", cls._flat(vs), )
     
-    def calc_matrices(self):
-        def split(p):
-            co = (p[0], p[1], p[2])
-            no = (p[3], p[4], p[5])
-            rgb = (p[6], p[7], p[8])
-            return co, no, rgb
-        
-        def rotation_to(a, b):
-            # http://stackoverflow.com/questions/1171849/finding-quaternion-representing-the-rotation-from-one-vector-to-another
-            # https://github.com/toji/gl-matrix/blob/f0583ef53e94bc7e78b78c8a24f09ed5e2f7a20c/src/gl-matrix/quat.js#L54
-            
-            a = a.normalized()
-            b = b.normalized()
-            q = Quaternion()
-            
-            tmpvec3 = Vector()
-            xUnitVec3 = Vector((1, 0, 0))
-            yUnitVec3 = Vector((0, 1, 0))
-            
-            dot = a.dot(b)
-            if(dot < -0.999999):
-                tmpvec3 = xUnitVec3.cross(a)
-                if(tmpvec3.length < 0.000001):
-                    tmpvec3 = yUnitVec3.cross(a)
-                tmpvec3.normalize()
-                q = Quaternion(tmpvec3, math.pi)
-            elif(dot > 0.999999):
-                q.x = 0
-                q.y = 0
-                q.z = 0
-                q.w = 1
-            else:
-                tmpvec3 = a.cross(b)
-                q.x = tmpvec3[0]
-                q.y = tmpvec3[1]
-                q.z = tmpvec3[2]
-                q.w = 1 + dot
-                q.normalize()
-            return q
-        
-        _, _, osv = self.matrix.decompose()
-        osm = Matrix(((osv.x, 0.0, 0.0, 0.0), (0.0, osv.y, 0.0, 0.0), (0.0, 0.0, osv.z, 0.0), (0.0, 0.0, 0.0, 1.0))).inverted()
-        
-        # calculate instance matrices from points..
-        self.matrices = []
-        for i, p in enumerate(self.points):
-            co, no, rgb = split(p)
-            # location
-            ml = Matrix.Translation(co).to_4x4()
-            if(self.normal_align):
-                # rotation from normal
-                quat = rotation_to(Vector((0, 0, 1)), Vector(no))
-                mr = quat.to_matrix().to_4x4()
-            else:
-                mr = Matrix.Rotation(0.0, 4, 'Z')
-            # scale
-            s = self.size
-            ms = Matrix(((s, 0.0, 0.0, 0.0), (0.0, s, 0.0, 0.0), (0.0, 0.0, s, 0.0), (0.0, 0.0, 0.0, 1.0)))
-            # combine
-            m = ml @ mr @ ms @ osm
-            self.matrices.append(m)
-    
-    def calc_mesh_data(self):
-        # initialize lists
-        l = len(self.matrices)
-        self.verts = [(0, 0, 0)] * (l * len(self.generator.def_verts))
-        self.edges = [(0, 0)] * (l * len(self.generator.def_edges))
-        self.faces = [(0)] * (l * len(self.generator.def_faces))
-        self.colors = [None] * l
-        
-        # generator data
-        v, e, f = self.generator.generate()
-        self.def_verts = v
-        self.def_edges = e
-        self.def_faces = f
-        
-        # def object
-        self.def_mesh = bpy.data.meshes.new("PCInstancer-def_mesh-{}".format(self.uuid))
-        self.def_mesh.from_pydata(v, e, f)
-        self.def_object = self.add_object("PCInstancer-def_object-{}".format(self.uuid), self.def_mesh)
-        
-        # loop over matrices
-        for i, m in enumerate(self.matrices):
-            # transform mesh
-            self.def_mesh.transform(m)
-            # store
-            self.write_pydata_chunk(i)
-            # reset mesh
-            for j, v in enumerate(self.def_object.data.vertices):
-                v.co = Vector(self.def_verts[j])
-    
-    def write_pydata_chunk(self, i, ):
-        # exponents
-        ev = len(self.generator.def_verts)
-        ee = len(self.generator.def_edges)
-        ef = len(self.generator.def_faces)
-        # vertices
-        for j in range(ev):
-            self.verts[(i * ev) + j] = self.def_mesh.vertices[j].co.to_tuple()
-        # edges
-        if(len(self.def_edges) is not 0):
-            for j in range(ee):
-                self.edges[(i * ee) + j] = ((i * ev) + self.def_edges[j][0],
-                                            (i * ev) + self.def_edges[j][1], )
-        # faces
-        if(len(self.def_faces) is not 0):
-            for j in range(ef):
-                # tris
-                if(len(self.def_faces[j]) == 3):
-                    self.faces[(i * ef) + j] = ((i * ev) + self.def_faces[j][0],
-                                                (i * ev) + self.def_faces[j][1],
-                                                (i * ev) + self.def_faces[j][2], )
-                # quads
-                elif(len(self.def_faces[j]) == 4):
-                    self.faces[(i * ef) + j] = ((i * ev) + self.def_faces[j][0],
-                                                (i * ev) + self.def_faces[j][1],
-                                                (i * ev) + self.def_faces[j][2],
-                                                (i * ev) + self.def_faces[j][3], )
-                # ngons
-                else:
-                    ngon = []
-                    for a in range(len(self.def_faces[j])):
-                        ngon.append((i * ev) + self.def_faces[j][a])
-                    self.faces[(i * ef) + j] = tuple(ngon)
-    
-    def make_vcols(self):
-        if(len(self.mesh.loops) != 0):
-            colors = []
-            for i, v in enumerate(self.points):
-                rgb = (v[6], v[7], v[8])
-                col = (rgb[0] / 255.0, rgb[1] / 255.0, rgb[2] / 255.0)
-                colors.append(col)
-            
-            num = len(self.def_verts)
-            vc = self.mesh.vertex_colors.new()
-            for l in self.mesh.loops:
-                vi = l.vertex_index
-                li = l.index
-                c = colors[int(vi / num)]
-                vc.data[li].color = c + (1.0, )
-        else:
+    @classmethod
+    def polygons(cls, me, loops, loop_start, loop_total, ):
+        # NOTE: remember that in future: from_pydata does NOT accept numpy arrays, https://developer.blender.org/T51585
+        # NOTE: so passing ndarray.tolist() to from_pydata is VERY slow, so recreate interesting bits from from_pydata implementation without using itertools
+        me.loops.add(len(loops))
+        me.polygons.add(len(loop_total))
+        me.loops.foreach_set("vertex_index", cls._flat(loops, np.int32, ), )
+        me.polygons.foreach_set("loop_start", cls._flat(loop_start, np.int32, ), )
+        me.polygons.foreach_set("loop_total", cls._flat(loop_total, np.int32, ), )
+        me.update(calc_edges=True, )
+    
+    @classmethod
+    def vertex_normals(cls, me, ns, ):
+        # loopless mesh has no normals to calculate from, vertex normals are writable up to blender 3.0
+        try:
+            me.vertices.foreach_set("normal", cls._flat(ns), )
+        except Exception:
+            log("vertex normals are not writable in this blender version", 2, )
+            return False
+        return True
+    
+    @classmethod
+    def rgba(cls, cs, ):
+        cs = np.asarray(cs, dtype=np.float32, )
+        if(cs.shape[1] == 3):
+            cs = np.column_stack((cs, np.ones(len(cs), dtype=np.float32, ), ))
+        return cs
+    
+    @classmethod
+    def loop_colors(cls, me, cs, loops_per_point=1, name="Col", ):
+        # point colors repeated for each consecutive block of loops, i.e. for all loops of an instance
+        if(len(me.loops) == 0):
             log("no mesh loops in mesh", 2, )
+            return None
+        cs = cls.rgba(cs)
+        if(loops_per_point != 1):
+            cs = np.repeat(cs, loops_per_point, axis=0, )
+        vc = me.vertex_colors.new(name=name, )
+        vc.data.foreach_set("color", cls._flat(cs), )
+        return vc
+    
+    @classmethod
+    def has_attributes(cls, me, ):
+        # generic attributes are available since blender 2.91
+        return hasattr(me, 'attributes')
+    
+    @classmethod
+    def point_attributes(cls, me, ns=None, cs=None, ):
+        # per vertex normals and colors, loopless meshes can't carry vertex colors
+        if(not cls.has_attributes(me)):
+            log("mesh attributes are not supported in this blender version", 2, )
+            return False
+        if(ns is not None):
+            a = me.attributes.new(cls.normal_attribute, 'FLOAT_VECTOR', 'POINT', )
+            a.data.foreach_set("vector", cls._flat(ns), )
+        if(cs is not None):
+            a = me.attributes.new(cls.color_attribute, 'FLOAT_COLOR', 'POINT', )
+            a.data.foreach_set("color", cls._flat(cls.rgba(cs)), )
+        return True
+    
+    @classmethod
+    def int_layer(cls, me, name, values, ):
+        # per vertex integers, generic attribute if available, legacy int layer otherwise, both are bmesh int layers in edit mode
+        if(cls.has_attributes(me)):
+            a = me.attributes.new(name, 'INT', 'POINT', )
+        else:
+            a = me.vertex_layers_int.new(name=name, )
+        a.data.foreach_set("value", cls._flat(values, np.int32, ), )
 
 
 class PCMeshInstancer2():
-    def __init__(self, name, vs, ns=None, cs=None, generator=None, matrix=None, size=0.01, with_normal_align=False, with_vertex_colors=False, ):
+    # all instances at once, (n, 4, 4) instance matrices, generator mesh broadcast through them, indices by offset arithmetic, mesh filled with foreach_set
+    def __init__(self, name, vs, ns=None, cs=None, generator=None, matrix=None, size=0.01, with_normal_align=False, with_vertex_colors=False, chunk_size=100000, ):
         log("{}:".format(self.__class__.__name__), 0, )
         
         self.name = name
@@ -410,8 +287,7 @@ class PCMeshInstancer2():
         self.size = size
         self.with_normal_align = with_normal_align
         self.with_vertex_colors = with_vertex_colors
-        
-        self.uuid = uuid.uuid1()
+        self.chunk_size = chunk_size
         
         log("matrices..", 1)
         self.calc_matrices()
@@ -424,134 +300,94 @@ class PCMeshInstancer2():
             self.make_colors()
         log("done.", 1)
     
+    @staticmethod
+    def rotations_to(ns):
+        # shortest arc rotations from z axis to normals as (n, 3, 3) matrices, same cases as quaternion rotation_to from gl-matrix
+        # https://github.com/toji/gl-matrix/blob/f0583ef53e94bc7e78b78c8a24f09ed5e2f7a20c/src/gl-matrix/quat.js#L54
+        l = len(ns)
+        b = np.array(ns, dtype=np.float64, )
+        d = np.sqrt(np.einsum('ij,ij->i', b, b, ))
+        d[d == 0.0] = 1.0
+        b /= d[:, np.newaxis]
+        dot = b[:, 2]
+        # w, x, y, z, vector part is cross((0, 0, 1), b)
+        q = np.zeros((l, 4), dtype=np.float64, )
+        q[:, 0] = 1.0 + dot
+        q[:, 1] = -b[:, 1]
+        q[:, 2] = b[:, 0]
+        # opposite, half turn around cross((1, 0, 0), (0, 0, 1))
+        q[dot < -0.999999] = (0.0, 0.0, -1.0, 0.0)
+        q[dot > 0.999999] = (1.0, 0.0, 0.0, 0.0)
+        q /= np.sqrt(np.einsum('ij,ij->i', q, q, ))[:, np.newaxis]
+        w, x, y, z = q.T
+        r = np.empty((l, 3, 3), dtype=np.float64, )
+        r[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+        r[:, 0, 1] = 2.0 * (x * y - z * w)
+        r[:, 0, 2] = 2.0 * (x * z + y * w)
+        r[:, 1, 0] = 2.0 * (x * y + z * w)
+        r[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+        r[:, 1, 2] = 2.0 * (y * z - x * w)
+        r[:, 2, 0] = 2.0 * (x * z - y * w)
+        r[:, 2, 1] = 2.0 * (y * z + x * w)
+        r[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+        return r
+    
     def calc_matrices(self):
-        def rotation_to(a, b):
-            # http://stackoverflow.com/questions/1171849/finding-quaternion-representing-the-rotation-from-one-vector-to-another
-            # https://github.com/toji/gl-matrix/blob/f0583ef53e94bc7e78b78c8a24f09ed5e2f7a20c/src/gl-matrix/quat.js#L54
-            
-            a = a.normalized()
-            b = b.normalized()
-            q = Quaternion()
-            
-            tmpvec3 = Vector()
-            xUnitVec3 = Vector((1, 0, 0))
-            yUnitVec3 = Vector((0, 1, 0))
-            
-            dot = a.dot(b)
-            if(dot < -0.999999):
-                tmpvec3 = xUnitVec3.cross(a)
-                if(tmpvec3.length < 0.000001):
-                    tmpvec3 = yUnitVec3.cross(a)
-                tmpvec3.normalize()
-                q = Quaternion(tmpvec3, math.pi)
-            elif(dot > 0.999999):
-                q.x = 0
-                q.y = 0
-                q.z = 0
-                q.w = 1
-            else:
-                tmpvec3 = a.cross(b)
-                q.x = tmpvec3[0]
-                q.y = tmpvec3[1]
-                q.z = tmpvec3[2]
-                q.w = 1 + dot
-                q.normalize()
-            return q
-        
+        # translation @ rotation @ scale @ inverted object scale
         _, _, osv = self.matrix.decompose()
-        osm = Matrix(((osv.x, 0.0, 0.0, 0.0), (0.0, osv.y, 0.0, 0.0), (0.0, 0.0, osv.z, 0.0), (0.0, 0.0, 0.0, 1.0))).inverted()
+        sc = np.array((self.size / osv.x, self.size / osv.y, self.size / osv.z, ), dtype=np.float64, )
         
         vs = self.vs
         ns = self.ns
-        s = self.size
-        with_normal_align = self.with_normal_align
-        
-        matrices = np.zeros((len(vs), 4, 4), dtype=np.float, )
-        for i, co in enumerate(vs):
-            no = ns[i]
-            ml = Matrix.Translation(co).to_4x4()
-            if(with_normal_align):
-                q = rotation_to(Vector((0, 0, 1)), Vector(no))
-                mr = q.to_matrix().to_4x4()
-            else:
-                mr = Matrix.Rotation(0.0, 4, 'Z')
-            ms = Matrix(((s, 0.0, 0.0, 0.0), (0.0, s, 0.0, 0.0), (0.0, 0.0, s, 0.0), (0.0, 0.0, 0.0, 1.0)))
-            m = ml @ mr @ ms @ osm
-            matrices[i] = np.array(m, dtype=np.float, )
+        l = len(vs)
+        c = self.chunk_size
+        
+        matrices = np.zeros((l, 4, 4), dtype=np.float32, )
+        matrices[:, 3, 3] = 1.0
+        matrices[:, :3, 3] = vs
+        if(self.with_normal_align):
+            for i in range(0, l, c):
+                matrices[i:i + c, :3, :3] = self.rotations_to(ns[i:i + c]) * sc
+        else:
+            matrices[:, :3, :3] = np.diag(sc)
         
         self.matrices = matrices
     
     def calc_mesh(self):
         matrices = self.matrices
+        n = len(matrices)
+        c = self.chunk_size
         
         gv, _, gf = self.generator.generate()
-        me = bpy.data.meshes.new('tmp-{}'.format(self.uuid))
-        me.from_pydata(gv, [], gf)
-        bm = bmesh.new()
-        bm.from_mesh(me)
-        bmesh.ops.triangulate(bm, faces=bm.faces)
-        bm.to_mesh(me)
-        bm.free()
-        
-        gv = np.zeros((len(me.vertices) * 3), dtype=np.float, )
-        me.vertices.foreach_get("co", gv, )
-        gv.shape = (len(me.vertices), 3, )
-        gf = np.zeros((len(me.polygons) * 3), dtype=np.int, )
-        me.polygons.foreach_get("vertices", gf, )
-        gf.shape = (len(me.polygons), 3, )
+        gv = np.array(gv, dtype=np.float32, )
+        # faces of any length, flattened to loops
+        gl = np.array([i for f in gf for i in f], dtype=np.int32, )
+        gt = np.array([len(f) for f in gf], dtype=np.int32, )
+        gs = np.zeros(len(gt), dtype=np.int32, )
+        gs[1:] = np.cumsum(gt)[:-1]
         
         self.g_vs_chunk_length = len(gv)
-        self.g_fs_chunk_length = len(gf)
-        
-        zgv = gv[:]
-        zgv.shape = (-1, )
-        
-        vs = np.zeros((len(matrices) * len(gv) * 3), dtype=np.float, )
-        fs = np.zeros((len(matrices) * len(gf) * 3), dtype=np.int, )
-        
-        cos = np.zeros((len(me.vertices) * 3), dtype=np.float, )
-        fis = np.zeros((len(me.polygons) * 3), dtype=np.int, )
-        for i, m in enumerate(matrices):
-            # doesn't work when passing ndarray directly
-            me.transform(Matrix(m))
-            
-            me.vertices.foreach_get("co", cos)
-            vs[i * len(cos):(i * len(cos)) + len(cos)] = cos
-            me.polygons.foreach_get("vertices", fis, )
-            fis += (i * len(me.vertices), )
-            fs[i * len(fis):(i * len(fis)) + len(fis)] = fis
-            
-            me.vertices.foreach_set("co", zgv)
-        
-        self.g_vs = vs
-        self.g_fs = fs
-        
-        bpy.data.meshes.remove(me)
+        self.g_ls_chunk_length = len(gl)
+        self.g_fs_chunk_length = len(gt)
+        
+        vs = np.empty((n, len(gv), 3), dtype=np.float32, )
+        for i in range(0, n, c):
+            m = matrices[i:i + c]
+            # broadcast generator vertices through all rotation/scale parts, batched matmul is many times faster than equivalent einsum
+            np.matmul(gv, m[:, :3, :3].transpose(0, 2, 1), out=vs[i:i + c], )
+            vs[i:i + c] += m[:, np.newaxis, :3, 3]
+        
+        # per instance offsets to generator indices
+        o = np.arange(n, dtype=np.int32, )
+        self.g_vs = vs.reshape(-1)
+        self.g_ls = (gl[np.newaxis, :] + (o * len(gv))[:, np.newaxis]).reshape(-1)
+        self.g_fs_start = (gs[np.newaxis, :] + (o * len(gl))[:, np.newaxis]).reshape(-1)
+        self.g_fs_total = np.tile(gt, n)
     
     def make_mesh(self):
         me = bpy.data.meshes.new(self.name)
-        
-        # NOTE: remember that in future: from_pydata does NOT accept numpy arrays, https://developer.blender.org/T51585
-        # NOTE: so passing ndarray.tolist() to from_pydata is VERY slow, so recreate interesting bits from from_pydata implementation without using itertools
-        
-        vertices = self.g_vs
-        faces = self.g_fs
-        
-        vl = int(len(vertices) / 3)
-        fl = int(len(faces) / 3)
-        me.vertices.add(vl)
-        me.loops.add(fl * 3)
-        me.polygons.add(fl)
-        
-        face_lengths = np.full(fl, 3, dtype=np.int, )
-        loop_starts = np.arange(0, fl * 3, 3, dtype=np.int, )
-        
-        me.vertices.foreach_set("co", vertices)
-        me.polygons.foreach_set("loop_total", face_lengths)
-        me.polygons.foreach_set("loop_start", loop_starts)
-        me.polygons.foreach_set("vertices", faces)
-        
-        me.validate()
+        PCMeshWriter.vertices(me, self.g_vs.reshape(-1, 3), )
+        PCMeshWriter.polygons(me, self.g_ls, self.g_fs_start, self.g_fs_total, )
         
         so = bpy.context.scene.objects
         for i in so:
@@ -570,17 +406,8 @@ class PCMeshInstancer2():
         self.object = o
     
     def make_colors(self):
-        fl = self.g_fs_chunk_length
-        me = self.mesh
-        cs = self.cs
-        
-        indexes = np.indices((len(cs), ), dtype=np.int, )
-        cols = np.take(cs, indexes, axis=0, )
-        cols = cols.repeat(fl * 3, axis=1, )
-        cols.shape = (-1, )
-        
-        vc = me.vertex_colors.new()
-        vc.data.foreach_set("color", cols)
+        # each instance loops get its point color
+        PCMeshWriter.loop_colors(self.mesh, self.cs, self.g_ls_chunk_length, )
 
 
 class PCInstancer():
@@ -746,6 +573,50 @@ class PCInstancer():
         log("completed in {}.".format(_d), 1)
 
 
+class PCPointInstancer():
+    def __init__(self, o, mesh_size, base_sphere_subdivisions, normal_align=False, ):
+        # vertex instancing on vertex only mesh, colors are read from point attribute of instancer by material, nothing is baked
+        log("{}:".format(self.__class__.__name__), 0, )
+        _t = time.time()
+        
+        base_sphere_radius = mesh_size / 2
+        
+        log("making ico sphere instance mesh with material..", 1)
+        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=base_sphere_subdivisions, radius=base_sphere_radius, location=(0, 0, 0), )
+        sphere = bpy.context.active_object
+        sphere.parent = o
+        
+        mat = bpy.data.materials.new('PCPointInstancerMaterial')
+        sphere.data.materials.append(mat)
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        for node in nodes:
+            nodes.remove(node)
+        links = mat.node_tree.links
+        node_attr = nodes.new(type='ShaderNodeAttribute')
+        node_attr.attribute_name = PCMeshWriter.color_attribute
+        if(hasattr(node_attr, 'attribute_type')):
+            node_attr.attribute_type = 'INSTANCER'
+        else:
+            log("instancer attributes are not supported in this blender version, instances will not be colored", 2, )
+        node_diff = nodes.new(type='ShaderNodeBsdfDiffuse')
+        link = links.new(node_attr.outputs[0], node_diff.inputs[0])
+        node_output = nodes.new(type='ShaderNodeOutputMaterial')
+        link = links.new(node_diff.outputs[0], node_output.inputs[0])
+        
+        # make instancer
+        o.instance_type = 'VERTS'
+        o.use_instance_vertices_rotation = normal_align
+        o.show_instancer_for_render = False
+        
+        bpy.ops.object.select_all(action='DESELECT')
+        o.select_set(True)
+        bpy.context.view_layer.objects.active = o
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+
+
 class PCParticles():
     def __init__(self, o, mesh_size, base_sphere_subdivisions, ):
         log("{}:".format(self.__class__.__name__), 0, )
@@ -1059,38 +930,25 @@ class PlyPointCloudReader():
         'string': 's',
     }
     
-    def __init__(self, path, ):
-        log("{}:".format(self.__class__.__name__), 0)
+    def __init__(self, path, quiet=False, ):
+        # quiet reader does not log, log reads bpy debug value and reader can run in worker thread
+        self.quiet = quiet
+        self._log("{}:".format(self.__class__.__name__), 0)
         if(os.path.exists(path) is False or os.path.isdir(path) is True):
             raise OSError("did you point me to an imaginary file? ('{}')".format(path))
         
         self.path = path
-        log("will read file at: '{}'".format(self.path), 1)
-        log("reading header..", 1)
+        self._log("will read file at: '{}'".format(self.path), 1)
+        self._log("reading header..", 1)
         self._header()
-        log("reading data..", 1)
+        self._log("reading data..", 1)
         if(self._ply_format == 'ascii'):
             self._data_ascii()
         else:
             self._data_binary()
-        log("loaded {} vertices".format(len(self.points)), 1)
+        self._log("loaded {} vertices".format(len(self.points)), 1)
         
-        # remove alpha if present (meshlab adds it)
-        self.points = self.points[[b for b in list(self.points.dtype.names) if b != 'alpha']]
-        
-        # rename diffuse_rgb to rgb, if present
-        user_rgb = ('diffuse_red', 'diffuse_green', 'diffuse_blue', )
-        names = self.points.dtype.names
-        ls = list(names)
-        if(set(user_rgb).issubset(names)):
-            for ci, uc in enumerate(user_rgb):
-                for i, v in enumerate(ls):
-                    if(v == uc):
-                        ls[i] = ls[i].replace('diffuse_', '', )
-        self.points.dtype.names = tuple(ls)
-        
-        # remove anything that is not (x, y, z, nx, ny, nz, red, green, blue) to prevent problems later
-        self.points = self.points[[b for b in list(self.points.dtype.names) if b in ('x', 'y', 'z', 'nx', 'ny', 'nz', 'red', 'green', 'blue', )]]
+        self.points = self._clean(self.points)
         
         # some info
         nms = self.points.dtype.names
@@ -1103,11 +961,34 @@ class PlyPointCloudReader():
             self.has_normals = False
         if(not set(('red', 'green', 'blue')).issubset(nms)):
             self.has_colors = False
-        log('has_vertices: {}'.format(self.has_vertices), 2)
-        log('has_normals: {}'.format(self.has_normals), 2)
-        log('has_colors: {}'.format(self.has_colors), 2)
+        self._log('has_vertices: {}'.format(self.has_vertices), 2)
+        self._log('has_normals: {}'.format(self.has_normals), 2)
+        self._log('has_colors: {}'.format(self.has_colors), 2)
         
-        log("done.", 1)
+        self._log("done.", 1)
+    
+    def _log(self, msg, indent=0, ):
+        if(not self.quiet):
+            log(msg, indent, )
+    
+    def _clean(self, points, ):
+        # remove alpha if present (meshlab adds it)
+        points = points[[b for b in list(points.dtype.names) if b != 'alpha']]
+        
+        # rename diffuse_rgb to rgb, if present
+        user_rgb = ('diffuse_red', 'diffuse_green', 'diffuse_blue', )
+        names = points.dtype.names
+        ls = list(names)
+        if(set(user_rgb).issubset(names)):
+            for ci, uc in enumerate(user_rgb):
+                for i, v in enumerate(ls):
+                    if(v == uc):
+                        ls[i] = ls[i].replace('diffuse_', '', )
+        points.dtype.names = tuple(ls)
+        
+        # remove anything that is not (x, y, z, nx, ny, nz, red, green, blue) to prevent problems later
+        points = points[[b for b in list(points.dtype.names) if b in ('x', 'y', 'z', 'nx', 'ny', 'nz', 'red', 'green', 'blue', )]]
+        return points
     
     def _header(self):
         raw = []
@@ -1164,7 +1045,7 @@ class PlyPointCloudReader():
             elif(l.startswith('end_header')):
                 pass
             else:
-                log('unknown header line: {}'.format(l))
+                self._log('unknown header line: {}'.format(l))
         
         if(self._ply_format == 'ascii'):
             skip = False
@@ -1219,6 +1100,71 @@ class PlyPointCloudReader():
             skip_header += element['count']
 
 
+class PlyPointCloudChunkReader(PlyPointCloudReader):
+    # reads only header upon init, vertices are then read by iterating in chunks, so whole file does not need to be in memory at once
+    def __init__(self, path, chunk_size=1000000, ):
+        log("{}:".format(self.__class__.__name__), 0)
+        if(os.path.exists(path) is False or os.path.isdir(path) is True):
+            raise OSError("did you point me to an imaginary file? ('{}')".format(path))
+        
+        self.path = path
+        self.chunk_size = chunk_size
+        log("will read file at: '{}'".format(self.path), 1)
+        log("reading header..", 1)
+        self._header()
+        
+        # only first block of vertices, the same as PlyPointCloudReader
+        self.count = 0
+        self._element = None
+        for element in self._elements:
+            if(element['type'] == 'vertex'):
+                self._element = element
+                self.count = element['count']
+                break
+        log("{} vertices in file".format(self.count), 1)
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        if(self._element is None):
+            return
+        if(self._ply_format == 'ascii'):
+            yield from self._chunks_ascii()
+        else:
+            yield from self._chunks_binary()
+    
+    def _chunks_binary(self):
+        dtp = []
+        for i, p in enumerate(self._element['props']):
+            n, t = p
+            dtp.append((n, '{}{}'.format(self._endianness, t), ))
+        dt = np.dtype(dtp)
+        with open(self.path, mode='rb') as f:
+            f.seek(self._header_length)
+            r = self.count
+            while(r > 0):
+                a = np.fromfile(f, dtype=dt, count=min(r, self.chunk_size), )
+                if(len(a) == 0):
+                    break
+                r -= len(a)
+                yield self._clean(a)
+    
+    def _chunks_ascii(self):
+        dt = np.dtype(self._element['props'])
+        with open(self.path, mode='r', encoding='utf-8') as f:
+            for l in itertools.islice(f, self._header_length):
+                pass
+            r = self.count
+            while(r > 0):
+                ls = list(itertools.islice(f, min(r, self.chunk_size)))
+                if(len(ls) == 0):
+                    break
+                r -= len(ls)
+                a = np.atleast_1d(np.genfromtxt(ls, dtype=dt, ))
+                yield self._clean(a)
+
+
 class BinPlyPointCloudWriter():
     """Save binary ply file from data numpy array
     
@@ -1285,6 +1231,43 @@ class BinPlyPointCloudWriter():
         log("done.", 1)
 
 
+class PNGImageWriter():
+    """Save 8 bit RGBA png file from numpy array, uses only zlib and numpy, so it can be used from any thread
+    
+    Args:
+        path: path to png file
+        pixels: uint8 array of shape (height, width, 4), rows from top
+        compression: zlib compression level
+    
+    Attributes:
+        path (str): real path to png file
+    
+    """
+    
+    _signature = b'\x89PNG\r\n\x1a\n'
+    
+    def __init__(self, path, pixels, compression=6, ):
+        self.path = os.path.realpath(path)
+        h, w, _ = pixels.shape
+        
+        # filter type 0 (none) byte in front of each row
+        rows = np.zeros((h, w * 4 + 1), dtype=np.uint8, )
+        rows[:, 1:] = pixels.reshape(h, -1)
+        data = zlib.compress(rows.tobytes(), compression, )
+        
+        with open(self.path, 'wb') as f:
+            f.write(self._signature)
+            self._chunk(f, b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0, ), )
+            self._chunk(f, b'IDAT', data, )
+            self._chunk(f, b'IEND', b'', )
+    
+    def _chunk(self, f, t, data, ):
+        f.write(struct.pack('>I', len(data), ))
+        f.write(t)
+        f.write(data)
+        f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(t), ) & 0xffffffff, ))
+
+
 class PCVShaders():
     vertex_shader_illumination = '''
         in vec3 position;
@@ -2823,6 +2806,158 @@ class PCVShaders():
     '''
 
 
+class PCVTransform():
+    # 4x4 matrix applied as 3x3 + translation, in place on float32 (n, 3) arrays in chunks, normals with inverse transpose so they stay perpendicular under non-uniform scale
+    def __init__(self, matrix, chunk_size=1000000, ):
+        m = np.array(matrix, dtype=np.float64, )
+        self.identity = np.allclose(m, np.identity(4))
+        self.rotation = np.ascontiguousarray(m[:3, :3].T, dtype=np.float32, )
+        self.translation = np.array(m[:3, 3], dtype=np.float32, )
+        try:
+            n = np.linalg.inv(m[:3, :3])
+        except np.linalg.LinAlgError:
+            # zero scale on some axis, normals are undefined anyway
+            n = np.linalg.pinv(m[:3, :3])
+        # transposed twice, inverse transpose and row vectors
+        self.normal_rotation = np.ascontiguousarray(n, dtype=np.float32, )
+        self.chunk_size = chunk_size
+    
+    def _dot(self, a, m, buf, ):
+        # a @ m into buffer, then back to a, no temporary arrays per chunk
+        np.dot(a, m, out=buf, )
+        a[:] = buf
+    
+    def apply(self, vs, ns=None, ):
+        # vertices and normals are modified in place when already float32 and contiguous, otherwise converted copy is transformed, always use returned arrays
+        vs = np.ascontiguousarray(vs, dtype=np.float32, ).reshape(-1, 3)
+        if(ns is not None):
+            ns = np.ascontiguousarray(ns, dtype=np.float32, ).reshape(-1, 3)
+        l = len(vs)
+        if(self.identity or l == 0):
+            return vs, ns
+        
+        c = min(self.chunk_size, l)
+        buf = np.empty((c, 3), dtype=np.float32, )
+        for i in range(0, l, c):
+            v = vs[i:i + c]
+            b = buf[:len(v)]
+            self._dot(v, self.rotation, b, )
+            v += self.translation
+            if(ns is not None):
+                n = ns[i:i + c]
+                self._dot(n, self.normal_rotation, b, )
+                # renormalize, zero length normals are left as they are
+                d = np.sqrt(np.einsum('ij,ij->i', n, n, ))
+                d[d == 0.0] = 1.0
+                n /= d[:, np.newaxis]
+        return vs, ns
+
+
+class PCVColorAdjustment():
+    # color adjustment pipeline, the same formulas as `PCVShaders.fragment_shader_color_adjustment` so viewport preview and applied colors match
+    uniform_names = ('exposure', 'gamma', 'brightness', 'contrast', 'hue', 'saturation', 'value', 'invert', )
+    
+    def __init__(self, exposure=0.0, gamma=1.0, brightness=0.0, contrast=1.0, hue=0.0, saturation=0.0, value=0.0, invert=False, chunk_size=1000000, ):
+        self.exposure = exposure
+        self.gamma = gamma
+        self.brightness = brightness
+        self.contrast = contrast
+        self.hue = hue
+        self.saturation = saturation
+        self.value = value
+        self.invert = invert
+        # process colors in chunks to keep temporary arrays small
+        self.chunk_size = chunk_size
+    
+    @classmethod
+    def from_pcv(cls, pcv, ):
+        return cls(exposure=pcv.color_adjustment_shader_exposure,
+                   gamma=pcv.color_adjustment_shader_gamma,
+                   brightness=pcv.color_adjustment_shader_brightness,
+                   contrast=pcv.color_adjustment_shader_contrast,
+                   hue=pcv.color_adjustment_shader_hue,
+                   saturation=pcv.color_adjustment_shader_saturation,
+                   value=pcv.color_adjustment_shader_value,
+                   invert=pcv.color_adjustment_shader_invert, )
+    
+    def uniforms(self, shader, ):
+        for n in self.uniform_names:
+            shader.uniform_float(n, getattr(self, n))
+    
+    @staticmethod
+    def rgb_to_hsv(rgb, ):
+        # rgb: (n, 3) float32 array, returns new (n, 3) float32 array
+        e = 1.0e-10
+        r = rgb[:, 0]
+        g = rgb[:, 1]
+        b = rgb[:, 2]
+        mx = np.max(rgb, axis=1, )
+        d = mx - np.min(rgb, axis=1, )
+        dd = d + e
+        h = np.where(mx == r, (g - b) / dd, np.where(mx == g, 2.0 + (b - r) / dd, 4.0 + (r - g) / dd, ), )
+        h = (h / 6.0) % 1.0
+        hsv = np.empty(rgb.shape, dtype=np.float32, )
+        hsv[:, 0] = h
+        hsv[:, 1] = d / (mx + e)
+        hsv[:, 2] = mx
+        return hsv
+    
+    @staticmethod
+    def hsv_to_rgb(hsv, out=None, ):
+        # hsv: (n, 3) float32 array, result is written to `out` if given
+        k = np.array((1.0, 2.0 / 3.0, 1.0 / 3.0, ), dtype=np.float32, )
+        p = hsv[:, 0:1] + k
+        p -= np.floor(p)
+        p *= 6.0
+        p -= 3.0
+        np.abs(p, out=p, )
+        p -= 1.0
+        np.clip(p, 0.0, 1.0, out=p, )
+        # mix(1.0, p, s) * v
+        p -= 1.0
+        p *= hsv[:, 1:2]
+        p += 1.0
+        p *= hsv[:, 2:3]
+        if(out is None):
+            return p
+        out[:] = p
+        return out
+    
+    def _apply(self, rgb, ):
+        # exposure
+        if(self.exposure != 0.0):
+            rgb *= 2 ** self.exposure
+        np.clip(rgb, 0.0, 1.0, out=rgb, )
+        # gamma
+        if(self.gamma != 1.0):
+            np.power(rgb, 1 / self.gamma, out=rgb, )
+            np.clip(rgb, 0.0, 1.0, out=rgb, )
+        # brightness/contrast
+        if(self.contrast != 1.0 or self.brightness != 0.0):
+            rgb -= 0.5
+            rgb *= self.contrast
+            rgb += 0.5 + self.brightness
+            np.clip(rgb, 0.0, 1.0, out=rgb, )
+        # hue/saturation/value
+        if(self.hue != 0.0 or self.saturation != 0.0 or self.value != 0.0):
+            hsv = self.rgb_to_hsv(rgb)
+            hsv[:, 0] += self.hue % 1.0
+            hsv[:, 0] %= 1.0
+            hsv[:, 1] += self.saturation
+            hsv[:, 2] += self.value
+            np.clip(hsv, 0.0, 1.0, out=hsv, )
+            self.hsv_to_rgb(hsv, out=rgb, )
+        # invert
+        if(self.invert):
+            np.subtract(1.0, rgb, out=rgb, )
+    
+    def apply(self, cs, ):
+        # cs: (n, 4) float32 colors, modified in place, alpha is left untouched (as in shader)
+        for i in range(0, len(cs), self.chunk_size):
+            self._apply(cs[i:i + self.chunk_size, :3])
+        return cs
+
+
 class PCVManager():
     cache = {}
     handle = None
@@ -2842,6 +2977,69 @@ class PCVManager():
         return vbo, batch
     '''
     
+    @classmethod
+    def color_options(cls, ):
+        # addon preferences used by points_to_data, read on main thread, so conversion can run anywhere
+        addon_prefs = bpy.context.preferences.addons[__name__].preferences
+        col = addon_prefs.default_vertex_color[:]
+        return {'convert_16bit_colors': addon_prefs.convert_16bit_colors,
+                'gamma_correct_16bit_colors': addon_prefs.gamma_correct_16bit_colors,
+                'default_color': tuple([c ** (1 / 2.2) for c in col]) + (1.0, ), }
+    
+    @classmethod
+    def points_to_data(cls, points, options=None, ):
+        # structured array from ply reader to float32 vertices, normals and colors, missing normals and colors are filled with defaults
+        # does not touch bpy when options from color_options are given
+        # FIXME checking for normals/colors in points is kinda scattered all over.. chceck should be upon loading / setting from external script
+        normals = True
+        if(not set(('nx', 'ny', 'nz')).issubset(points.dtype.names)):
+            normals = False
+        vcols = True
+        if(not set(('red', 'green', 'blue')).issubset(points.dtype.names)):
+            vcols = False
+        
+        n = len(points)
+        vs = np.column_stack((points['x'], points['y'], points['z'], ))
+        if(vs.dtype != np.float32):
+            vs = vs.astype(np.float32)
+        
+        if(normals):
+            ns = np.column_stack((points['nx'], points['ny'], points['nz'], ))
+            if(ns.dtype != np.float32):
+                ns = ns.astype(np.float32)
+        else:
+            ns = np.column_stack((np.full(n, 0.0, dtype=np.float32, ),
+                                  np.full(n, 0.0, dtype=np.float32, ),
+                                  np.full(n, 1.0, dtype=np.float32, ), ))
+        
+        if(options is None):
+            options = cls.color_options()
+        if(vcols):
+            if(options['convert_16bit_colors'] and points['red'].dtype == 'uint16'):
+                r8 = (points['red'] / 256).astype('uint8')
+                g8 = (points['green'] / 256).astype('uint8')
+                b8 = (points['blue'] / 256).astype('uint8')
+                if(options['gamma_correct_16bit_colors']):
+                    cs = np.column_stack(((r8 / 255) ** (1 / 2.2),
+                                          (g8 / 255) ** (1 / 2.2),
+                                          (b8 / 255) ** (1 / 2.2),
+                                          np.ones(n, dtype=float, ), ))
+                else:
+                    cs = np.column_stack((r8 / 255, g8 / 255, b8 / 255, np.ones(n, dtype=float, ), ))
+                cs = cs.astype(np.float32)
+            else:
+                # 'uint8'
+                cs = np.column_stack((points['red'] / 255, points['green'] / 255, points['blue'] / 255, np.ones(n, dtype=float, ), ))
+                cs = cs.astype(np.float32)
+        else:
+            col = options['default_color']
+            cs = np.column_stack((np.full(n, col[0], dtype=np.float32, ),
+                                  np.full(n, col[1], dtype=np.float32, ),
+                                  np.full(n, col[2], dtype=np.float32, ),
+                                  np.ones(n, dtype=np.float32, ), ))
+        
+        return vs, ns, cs, normals, vcols
+    
     @classmethod
     def load_ply_to_cache(cls, operator, context, ):
         pcv = context.object.point_cloud_visualizer
@@ -2888,63 +3086,12 @@ class PCVManager():
             operator.report({'ERROR'}, "Loaded data seems to miss vertex locations.")
             return False
         
-        # FIXME checking for normals/colors in points is kinda scattered all over.. chceck should be upon loading / setting from external script
-        normals = True
-        if(not set(('nx', 'ny', 'nz')).issubset(points.dtype.names)):
-            normals = False
+        vs, ns, cs, normals, vcols = cls.points_to_data(points)
         pcv.has_normals = normals
         if(not pcv.has_normals):
             pcv.illumination = False
-        vcols = True
-        if(not set(('red', 'green', 'blue')).issubset(points.dtype.names)):
-            vcols = False
         pcv.has_vcols = vcols
         
-        vs = np.column_stack((points['x'], points['y'], points['z'], ))
-        if(vs.dtype != np.float32):
-            vs = vs.astype(np.float32)
-        
-        if(normals):
-            ns = np.column_stack((points['nx'], points['ny'], points['nz'], ))
-            if(ns.dtype != np.float32):
-                ns = ns.astype(np.float32)
-            
-        else:
-            n = len(points)
-            ns = np.column_stack((np.full(n, 0.0, dtype=np.float32, ),
-                                  np.full(n, 0.0, dtype=np.float32, ),
-                                  np.full(n, 1.0, dtype=np.float32, ), ))
-        
-        if(vcols):
-            preferences = bpy.context.preferences
-            addon_prefs = preferences.addons[__name__].preferences
-            if(addon_prefs.convert_16bit_colors and points['red'].dtype == 'uint16'):
-                r8 = (points['red'] / 256).astype('uint8')
-                g8 = (points['green'] / 256).astype('uint8')
-                b8 = (points['blue'] / 256).astype('uint8')
-                if(addon_prefs.gamma_correct_16bit_colors):
-                    cs = np.column_stack(((r8 / 255) ** (1 / 2.2),
-                                          (g8 / 255) ** (1 / 2.2),
-                                          (b8 / 255) ** (1 / 2.2),
-                                          np.ones(len(points), dtype=float, ), ))
-                else:
-                    cs = np.column_stack((r8 / 255, g8 / 255, b8 / 255, np.ones(len(points), dtype=float, ), ))
-                cs = cs.astype(np.float32)
-            else:
-                # 'uint8'
-                cs = np.column_stack((points['red'] / 255, points['green'] / 255, points['blue'] / 255, np.ones(len(points), dtype=float, ), ))
-                cs = cs.astype(np.float32)
-        else:
-            n = len(points)
-            preferences = bpy.context.preferences
-            addon_prefs = preferences.addons[__name__].preferences
-            col = addon_prefs.default_vertex_color[:]
-            col = tuple([c ** (1 / 2.2) for c in col]) + (1.0, )
-            cs = np.column_stack((np.full(n, col[0], dtype=np.float32, ),
-                                  np.full(n, col[1], dtype=np.float32, ),
-                                  np.full(n, col[2], dtype=np.float32, ),
-                                  np.ones(n, dtype=np.float32, ), ))
-        
         u = str(uuid.uuid1())
         o = context.object
         
@@ -3114,7 +3261,12 @@ class PCVManager():
         
         if(not pcv.override_default_shader):
             # NOTE: just don't draw default shader, quick and easy solution, other shader will be drawn instead, would better to not create it..
-            batch.draw(shader)
+            r = ci.get('edit_region')
+            if(r is not None and r['illumination'] == ci['illumination']):
+                r['outside'].draw(shader)
+                r['inside'].draw(shader)
+            else:
+                batch.draw(shader)
             
             # # remove extra if present, will be recreated if needed and if left stored it might cause problems
             # if('extra' in ci.keys()):
@@ -3396,15 +3548,8 @@ class PCVManager():
             shader.uniform_float("alpha_radius", pcv.alpha_radius)
             shader.uniform_float("global_alpha", pcv.global_alpha)
             
-            shader.uniform_float("exposure", pcv.color_adjustment_shader_exposure)
-            shader.uniform_float("gamma", pcv.color_adjustment_shader_gamma)
-            shader.uniform_float("brightness", pcv.color_adjustment_shader_brightness)
-            shader.uniform_float("contrast", pcv.color_adjustment_shader_contrast)
-            shader.uniform_float("hue", pcv.color_adjustment_shader_hue)
-            shader.uniform_float("saturation", pcv.color_adjustment_shader_saturation)
-            shader.uniform_float("value", pcv.color_adjustment_shader_value)
-            shader.uniform_float("invert", pcv.color_adjustment_shader_invert)
-            
+            PCVColorAdjustment.from_pcv(pcv).uniforms(shader)
+
             batch.draw(shader)
         
         # dev
@@ -4151,6 +4296,10 @@ class PCVManager():
         c['colors'] = cs
         c['length'] = l
         c['stats'] = l
+        if('render_order' in c.keys()):
+            del c['render_order']
+        # anything cached from points is checked against version, ids of arrays can be reused after they are freed
+        c['version'] = c.get('version', 0) + 1
         
         o = c['object']
         pcv = o.point_cloud_visualizer
@@ -4172,10 +4321,139 @@ class PCVManager():
         c['shader'] = shader
         c['batch'] = batch
         
-        # redraw all viewports
-        for area in bpy.context.screen.areas:
-            if(area.type == 'VIEW_3D'):
-                area.tag_redraw()
+        # redraw all viewports, through windows, there is no screen in context when called from timer
+        cls._redraw()
+    
+    @classmethod
+    def region(cls, uuid, indexes, ):
+        # start of region limited editing, points outside of region are drawn from one buffer for the whole edit session, only points in region are uploaded on each update
+        c = PCVManager.cache[uuid]
+        vs = c['vertices']
+        ns = c['normals']
+        cs = c['colors']
+        l = len(vs)
+        shader = c['shader']
+        vbo = GPUVertBuf(shader.format_calc(), l, )
+        vbo.attr_fill("position", vs, )
+        vbo.attr_fill("color", cs, )
+        if(c['illumination']):
+            vbo.attr_fill("normal", ns, )
+        m = np.ones(l, dtype=bool, )
+        m[indexes] = False
+        ibo = GPUIndexBuf(type='POINTS', seq=np.nonzero(m)[0].astype(np.int32), )
+        c['edit_region'] = {'indexes': indexes,
+                            'outside': GPUBatch(type='POINTS', buf=vbo, elem=ibo, ),
+                            'inside': None,
+                            'illumination': c['illumination'], }
+        # region batches draw all points, prevent rebuilding of default batch
+        c['display_length'] = l
+        c['current_display_length'] = l
+        cls._region_inside(c, vs[indexes], ns[indexes], cs[indexes], )
+    
+    @classmethod
+    def splice(cls, uuid, vs, ns, cs, ):
+        # put edited region points back to full arrays, in place if number of points is the same, otherwise region is moved to the end of arrays
+        c = PCVManager.cache[uuid]
+        r = c['edit_region']
+        indexes = r['indexes']
+        if(len(vs) == len(indexes)):
+            # sequence frames can be read only views of shared buffers
+            for k in ('vertices', 'normals', 'colors', ):
+                if(not c[k].flags.writeable):
+                    c[k] = c[k].copy()
+            c['vertices'][indexes] = vs
+            c['normals'][indexes] = ns
+            c['colors'][indexes] = cs
+        else:
+            m = np.ones(c['length'], dtype=bool, )
+            m[indexes] = False
+            k = np.count_nonzero(m)
+            c['vertices'] = np.concatenate((c['vertices'][m], vs, ))
+            c['normals'] = np.concatenate((c['normals'][m], ns, ))
+            c['colors'] = np.concatenate((c['colors'][m], cs, ))
+            l = len(c['vertices'])
+            c['length'] = l
+            c['stats'] = l
+            c['display_length'] = l
+            c['current_display_length'] = l
+            r['indexes'] = np.arange(k, l, dtype=np.int64, )
+        # positions changed, spatial index and depth order are no longer valid and other shaders have to rebuild from arrays
+        if('region_index' in c.keys()):
+            del c['region_index']
+        if('render_order' in c.keys()):
+            del c['render_order']
+        c['version'] = c.get('version', 0) + 1
+        if('extra' in c.keys()):
+            del c['extra']
+        
+        cls._region_inside(c, vs, ns, cs, )
+    
+    @classmethod
+    def _region_inside(cls, c, vs, ns, cs, ):
+        r = c['edit_region']
+        shader = c['shader']
+        if(r['illumination']):
+            r['inside'] = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, "normal": ns, })
+        else:
+            r['inside'] = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, })
+        
+        cls._redraw()
+    
+    @classmethod
+    def swap(cls, uuid, key, vs, ns, cs, batches=None, budget=0, ):
+        # like update, but for data already in final layout (float32, normals and colors present), existing shader is kept
+        # batches for key (with illumination and display length) are cached in `batches` ordered dict, least recently used are dropped when over budget in bytes
+        if(uuid not in PCVManager.cache):
+            raise KeyError("uuid '{}' not in cache".format(uuid))
+        
+        c = PCVManager.cache[uuid]
+        l = len(vs)
+        
+        c['vertices'] = vs
+        c['normals'] = ns
+        c['colors'] = cs
+        c['length'] = l
+        c['stats'] = l
+        if('render_order' in c.keys()):
+            del c['render_order']
+        c['version'] = c.get('version', 0) + 1
+        
+        o = c['object']
+        pcv = o.point_cloud_visualizer
+        dp = pcv.display_percent
+        nl = int((l / 100) * dp)
+        if(dp >= 99):
+            nl = l
+        c['display_length'] = nl
+        c['current_display_length'] = nl
+        
+        ienabled = c['illumination']
+        shader = c['shader']
+        k = (key, ienabled, nl, )
+        batch = None
+        if(batches is not None):
+            batch = batches.get(k)
+        if(batch is None):
+            if(ienabled):
+                batch = batch_for_shader(shader, 'POINTS', {"position": vs[:nl], "color": cs[:nl], "normal": ns[:nl], })
+            else:
+                batch = batch_for_shader(shader, 'POINTS', {"position": vs[:nl], "color": cs[:nl], })
+            if(batches is not None):
+                size = nl * (12 + 16 + (12 if ienabled else 0))
+                batches[k] = (batch, size, )
+                total = sum([v[1] for v in batches.values()])
+                while(total > budget and len(batches) > 1):
+                    _, (_, s) = batches.popitem(last=False)
+                    total -= s
+                if(total > budget):
+                    batches.clear()
+        else:
+            batch = batch[0]
+            batches.move_to_end(k)
+        c['batch'] = batch
+        
+        # sequence timer calls this, there is no screen in context then
+        cls._redraw()
     
     @classmethod
     def gc(cls):
@@ -4507,10 +4785,16 @@ class PCVSequence():
     
     @classmethod
     def handler(cls, scene, depsgraph, ):
+        cls.update(scene, )
+    
+    @classmethod
+    def update(cls, scene, wait=False, ):
+        # show current frame of all sequences, with wait, streamed frames are waited for, render has to draw the right frame
         cf = scene.frame_current
         for k, v in cls.cache.items():
             pcv = v['pcv']
             if(pcv.uuid != k):
+                cls.stop(v)
                 del cls.cache[k]
                 if(len(cls.cache.items()) == 0):
                     cls.deinit()
@@ -4532,8 +4816,30 @@ class PCVSequence():
             if(cf > ld):
                 PCVManager.update(k, [], None, None, )
             else:
-                data = v['data'][cf - 1]
-                PCVManager.update(k, data['vs'], data['ns'], data['cs'], )
+                if('stream' in v):
+                    data = v['stream'].get(cf - 1, wait, )
+                    if(v['stream'].stale and not bpy.app.timers.is_registered(cls.refresh)):
+                        # requested frame is shown when it is read
+                        bpy.app.timers.register(cls.refresh, first_interval=0.02, )
+                    if(data is None):
+                        # nothing loaded yet or frame failed and there is nothing to fall back to
+                        continue
+                elif('deltas' in v):
+                    data = v['deltas'].get(cf - 1)
+                else:
+                    data = v['data'][cf - 1]
+                # frames are in final layout already, no need for full update, batches are reused while they fit to budget
+                PCVManager.swap(k, data['index'], data['vs'], data['ns'], data['cs'], v['batches'], pcv.sequence_batch_budget * 1024 * 1024, )
+    
+    @classmethod
+    def refresh(cls, ):
+        # timer, while some stream shows older frame than requested, update when it is read
+        streams = [v['stream'] for v in cls.cache.values() if 'stream' in v and v['stream'].stale]
+        if(len(streams) == 0):
+            return None
+        if(any([s.ready() for s in streams])):
+            cls.update(bpy.context.scene, )
+        return 0.02
     
     @classmethod
     def init(cls):
@@ -4547,46 +4853,541 @@ class PCVSequence():
         if(not cls.initialized):
             return
         bpy.app.handlers.frame_change_post.remove(PCVSequence.handler)
+        if(bpy.app.timers.is_registered(cls.refresh)):
+            bpy.app.timers.unregister(cls.refresh)
         cls.initialized = False
+        for k, v in cls.cache.items():
+            cls.stop(v)
+        cls.cache = {}
+    
+    @classmethod
+    def stop(cls, item, ):
+        if('stream' in item):
+            item['stream'].stop()
+    
+    @classmethod
+    def files(cls, filepath, ):
+        # files from the same directory with the same name and different number, sorted by number, missing numbers are skipped
+        dirpath = os.path.dirname(filepath)
+        files = []
+        for (p, ds, fs) in os.walk(dirpath):
+            files.extend(fs)
+            break
+        
+        fs = [f for f in files if f.lower().endswith('.ply')]
+        f = os.path.split(filepath)[1]
+        
+        pattern = re.compile(r'(\d+)(?!.*(\d+))')
+        
+        m = re.search(pattern, f, )
+        if(m is not None):
+            prefix = f[:m.start()]
+            suffix = f[m.end():]
+        else:
+            raise Exception('Filename does not contain any sequence number')
+        
+        sel = []
+        
+        for n in fs:
+            m = re.search(pattern, n, )
+            if(m is not None):
+                # some numbers present, lets compare with selected file prefix/suffix
+                pre = n[:m.start()]
+                if(pre == prefix):
+                    # prefixes match
+                    suf = n[m.end():]
+                    if(suf == suffix):
+                        # suffixes match, extract number
+                        si = n[m.start():m.end()]
+                        try:
+                            # try convert it to integer
+                            i = int(si)
+                            # and store as selected file
+                            sel.append((i, n))
+                        except ValueError:
+                            pass
+        
+        # sort by sequence number
+        sel.sort()
+        
+        log('found files:', 1)
+        for i, n in sel:
+            log('{}: {}'.format(i, n), 2)
+        
+        return [{'index': i, 'name': n, 'path': os.path.join(dirpath, n), } for i, n in sel]
+    
+    @classmethod
+    def read(cls, path, options, ):
+        # one frame in final layout for drawing, contiguous float32 arrays, missing normals and colors are filled with defaults
+        # does not touch bpy, can be called from any thread, options have to be taken on main thread with PCVManager.color_options()
+        points = PlyPointCloudReader(path, quiet=True, ).points
+        if(len(points) == 0):
+            raise Exception("No vertices loaded from file at {}".format(path))
+        if(not set(('x', 'y', 'z')).issubset(points.dtype.names)):
+            raise Exception("Loaded data seems to miss vertex locations.")
+        
+        vs, ns, cs, _, _ = PCVManager.points_to_data(points, options, )
+        return {'vs': vs, 'ns': ns, 'cs': cs, }
+    
+    @classmethod
+    def preload(cls, items, options, workers=0, step=None, consume=None, ):
+        # frames read in thread pool, file reading and numpy decoding do not hold gil for most of the time
+        # frames are taken in sequence order with only a few of them read ahead, if consume is given, frames are passed to it in order instead of being returned
+        # frames which failed are collected as (item, error message), step is called after each finished frame
+        if(workers == 0):
+            workers = os.cpu_count() or 1
+        cache = []
+        failed = []
+        window = collections.deque()
+        
+        def take():
+            i, f = window.popleft()
+            try:
+                d = f.result()
+                d.update(items[i])
+                if(consume is not None):
+                    consume(d)
+                else:
+                    cache.append(d)
+            except Exception as e:
+                failed.append((items[i], str(e), ))
+            if(step is not None):
+                step(i + 1)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, item in enumerate(items):
+                window.append((i, pool.submit(cls.read, item['path'], options, ), ))
+                if(len(window) >= workers * 2):
+                    take()
+            while(len(window) > 0):
+                take()
+        return cache, failed
+
+
+class PCVSequenceStream():
+    # frames are read by background thread into buffer of limited size ahead of current frame in playback direction, frames outside are dropped
+    # if requested frame is not ready yet, last shown frame is returned and stream is stale until requested frame is read, memory is bounded by buffer size, not by sequence length
+    def __init__(self, items, options, size=10, cyclic=True, ):
+        self.items = items
+        self.options = options
+        self.size = max(1, min(size, len(items)))
+        self.cyclic = cyclic
+        self.frames = {}
+        self.current = 0
+        self.direction = 1
+        self.last = None
+        self.stale = False
+        self.errors = {}
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True, )
+        self.thread.start()
+    
+    def _window(self):
+        n = len(self.items)
+        r = []
+        for k in range(self.size):
+            i = self.current + k * self.direction
+            if(self.cyclic):
+                i = i % n
+            elif(i < 0 or i >= n):
+                break
+            r.append(i)
+        return r
+    
+    def _read(self, i, ):
+        # worker thread, no bpy here, errors are logged by get on main thread
+        try:
+            d = PCVSequence.read(self.items[i]['path'], self.options, )
+            d.update(self.items[i])
+            return d, None
+        except Exception as e:
+            # failed frame is kept as None, so it is not read again and again
+            return None, str(e)
+    
+    def _run(self):
+        while(True):
+            with self.condition:
+                if(not self.running):
+                    return
+                w = self._window()
+                for i in list(self.frames.keys()):
+                    if(i not in w):
+                        del self.frames[i]
+                todo = [i for i in w if i not in self.frames]
+                if(len(todo) == 0):
+                    self.condition.wait()
+                    continue
+                # window starts with current frame, so it is read first
+                i = todo[0]
+            d, e = self._read(i)
+            with self.condition:
+                if(e is not None):
+                    self.errors[i] = e
+                if(i in self._window()):
+                    self.frames[i] = d
+                self.condition.notify_all()
+    
+    def get(self, i, wait=False, ):
+        # with wait, blocks until requested frame is read, for render
+        n = len(self.items)
+        i = i % n
+        with self.condition:
+            if(i == (self.current + 1) % n):
+                self.direction = 1
+            elif(i == (self.current - 1) % n):
+                self.direction = -1
+            self.current = i
+            self.condition.notify_all()
+            if(wait or (i not in self.frames and self.last is None)):
+                # nothing to show at all, better wait for first frame
+                self.condition.wait_for(lambda: i in self.frames or not self.running)
+            for k, e in self.errors.items():
+                log("{}: {}".format(self.items[k]['name'], e), 1)
+            self.errors = {}
+            self.stale = (i not in self.frames)
+            d = self.frames.get(i)
+            if(d is None):
+                return self.last
+            self.last = d
+            return d
+    
+    def ready(self, ):
+        # requested frame is read and can be shown
+        with self.condition:
+            return (self.current in self.frames)
+    
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.frames = {}
+            self.last = None
+            self.stale = False
+            self.condition.notify_all()
+
+
+class PCVSequenceDeltas():
+    # frames stored as keyframes plus rows changed against previous frame, changed rows are kept as ranges with their new values
+    # current frame is reconstructed in place in buffers of the longest frame size, next frame costs only its changes
+    def __init__(self, interval=50, ):
+        self.interval = interval
+        self.frames = []
+        self.vs = np.zeros((0, 3), dtype=np.float32, )
+        self.ns = np.zeros((0, 3), dtype=np.float32, )
+        self.cs = np.zeros((0, 4), dtype=np.float32, )
+        self.current = -1
+        self._previous = None
+        self.size = 0
+        self.full_size = 0
+    
+    @staticmethod
+    def _rows(ranges, ):
+        lens = ranges[:, 1] - ranges[:, 0]
+        return np.repeat(ranges[:, 0] - np.cumsum(lens) + lens, lens) + np.arange(np.sum(lens))
+    
+    def append(self, frame, ):
+        vs = frame['vs']
+        ns = frame['ns']
+        cs = frame['cs']
+        l = len(vs)
+        key = (self._previous is None or len(self.frames) % self.interval == 0)
+        if(not key):
+            pvs, pns, pcs = self._previous
+            m = min(l, len(pvs))
+            changed = np.ones(l, dtype=bool, )
+            changed[:m] = np.any(vs[:m] != pvs[:m], axis=1, ) | np.any(ns[:m] != pns[:m], axis=1, ) | np.any(cs[:m] != pcs[:m], axis=1, )
+            # too many changes, keyframe is cheaper to apply
+            key = (np.count_nonzero(changed) > l / 2)
+        if(key):
+            ranges = np.array([[0, l]], dtype=np.int64, )
+            d = {'vs': vs.copy(), 'ns': ns.copy(), 'cs': cs.copy(), }
+        else:
+            e = np.diff(np.concatenate(([0], changed.astype(np.int8), [0], )))
+            ranges = np.column_stack((np.nonzero(e == 1)[0], np.nonzero(e == -1)[0], )).astype(np.int64)
+            d = {'vs': vs[changed], 'ns': ns[changed], 'cs': cs[changed], }
+        d['key'] = key
+        d['length'] = l
+        d['ranges'] = ranges
+        d['index'] = frame['index']
+        self.frames.append(d)
+        self._previous = (vs, ns, cs, )
+        self.size += d['vs'].nbytes + d['ns'].nbytes + d['cs'].nbytes + ranges.nbytes
+        self.full_size += vs.nbytes + ns.nbytes + cs.nbytes
+        
+        if(l > len(self.vs)):
+            self.vs = np.zeros((l, 3), dtype=np.float32, )
+            self.ns = np.zeros((l, 3), dtype=np.float32, )
+            self.cs = np.zeros((l, 4), dtype=np.float32, )
+            self.current = -1
+    
+    def finish(self):
+        # previous frame was kept only for comparison
+        self._previous = None
+        log("delta encoded {} frame(s), {} keyframe(s), {:.1f} MB instead of {:.1f} MB".format(len(self.frames), len([f for f in self.frames if f['key']]), self.size / 2 ** 20, self.full_size / 2 ** 20, ), 1)
+    
+    def _apply(self, i, ):
+        d = self.frames[i]
+        r = self._rows(d['ranges'])
+        self.vs[r] = d['vs']
+        self.ns[r] = d['ns']
+        self.cs[r] = d['cs']
+        self.current = i
+    
+    def get(self, i, ):
+        n = len(self.frames)
+        i = i % n
+        if(i != self.current):
+            k = i
+            while(not self.frames[k]['key']):
+                k -= 1
+            # continue from current frame if it is between keyframe and requested frame
+            if(k <= self.current < i):
+                k = self.current + 1
+            for j in range(k, i + 1):
+                self._apply(j)
+        l = self.frames[i]['length']
+        # views of reconstruction buffers, read only, so nothing can write edits to other frames through them, callers have to copy before writing
+        r = {'vs': self.vs[:l], 'ns': self.ns[:l], 'cs': self.cs[:l], 'index': self.frames[i]['index'], }
+        for k in ('vs', 'ns', 'cs', ):
+            r[k].flags.writeable = False
+        return r
+
+
+class PCVTextureSampler():
+    # pixels of images read once, key is checked for changes, images with unsaved changes are always read again
+    cache = {}
+    
+    def __init__(self, image, interpolation='Closest', extension='REPEAT', ):
+        # interpolation and extension as in image texture node, anything else than 'Closest' is bilinear, 'REPEAT' wraps uvs, anything else clamps
+        self.pixels = self.image_pixels(image)
+        self.bilinear = (interpolation != 'Closest')
+        self.wrap = (extension == 'REPEAT')
+    
+    @classmethod
+    def from_object(cls, o, ):
+        # active image texture node in active material with its sampling settings
+        if(o.active_material is None):
+            raise Exception("Cannot find active material")
+        if(o.active_material.node_tree is None):
+            raise Exception("Cannot find active image texture in active material")
+        uvtexnode = o.active_material.node_tree.nodes.active
+        if(uvtexnode is None):
+            raise Exception("Cannot find active image texture in active material")
+        if(uvtexnode.type != 'TEX_IMAGE'):
+            raise Exception("Cannot find active image texture in active material")
+        uvimage = uvtexnode.image
+        if(uvimage is None):
+            raise Exception("Cannot find active image texture with loaded image in active material")
+        return cls(uvimage, uvtexnode.interpolation, uvtexnode.extension, )
+    
+    @classmethod
+    def image_pixels(cls, image, ):
+        # image has no update counter exposed, so size, source and file is what can be checked
+        key = (tuple(image.size), image.source, image.filepath_raw, )
+        c = cls.cache.get(image.name)
+        if(c is not None and c[0] == key and not image.is_dirty):
+            return c[1]
+        
+        image.update()
+        w, h = image.size
+        if(w * h == 0):
+            raise Exception("Image '{}' has no pixels".format(image.name))
+        a = np.zeros(w * h * 4, dtype=np.float32, )
+        image.pixels.foreach_get(a)
+        a.shape = (h, w, 4)
+        if(image.is_dirty):
+            cls.cache.pop(image.name, None)
+        else:
+            cls.cache[image.name] = (key, a, )
+        return a
+    
+    @classmethod
+    def clear(cls):
         cls.cache = {}
+    
+    def _index(self, i, n, ):
+        if(self.wrap):
+            return i % n
+        return np.clip(i, 0, n - 1, )
+    
+    def sample(self, uvs, ):
+        # rgba at uv coordinates, (n, 2) in, (n, 4) float32 out
+        a = self.pixels
+        h, w = a.shape[:2]
+        x = np.asarray(uvs[:, 0], dtype=np.float64, ) * w
+        y = np.asarray(uvs[:, 1], dtype=np.float64, ) * h
+        if(not self.bilinear):
+            return a[self._index(np.floor(y).astype(np.int64), h), self._index(np.floor(x).astype(np.int64), w)]
+        
+        # bilinear between centers of four nearest pixels
+        x -= 0.5
+        y -= 0.5
+        x0 = np.floor(x)
+        y0 = np.floor(y)
+        fx = (x - x0).astype(np.float32)[:, np.newaxis]
+        fy = (y - y0).astype(np.float32)[:, np.newaxis]
+        x0 = x0.astype(np.int64)
+        y0 = y0.astype(np.int64)
+        xa = self._index(x0, w)
+        xb = self._index(x0 + 1, w)
+        ya = self._index(y0, h)
+        yb = self._index(y0 + 1, h)
+        r = a[ya, xa] * (1.0 - fx)
+        r += a[ya, xb] * fx
+        r *= (1.0 - fy)
+        t = a[yb, xa] * (1.0 - fx)
+        t += a[yb, xb] * fx
+        t *= fy
+        r += t
+        return r
+
+
+class PCVMeshData():
+    # bulk reads of mesh data to numpy arrays through foreach_get
+    @staticmethod
+    def vertices(me, ):
+        vs = np.zeros(len(me.vertices) * 3, dtype=np.float32, )
+        me.vertices.foreach_get("co", vs, )
+        vs.shape = (-1, 3)
+        return vs
+    
+    @staticmethod
+    def int_layer(me, name, ):
+        # counterpart of PCMeshWriter.int_layer, None if there is no such layer
+        if(PCMeshWriter.has_attributes(me)):
+            a = me.attributes.get(name)
+        else:
+            a = me.vertex_layers_int.get(name)
+        if(a is None):
+            return None
+        r = np.zeros(len(me.vertices), dtype=np.int32, )
+        a.data.foreach_get("value", r, )
+        return r
+    
+    @staticmethod
+    def vertex_group_weights(me, index, ):
+        # no bulk access to deform weights, at least it is one pass over vertices, not over samples
+        ws = np.zeros(len(me.vertices), dtype=np.float32, )
+        for v in me.vertices:
+            for g in v.groups:
+                if(g.group == index):
+                    ws[v.index] = g.weight
+        return ws
+    
+    @staticmethod
+    def group_colors(ws, ):
+        # weight to hue from red (1.0) to blue (0.0) as rainbow
+        hsv = np.ones((len(ws), 3), dtype=np.float32, )
+        hsv[:, 0] = (1.0 - ws) / 1.5
+        return PCVColorAdjustment.hsv_to_rgb(hsv)
+    
+    @staticmethod
+    def loop_averages(me, values, ):
+        # per loop values averaged per vertex, vertices without loops get zeros
+        vi = np.zeros(len(me.loops), dtype=np.int32, )
+        me.loops.foreach_get("vertex_index", vi, )
+        nv = len(me.vertices)
+        counts = np.bincount(vi, minlength=nv, ).astype(np.float64)
+        counts[counts == 0] = 1.0
+        r = np.zeros((nv, values.shape[1]), dtype=np.float32, )
+        for i in range(values.shape[1]):
+            r[:, i] = np.bincount(vi, weights=values[:, i], minlength=nv, ) / counts
+        return r
+    
+    @staticmethod
+    def triangle_grid(tx, ty, ti=None, ):
+        # triangles binned to 2d grid of cells by their bounding rectangle, tx, ty are (n, 3) projected coordinates, ti optional subset of triangles
+        if(ti is None):
+            ti = np.arange(len(tx))
+        g = int(max(1, min(2048, math.sqrt(len(ti)) * 2)))
+        lo = np.array((tx.min(), ty.min(), ))
+        size = (np.array((tx.max(), ty.max(), )) - lo) / g
+        size[size == 0.0] = 1.0
+        grid = {'g': g, 'lo': lo, 'size': size, }
+        
+        cells = PCVMeshData.grid_cells
+        i0 = cells(grid, tx[ti].min(axis=1), 0)
+        i1 = cells(grid, tx[ti].max(axis=1), 0)
+        j0 = cells(grid, ty[ti].min(axis=1), 1)
+        j1 = cells(grid, ty[ti].max(axis=1), 1)
+        nj = j1 - j0 + 1
+        cnt = (i1 - i0 + 1) * nj
+        k = np.arange(np.sum(cnt)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        rnj = np.repeat(nj, cnt)
+        cell = (np.repeat(i0, cnt) + k // rnj) * g + np.repeat(j0, cnt) + k % rnj
+        order = np.argsort(cell, kind='stable', )
+        counts = np.bincount(cell, minlength=g * g, )
+        grid['counts'] = counts
+        grid['starts'] = np.cumsum(counts) - counts
+        grid['tris'] = np.repeat(ti, cnt)[order]
+        return grid
+    
+    @staticmethod
+    def grid_cells(grid, x, j, ):
+        return np.clip(np.floor((x - grid['lo'][j]) / grid['size'][j]).astype(np.int64), 0, grid['g'] - 1, )
+    
+    @staticmethod
+    def grid_pairs(grid, x, y, ):
+        # candidate (point, triangle) pairs, all triangles in point cell
+        cell = PCVMeshData.grid_cells(grid, x, 0) * grid['g'] + PCVMeshData.grid_cells(grid, y, 1)
+        m = grid['counts'][cell]
+        q = np.repeat(np.arange(len(x)), m)
+        k = np.arange(len(q)) - np.repeat(np.cumsum(m) - m, m)
+        t = grid['tris'][np.repeat(grid['starts'][cell], m) + k]
+        return q, t
+    
+    @staticmethod
+    def locate_uvs(tuvs, uvs, chunk_size=1000000, ):
+        # uv triangle containing each point and barycentric weights, triangle index is -1 where no triangle contains point
+        grid = PCVMeshData.triangle_grid(tuvs[:, :, 0], tuvs[:, :, 1], )
+        l = len(uvs)
+        ti = np.full(l, -1, dtype=np.int64, )
+        ws = np.zeros((l, 3), dtype=np.float64, )
+        for i in range(0, l, chunk_size):
+            p = uvs[i:i + chunk_size]
+            q, t = PCVMeshData.grid_pairs(grid, p[:, 0], p[:, 1], )
+            a = tuvs[t, 0]
+            v0 = tuvs[t, 1] - a
+            v1 = tuvs[t, 2] - a
+            v2 = p[q] - a
+            d = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+            ok = d != 0.0
+            d[~ok] = 1.0
+            w1 = (v2[:, 0] * v1[:, 1] - v1[:, 0] * v2[:, 1]) / d
+            w2 = (v0[:, 0] * v2[:, 1] - v2[:, 0] * v0[:, 1]) / d
+            w0 = 1.0 - w1 - w2
+            e = -1e-6
+            ok &= (w0 >= e) & (w1 >= e) & (w2 >= e)
+            # first containing triangle for each point
+            qi, first = np.unique(q[ok], return_index=True, )
+            h = np.nonzero(ok)[0][first]
+            ti[i + qi] = t[h]
+            ws[i + qi] = np.column_stack((w0[h], w1[h], w2[h], ))
+        return ti, ws
+
+
+class PCVRandomStreams():
+    # counter based philox, chunk k of samples always gets the same stream (generator jumped k times), no matter which thread or in which order generates it
+    def __init__(self, seed=0, ):
+        self.bit_generator = np.random.Philox(seed)
+    
+    def stream(self, k=0, ):
+        return np.random.Generator(self.bit_generator.jumped(k))
 
 
 class PCVTriangleSurfaceSampler():
-    def __init__(self, context, o, num_samples, rnd, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, exact_number_of_points=False, ):
+    def __init__(self, context, o, num_samples, rnd, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, chunk_size=1000000, threads=None, ):
+        # area weighted random sampling, triangle indices are drawn from area cdf with PCVRandomStreams `rnd`, all samples in chunk are calculated at once
         log("{}:".format(self.__class__.__name__), 0)
         
-        def remap(v, min1, max1, min2, max2, ):
-            def clamp(v, vmin, vmax):
-                if(vmax <= vmin):
-                    raise ValueError("Maximum value is smaller than or equal to minimum.")
-                if(v <= vmin):
-                    return vmin
-                if(v >= vmax):
-                    return vmax
-                return v
-            
-            def normalize(v, vmin, vmax):
-                return (v - vmin) / (vmax - vmin)
-            
-            def interpolate(nv, vmin, vmax):
-                return vmin + (vmax - vmin) * nv
-            
-            if(max1 - min1 == 0):
-                # handle zero division when min1 = max1
-                return min2
-            
-            r = interpolate(normalize(v, min1, max1), min2, max2)
-            return r
-        
-        def distance(a, b, ):
-            return ((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2) ** 0.5
-        
-        def random_point_in_triangle(a, b, c, ):
-            r1 = rnd.random()
-            r2 = rnd.random()
-            p = (1 - math.sqrt(r1)) * a + (math.sqrt(r1) * (1 - r2)) * b + (math.sqrt(r1) * r2) * c
-            return p
-        
+        d = self.read(context, o, colorize, )
+        log("generating {} samples:".format(num_samples), 1)
+        progress = Progress(num_samples, indent=2, )
+        self.vs, self.ns, self.cs = self.generate(d, num_samples, rnd, colorize, constant_color, chunk_size, progress, threads, )
+    
+    @staticmethod
+    def read(context, o, colorize=None, ):
+        # everything needed for sampling as numpy arrays, must be called from main thread, generate is numpy only and can run in any thread
         depsgraph = context.evaluated_depsgraph_get()
         if(o.modifiers):
             owner = o.evaluated_get(depsgraph)
@@ -4595,326 +5396,246 @@ class PCVTriangleSurfaceSampler():
             owner = o
             me = owner.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph, )
         
-        bm = bmesh.new()
-        bm.from_mesh(me)
-        bmesh.ops.triangulate(bm, faces=bm.faces)
-        bm.verts.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
-        
-        if(len(bm.faces) == 0):
+        me.calc_loop_triangles()
+        tris = me.loop_triangles
+        nt = len(tris)
+        if(nt == 0):
+            owner.to_mesh_clear()
             raise Exception("Mesh has no faces")
         
-        areas = tuple([p.calc_area() for p in bm.faces])
-        if(sum(areas) == 0.0):
+        areas = np.zeros(nt, dtype=np.float64, )
+        tris.foreach_get("area", areas, )
+        if(np.sum(areas) == 0.0):
+            owner.to_mesh_clear()
             raise Exception("Mesh surface area is zero")
-        area_min = min(areas)
-        area_max = max(areas)
-        avg_ppf = num_samples / len(areas)
-        area_med = statistics.median(areas)
-        nums = []
-        for p in bm.faces:
-            r = p.calc_area() / area_med
-            nums.append(avg_ppf * r)
-        
-        max_ppf = max(nums)
-        min_ppf = min(nums)
-        
-        vs = []
-        ns = []
-        cs = []
         
-        if(colorize == 'UVTEX'):
-            try:
-                if(o.active_material is None):
-                    raise Exception("Cannot find active material")
-                uvtexnode = o.active_material.node_tree.nodes.active
-                if(uvtexnode is None):
-                    raise Exception("Cannot find active image texture in active material")
-                uvimage = uvtexnode.image
-                if(uvimage is None):
-                    raise Exception("Cannot find active image texture with loaded image in active material")
-                uvimage.update()
-                uvarray = np.asarray(uvimage.pixels)
-                uvarray = uvarray.reshape((uvimage.size[1], uvimage.size[0], 4))
-                uvlayer = bm.loops.layers.uv.active
+        tvs = np.zeros(nt * 3, dtype=np.int32, )
+        tris.foreach_get("vertices", tvs, )
+        tvs.shape = (-1, 3)
+        tls = np.zeros(nt * 3, dtype=np.int32, )
+        tris.foreach_get("loops", tls, )
+        tls.shape = (-1, 3)
+        tns = np.zeros(nt * 3, dtype=np.float32, )
+        tris.foreach_get("normal", tns, )
+        tns.shape = (-1, 3)
+        smooth = np.zeros(nt, dtype=bool, )
+        tris.foreach_get("use_smooth", smooth, )
+        
+        nv = len(me.vertices)
+        mvs = np.zeros(nv * 3, dtype=np.float32, )
+        me.vertices.foreach_get("co", mvs, )
+        mvs.shape = (-1, 3)
+        mns = np.zeros(nv * 3, dtype=np.float32, )
+        me.vertices.foreach_get("normal", mns, )
+        mns.shape = (-1, 3)
+        
+        # per vertex or per loop values to interpolate as colors, or image with per loop uvs
+        attr = None
+        uvs = None
+        texture = None
+        try:
+            if(colorize == 'UVTEX'):
+                texture = PCVTextureSampler.from_object(o)
+                uvlayer = me.uv_layers.active
                 if(uvlayer is None):
                     raise Exception("Cannot find active UV layout")
-            except Exception as e:
-                raise Exception(str(e))
-        if(colorize == 'VCOLS'):
-            try:
-                col_layer = bm.loops.layers.color.active
+                uvs = np.zeros(len(me.loops) * 2, dtype=np.float32, )
+                uvlayer.data.foreach_get("uv", uvs, )
+                uvs.shape = (-1, 2)
+            elif(colorize == 'VCOLS'):
+                col_layer = me.vertex_colors.active
                 if(col_layer is None):
-                    raise Exception()
-            except Exception:
-                raise Exception("Cannot find active vertex colors")
-        if(colorize in ('GROUP_MONO', 'GROUP_COLOR')):
-            try:
-                group_layer = bm.verts.layers.deform.active
-                if(group_layer is None):
-                    raise Exception()
-                group_layer_index = o.vertex_groups.active.index
-            except Exception:
-                raise Exception("Cannot find active vertex group")
-        
-        def generate(poly, vs, ns, cs, override_num=None, ):
-            ps = poly.verts
-            tri = (ps[0].co, ps[1].co, ps[2].co)
-            # if num is 0, it can happen when mesh has large and very small polygons, increase number of samples and eventually all polygons gets covered
-            num = int(round(remap(poly.calc_area(), area_min, area_max, min_ppf, max_ppf)))
-            if(override_num is not None):
-                num = override_num
-            for i in range(num):
-                v = random_point_in_triangle(*tri)
-                vs.append(v.to_tuple())
-                if(poly.smooth):
-                    a = poly.verts[0].normal
-                    b = poly.verts[1].normal
-                    c = poly.verts[2].normal
-                    nws = poly_3d_calc([a, b, c, ], v)
-                    
-                    nx = a.x * nws[0] + b.x * nws[1] + c.x * nws[2]
-                    ny = a.y * nws[0] + b.y * nws[1] + c.y * nws[2]
-                    nz = a.z * nws[0] + b.z * nws[1] + c.z * nws[2]
-                    normal = Vector((nx, ny, nz)).normalized()
-                    ns.append(normal.to_tuple())
-                    
-                    # n = Vector((0.0, 0.0, 0.0, ))
-                    # n += nws[0] * a
-                    # n += nws[1] * b
-                    # n += nws[2] * c
-                    # n = n / 3
-                    # n = n.normalized()
-                    # ns.append(n.to_tuple())
-                    
-                else:
-                    ns.append(poly.normal.to_tuple())
-                
-                if(colorize is None):
-                    cs.append((1.0, 0.0, 0.0, ))
-                elif(colorize == 'CONSTANT'):
-                    cs.append(constant_color)
-                elif(colorize == 'VCOLS'):
-                    ws = poly_3d_calc([poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, ], v)
-                    ac = poly.loops[0][col_layer][:3]
-                    bc = poly.loops[1][col_layer][:3]
-                    cc = poly.loops[2][col_layer][:3]
-                    r = ac[0] * ws[0] + bc[0] * ws[1] + cc[0] * ws[2]
-                    g = ac[1] * ws[0] + bc[1] * ws[1] + cc[1] * ws[2]
-                    b = ac[2] * ws[0] + bc[2] * ws[1] + cc[2] * ws[2]
-                    cs.append((r, g, b, ))
-                elif(colorize == 'UVTEX'):
-                    uvtriangle = []
-                    for l in poly.loops:
-                        uvtriangle.append(Vector(l[uvlayer].uv.to_tuple() + (0.0, )))
-                    uvpoint = barycentric_transform(v, poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, *uvtriangle, )
-                    w, h = uvimage.size
-                    # x,y % 1.0 to wrap around if uv coordinate is outside 0.0-1.0 range
-                    x = int(round(remap(uvpoint.x % 1.0, 0.0, 1.0, 0, w - 1)))
-                    y = int(round(remap(uvpoint.y % 1.0, 0.0, 1.0, 0, h - 1)))
-                    cs.append(tuple(uvarray[y][x][:3].tolist()))
-                elif(colorize == 'GROUP_MONO'):
-                    ws = poly_3d_calc([poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, ], v)
-                    aw = poly.verts[0][group_layer].get(group_layer_index, 0.0)
-                    bw = poly.verts[1][group_layer].get(group_layer_index, 0.0)
-                    cw = poly.verts[2][group_layer].get(group_layer_index, 0.0)
-                    m = aw * ws[0] + bw * ws[1] + cw * ws[2]
-                    cs.append((m, m, m, ))
-                elif(colorize == 'GROUP_COLOR'):
-                    ws = poly_3d_calc([poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, ], v)
-                    aw = poly.verts[0][group_layer].get(group_layer_index, 0.0)
-                    bw = poly.verts[1][group_layer].get(group_layer_index, 0.0)
-                    cw = poly.verts[2][group_layer].get(group_layer_index, 0.0)
-                    m = aw * ws[0] + bw * ws[1] + cw * ws[2]
-                    hue = remap(1.0 - m, 0.0, 1.0, 0.0, 1 / 1.5)
-                    c = Color()
-                    c.hsv = (hue, 1.0, 1.0, )
-                    cs.append((c.r, c.g, c.b, ))
-        
-        log("generating {} samples:".format(num_samples), 1)
-        progress = Progress(len(bm.faces), indent=2, )
-        for poly in bm.faces:
-            progress.step()
-            generate(poly, vs, ns, cs, )
-        
-        if(exact_number_of_points):
-            if(len(vs) < num_samples):
-                log("generating extra samples..", 1)
-                while(len(vs) < num_samples):
-                    # generate one sample in random face until full
-                    poly = bm.faces[rnd.randrange(len(bm.faces))]
-                    generate(poly, vs, ns, cs, override_num=1, )
-            if(len(vs) > num_samples):
-                log("throwing out extra samples..", 1)
-                a = np.concatenate((vs, ns, cs), axis=1, )
-                np.random.shuffle(a)
-                a = a[:num_samples]
-                # vs = np.column_stack((a[:, 0], a[:, 1], a[:, 2], ))
-                # ns = np.column_stack((a[:, 3], a[:, 4], a[:, 5], ))
-                # cs = np.column_stack((a[:, 6], a[:, 7], a[:, 8], ))
-                vs = a[:, :3]
-                ns = a[:, 3:6]
-                cs = a[:, 6:]
+                    raise Exception("Cannot find active vertex colors")
+                attr = np.zeros(len(me.loops) * 4, dtype=np.float32, )
+                col_layer.data.foreach_get("color", attr, )
+                attr.shape = (-1, 4)
+                attr = attr[:, :3]
+            elif(colorize in ('GROUP_MONO', 'GROUP_COLOR')):
+                if(o.vertex_groups.active is None):
+                    raise Exception("Cannot find active vertex group")
+                attr = PCVMeshData.vertex_group_weights(me, o.vertex_groups.active.index)
+        except Exception as e:
+            owner.to_mesh_clear()
+            raise Exception(str(e))
         
-        if(len(vs) == 0):
-            raise Exception("No points generated, increase number of points or decrease minimal distance")
+        owner.to_mesh_clear()
         
-        # and shuffle..
-        a = np.concatenate((vs, ns, cs), axis=1, )
-        np.random.shuffle(a)
-        vs = a[:, :3]
-        ns = a[:, 3:6]
-        cs = a[:, 6:]
+        d = {'areas': areas, 'tvs': tvs, 'tls': tls, 'tns': tns, 'smooth': smooth, 'mvs': mvs, 'mns': mns, 'attr': attr, 'uvs': uvs, 'texture': texture, }
+        return d
+    
+    @staticmethod
+    def generate(d, num_samples, rnd, colorize=None, constant_color=None, chunk_size=1000000, progress=None, threads=None, ):
+        # chunks are independent, each with its own random stream, written to its own slice of output, so they can run in parallel
+        areas = d['areas']
+        tvs = d['tvs']
+        tls = d['tls']
+        tns = d['tns']
+        smooth = d['smooth']
+        mvs = d['mvs']
+        mns = d['mns']
+        attr = d['attr']
+        uvs = d['uvs']
+        texture = d['texture']
+        nt = len(areas)
+        
+        # area cdf, drawing uniform numbers on it gives triangles with probability proportional to area
+        cdf = np.cumsum(areas)
+        cdf /= cdf[-1]
+        
+        vs = np.zeros((num_samples, 3), dtype=np.float32, )
+        ns = np.zeros((num_samples, 3), dtype=np.float32, )
+        cs = np.zeros((num_samples, 3), dtype=np.float32, )
+        if(colorize is None):
+            cs[:] = (1.0, 0.0, 0.0, )
+        elif(colorize == 'CONSTANT'):
+            cs[:] = constant_color[:3]
+        
+        def chunk(i):
+            l = min(chunk_size, num_samples - i)
+            g = rnd.stream(i // chunk_size)
+            fi = np.searchsorted(cdf, g.random(l), side='right', )
+            np.minimum(fi, nt - 1, out=fi, )
+            
+            # barycentric weights of uniform random point in triangle
+            r = g.random((l, 2))
+            sr = np.sqrt(r[:, 0])
+            w = np.empty((l, 3), dtype=np.float32, )
+            w[:, 0] = 1.0 - sr
+            w[:, 1] = sr * (1.0 - r[:, 1])
+            w[:, 2] = sr * r[:, 1]
+            
+            t = tvs[fi]
+            vs[i:i + l] = np.einsum('ij,ijk->ik', w, mvs[t], )
+            
+            # smooth faces interpolate vertex normals, flat use face normal
+            n = tns[fi]
+            sm = smooth[fi]
+            if(np.any(sm)):
+                sn = np.einsum('ij,ijk->ik', w[sm], mns[t[sm]], )
+                d = np.sqrt(np.einsum('ij,ij->i', sn, sn, ))
+                d[d == 0.0] = 1.0
+                n[sm] = sn / d[:, np.newaxis]
+            ns[i:i + l] = n
+            
+            if(colorize == 'VCOLS'):
+                cs[i:i + l] = np.einsum('ij,ijk->ik', w, attr[tls[fi]], )
+            elif(colorize == 'UVTEX'):
+                uv = np.einsum('ij,ijk->ik', w, uvs[tls[fi]], )
+                cs[i:i + l] = texture.sample(uv)[:, :3]
+            elif(colorize in ('GROUP_MONO', 'GROUP_COLOR', )):
+                m = np.einsum('ij,ij->i', w, attr[t], )
+                if(colorize == 'GROUP_MONO'):
+                    cs[i:i + l] = m[:, np.newaxis]
+                else:
+                    cs[i:i + l] = PCVMeshData.group_colors(m)
+            return l
         
-        self.vs = vs[:]
-        self.ns = ns[:]
-        self.cs = cs[:]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+            for l in pool.map(chunk, range(0, num_samples, chunk_size)):
+                if(progress is not None):
+                    progress.step(l)
         
-        bm.free()
-        owner.to_mesh_clear()
+        # triangles are drawn independently, samples are in random order already, no need to shuffle
+        return vs, ns, cs
 
 
 class PCVPoissonDiskSurfaceSampler():
     def __init__(self, context, o, rnd, minimal_distance, sampling_exponent=10, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, ):
         log("{}:".format(self.__class__.__name__), 0)
-        # pregenerate samples, normals and colors will be handled too
-        num_presamples = int((sum([p.area for p in o.data.polygons]) / (minimal_distance ** 2)) * sampling_exponent)
-        presampler = PCVTriangleSurfaceSampler(context, o, num_presamples, rnd, colorize=colorize, constant_color=constant_color, vcols=vcols, uvtex=uvtex, vgroup=vgroup, exact_number_of_points=False, )
-        pre_vs = presampler.vs
-        pre_ns = presampler.ns
-        pre_cs = presampler.cs
-        # join to points
-        ppoints = []
-        for i in range(len(pre_vs)):
-            ppoints.append(tuple(pre_vs[i].tolist()) + tuple(pre_ns[i].tolist()) + tuple(pre_cs[i].tolist()))
-        # keep track of used/unused points
-        pbools = [True] * len(ppoints)
-        
-        def random_point():
-            while(True):
-                i = rnd.randint(0, len(ppoints) - 1)
-                if(pbools[i]):
-                    pbools[i] = False
-                    return ppoints[i]
-        
-        accepted = []
-        candidates = []
-        # get starting point
-        candidates.append(random_point())
-        
-        # make kdtree of all points for getting annulus points
-        ptree = KDTree(len(ppoints))
-        for i in range(len(ppoints)):
-            ptree.insert(ppoints[i][:3], i)
-        ptree.balance()
-        
-        def annulus_points(c):
-            # generate k point with candidate annulus
-            pool = []
-            # points within radius minimal_distance
-            ball = ptree.find_range(c[:3], minimal_distance)
-            ball_indexes = set([i for _, i, _ in ball])
-            # points within radius minimal_distance * 2
-            ball2 = ptree.find_range(c[:3], minimal_distance * 2)
-            ball2_indexes = set([i for _, i, _ in ball2])
-            # difference between those two are points in annulus
-            s = ball2_indexes.difference(ball_indexes)
-            pool = []
-            for i in s:
-                if(pbools[i]):
-                    # pool.append(tuple(ptree.data[i]))
-                    pool.append(tuple(pre_vs[i].tolist()) + tuple(pre_ns[i].tolist()) + tuple(pre_cs[i].tolist()))
-                    # don't reuse points, if point is ok, will be added to candidate, if not will not be used anymore
-                    pbools[i] = False
-                    # # isn't the 'hole' problem here?
-                    # # this might leave a gap on mesh
-                    # # because i am no generating new samples and with this i cut out pre generated neighbours?
-                    # if(len(pool) >= k):
-                    #     break
-            return pool
-        
+        d = PCVTriangleSurfaceSampler.read(context, o, colorize, )
         log("sampling..", 1)
+        self.vs, self.ns, self.cs = self.generate(d, rnd, minimal_distance, sampling_exponent, colorize, constant_color, )
+        log("done..", 1)
+    
+    @staticmethod
+    def generate(d, rnd, minimal_distance, sampling_exponent=10, colorize=None, constant_color=None, threads=None, ):
+        # pregenerate samples, normals and colors will be handled too
+        num_presamples = int((np.sum(d['areas']) / (minimal_distance ** 2)) * sampling_exponent)
+        vs, ns, cs = PCVTriangleSurfaceSampler.generate(d, num_presamples, rnd, colorize, constant_color, threads=threads, )
+        indexes = PCVPoissonDiskSurfaceSampler.sample(vs, minimal_distance, )
+        if(len(indexes) == 0):
+            raise Exception("No points generated, increase number of points or decrease minimal distance")
+        return vs[indexes], ns[indexes], cs[indexes]
+    
+    @staticmethod
+    def sample(vs, radius, ):
+        # dart throwing over presamples in their (random) order on background grid, returns indexes of accepted presamples
+        # cell diagonal is radius, so cell holds one accepted sample at most and candidate is checked against fixed set of neighbour cells
+        # cells with the same coordinates modulo 3 (phase) are at least 2 cells apart, can't conflict and are processed all at once
+        l = len(vs)
+        if(l == 0):
+            return np.zeros(0, dtype=np.int64, )
+        
+        vs = np.asarray(vs, dtype=np.float64, )
+        cell = radius / math.sqrt(3)
+        origin = vs.min(axis=0) - 2 * cell
+        ijk = np.floor((vs - origin) / cell).astype(np.int64)
+        dims = ijk.max(axis=0) + 3
+        if(np.prod(dims.astype(np.float64)) >= 2 ** 62):
+            raise Exception("Minimal distance is too small for object dimensions")
+        keys = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+        
+        # candidates grouped by cell, stable sort keeps random order within cell
+        order = np.argsort(keys, kind='stable', )
+        ukeys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True, )
+        nc = len(ukeys)
+        cijk = ijk[order[starts]]
+        phase = (cijk[:, 0] % 3) * 9 + (cijk[:, 1] % 3) * 3 + (cijk[:, 2] % 3)
+        phases = [np.nonzero(phase == i)[0] for i in range(27)]
+        
+        # neighbour cells that can contain sample closer than radius, except cell itself which is always empty when it has candidate to test
+        r = np.arange(-2, 3)
+        off = np.array(np.meshgrid(r, r, r, indexing='ij', )).reshape(3, -1).T
+        gap = np.maximum(np.abs(off) - 1, 0)
+        off = off[(np.sum(gap ** 2, axis=1) < 3) & np.any(off != 0, axis=1)]
+        okeys = (off[:, 0] * dims[1] + off[:, 1]) * dims[2] + off[:, 2]
+        
+        accepted = np.full(nc, -1, dtype=np.int64, )
+        pointer = np.zeros(nc, dtype=np.int64, )
+        r2 = radius ** 2
         
         loop = True
         while(loop):
-            # choose one random candidate
-            c = candidates[rnd.randint(0, len(candidates) - 1)]
-            # generate k points in candidate annulus
-            ap = annulus_points(c)
-            na = False
-            for i, a in enumerate(ap):
-                # this is not quite right to create kdtree each iteration..
-                tps = candidates + accepted
-                tpsl = len(tps)
-                tree = KDTree(tpsl)
-                for j in range(tpsl):
-                    tree.insert(tps[j][:3], j)
-                tree.balance()
+            loop = False
+            for cells in phases:
+                c = cells[(accepted[cells] < 0) & (pointer[cells] < counts[cells])]
+                if(len(c) == 0):
+                    continue
+                loop = True
+                # next candidate in each empty cell
+                cand = order[starts[c] + pointer[c]]
+                pointer[c] += 1
                 
-                ball = tree.find_range(a[:3], minimal_distance)
-                ball_indexes = set([i for _, i, _ in ball])
-                if(len(ball) == 0):
-                    # add if annulus points is acceptable as candidate - no other candidates or accepted are within minimal_distance
-                    candidates.append(a)
-                    na = True
-            if(not na):
-                # if no candidate or accepted is within all annulus points minimal_distance accept candidate and remove from candidates
-                accepted.append(c)
-                candidates.remove(c)
-            # no candidates left, we end here
-            if(len(candidates) == 0):
-                loop = False
+                nk = ukeys[c][:, np.newaxis] + okeys
+                ni = np.searchsorted(ukeys, nk, )
+                np.minimum(ni, nc - 1, out=ni, )
+                na = accepted[ni]
+                hit = (ukeys[ni] == nk) & (na >= 0)
+                ci, _ = np.nonzero(hit)
+                d = vs[na[hit]] - vs[cand[ci]]
+                close = np.einsum('ij,ij->i', d, d, ) < r2
+                ok = np.ones(len(c), dtype=bool, )
+                ok[ci[close]] = False
+                accepted[c[ok]] = cand[ok]
             
             if(debug_mode()):
                 sys.stdout.write("\r")
-                sys.stdout.write("        accepted: {0} | candidates: {1}  ".format(len(accepted), len(candidates)))
+                sys.stdout.write("        accepted: {0} | candidates: {1}  ".format(np.count_nonzero(accepted >= 0), np.sum((counts - pointer)[accepted < 0])))
                 sys.stdout.write("\b")
                 sys.stdout.flush()
         
         if(debug_mode()):
             sys.stdout.write("\n")
-        log("done..", 1)
         
-        # split point data back
-        vs = []
-        ns = []
-        cs = []
-        for i in range(len(accepted)):
-            vs.append(accepted[i][:3])
-            ns.append(accepted[i][3:6])
-            cs.append(accepted[i][6:])
-        self.vs = vs
-        self.ns = ns
-        self.cs = cs
+        # back to presamples order, which is random
+        return np.sort(accepted[accepted >= 0])
 
 
 class PCVVertexSampler():
-    def __init__(self, context, o, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, ):
+    def __init__(self, context, o, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, rnd=None, ):
+        # mesh data are read in bulk, per loop colors are averaged per vertex, shuffled with PCVRandomStreams `rnd`
         log("{}:".format(self.__class__.__name__), 0)
         
-        def remap(v, min1, max1, min2, max2, ):
-            def clamp(v, vmin, vmax):
-                if(vmax <= vmin):
-                    raise ValueError("Maximum value is smaller than or equal to minimum.")
-                if(v <= vmin):
-                    return vmin
-                if(v >= vmax):
-                    return vmax
-                return v
-            
-            def normalize(v, vmin, vmax):
-                return (v - vmin) / (vmax - vmin)
-            
-            def interpolate(nv, vmin, vmax):
-                return vmin + (vmax - vmin) * nv
-            
-            if(max1 - min1 == 0):
-                # handle zero division when min1 = max1
-                return min2
-            
-            r = interpolate(normalize(v, min1, max1), min2, max2)
-            return r
-        
         depsgraph = context.evaluated_depsgraph_get()
         if(o.modifiers):
             owner = o.evaluated_get(depsgraph)
@@ -4923,156 +5644,71 @@ class PCVVertexSampler():
             owner = o
             me = owner.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph, )
         
-        bm = bmesh.new()
-        bm.from_mesh(me)
-        bmesh.ops.triangulate(bm, faces=bm.faces)
-        bm.verts.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
-        
-        if(len(bm.verts) == 0):
-            raise Exception("Mesh has no vertices")
-        if(colorize in ('UVTEX', 'VCOLS', )):
-            if(len(bm.faces) == 0):
-                raise Exception("Mesh has no faces")
-        
-        vs = []
-        ns = []
-        cs = []
-        
-        if(colorize == 'UVTEX'):
-            try:
-                if(o.active_material is None):
-                    raise Exception("Cannot find active material")
-                uvtexnode = o.active_material.node_tree.nodes.active
-                if(uvtexnode is None):
-                    raise Exception("Cannot find active image texture in active material")
-                uvimage = uvtexnode.image
-                if(uvimage is None):
-                    raise Exception("Cannot find active image texture with loaded image in active material")
-                uvimage.update()
-                uvarray = np.asarray(uvimage.pixels)
-                uvarray = uvarray.reshape((uvimage.size[1], uvimage.size[0], 4))
-                uvlayer = bm.loops.layers.uv.active
-                if(uvlayer is None):
-                    raise Exception("Cannot find active UV layout")
-            except Exception as e:
-                raise Exception(str(e))
-        if(colorize == 'VCOLS'):
-            try:
-                col_layer = bm.loops.layers.color.active
-                if(col_layer is None):
-                    raise Exception()
-            except Exception:
-                raise Exception("Cannot find active vertex colors")
-        if(colorize in ('GROUP_MONO', 'GROUP_COLOR')):
-            try:
-                group_layer = bm.verts.layers.deform.active
-                if(group_layer is None):
-                    raise Exception()
-                group_layer_index = o.vertex_groups.active.index
-            except Exception:
-                raise Exception("Cannot find active vertex group")
-        
-        vs = []
-        ns = []
-        cs = []
-        for v in bm.verts:
-            vs.append(v.co.to_tuple())
-            ns.append(v.normal.to_tuple())
+        try:
+            nv = len(me.vertices)
+            if(nv == 0):
+                raise Exception("Mesh has no vertices")
+            if(colorize in ('UVTEX', 'VCOLS', )):
+                if(len(me.polygons) == 0):
+                    raise Exception("Mesh has no faces")
+            
+            vs = np.zeros(nv * 3, dtype=np.float32, )
+            me.vertices.foreach_get("co", vs, )
+            vs.shape = (-1, 3)
+            ns = np.zeros(nv * 3, dtype=np.float32, )
+            me.vertices.foreach_get("normal", ns, )
+            ns.shape = (-1, 3)
+            cs = np.zeros((nv, 3), dtype=np.float32, )
             
             if(colorize is None):
-                cs.append((1.0, 0.0, 0.0, ))
+                cs[:] = (1.0, 0.0, 0.0, )
             elif(colorize == 'CONSTANT'):
-                cs.append(constant_color)
+                cs[:] = constant_color[:3]
             elif(colorize == 'VCOLS'):
-                ls = v.link_loops
-                r = 0.0
-                g = 0.0
-                b = 0.0
-                for l in ls:
-                    c = l[col_layer][:3]
-                    r += c[0]
-                    g += c[1]
-                    b += c[2]
-                r /= len(ls)
-                g /= len(ls)
-                b /= len(ls)
-                cs.append((r, g, b, ))
+                col_layer = me.vertex_colors.active
+                if(col_layer is None):
+                    raise Exception("Cannot find active vertex colors")
+                lcs = np.zeros(len(me.loops) * 4, dtype=np.float32, )
+                col_layer.data.foreach_get("color", lcs, )
+                lcs.shape = (-1, 4)
+                cs = PCVMeshData.loop_averages(me, lcs[:, :3], )
             elif(colorize == 'UVTEX'):
-                ls = v.link_loops
-                w, h = uvimage.size
-                r = 0.0
-                g = 0.0
-                b = 0.0
-                for l in ls:
-                    uvloc = l[uvlayer].uv.to_tuple()
-                    # x,y % 1.0 to wrap around if uv coordinate is outside 0.0-1.0 range
-                    x = int(round(remap(uvloc[0] % 1.0, 0.0, 1.0, 0, w - 1)))
-                    y = int(round(remap(uvloc[1] % 1.0, 0.0, 1.0, 0, h - 1)))
-                    c = tuple(uvarray[y][x][:3].tolist())
-                    r += c[0]
-                    g += c[1]
-                    b += c[2]
-                r /= len(ls)
-                g /= len(ls)
-                b /= len(ls)
-                cs.append((r, g, b, ))
-            elif(colorize == 'GROUP_MONO'):
-                w = v[group_layer].get(group_layer_index, 0.0)
-                cs.append((w, w, w, ))
-            elif(colorize == 'GROUP_COLOR'):
-                w = v[group_layer].get(group_layer_index, 0.0)
-                hue = remap(1.0 - w, 0.0, 1.0, 0.0, 1 / 1.5)
-                c = Color()
-                c.hsv = (hue, 1.0, 1.0, )
-                cs.append((c.r, c.g, c.b, ))
+                texture = PCVTextureSampler.from_object(o)
+                uvlayer = me.uv_layers.active
+                if(uvlayer is None):
+                    raise Exception("Cannot find active UV layout")
+                uvs = np.zeros(len(me.loops) * 2, dtype=np.float32, )
+                uvlayer.data.foreach_get("uv", uvs, )
+                uvs.shape = (-1, 2)
+                cs = PCVMeshData.loop_averages(me, texture.sample(uvs)[:, :3], )
+            elif(colorize in ('GROUP_MONO', 'GROUP_COLOR', )):
+                if(o.vertex_groups.active is None):
+                    raise Exception("Cannot find active vertex group")
+                ws = PCVMeshData.vertex_group_weights(me, o.vertex_groups.active.index, )
+                if(colorize == 'GROUP_MONO'):
+                    cs[:] = ws[:, np.newaxis]
+                else:
+                    cs = PCVMeshData.group_colors(ws)
+        except Exception as e:
+            owner.to_mesh_clear()
+            raise Exception(str(e))
         
         # and shuffle..
-        a = np.concatenate((vs, ns, cs), axis=1, )
-        np.random.shuffle(a)
-        vs = a[:, :3]
-        ns = a[:, 3:6]
-        cs = a[:, 6:]
+        if(rnd is None):
+            rnd = PCVRandomStreams()
+        i = rnd.stream().permutation(nv)
+        self.vs = vs[i]
+        self.ns = ns[i]
+        self.cs = cs[i]
         
-        self.vs = vs[:]
-        self.ns = ns[:]
-        self.cs = cs[:]
-        
-        bm.free()
         owner.to_mesh_clear()
 
 
 class PCVParticleSystemSampler():
-    def __init__(self, context, o, alive_only=True, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, ):
+    def __init__(self, context, o, alive_only=True, colorize=None, constant_color=None, vcols=None, uvtex=None, vgroup=None, rnd=None, ):
+        # particle data are read in bulk, colors are interpolated in emitter uv triangle where particle was emitted
         log("{}:".format(self.__class__.__name__), 0)
         
-        def remap(v, min1, max1, min2, max2, ):
-            def clamp(v, vmin, vmax):
-                if(vmax <= vmin):
-                    raise ValueError("Maximum value is smaller than or equal to minimum.")
-                if(v <= vmin):
-                    return vmin
-                if(v >= vmax):
-                    return vmax
-                return v
-            
-            def normalize(v, vmin, vmax):
-                return (v - vmin) / (vmax - vmin)
-            
-            def interpolate(nv, vmin, vmax):
-                return vmin + (vmax - vmin) * nv
-            
-            if(max1 - min1 == 0):
-                # handle zero division when min1 = max1
-                return min2
-            
-            r = interpolate(normalize(v, min1, max1), min2, max2)
-            return r
-        
-        vs = []
-        ns = []
-        cs = []
-        
         depsgraph = context.evaluated_depsgraph_get()
         if(o.modifiers):
             owner = o.evaluated_get(depsgraph)
@@ -5083,297 +5719,697 @@ class PCVParticleSystemSampler():
         
         o = owner
         
-        bm = bmesh.new()
-        bm.from_mesh(me)
-        bm.verts.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
-        
-        psys = o.particle_systems.active
-        if(psys is None):
-            raise Exception("Cannot find active particle system")
-        if(len(psys.particles) == 0):
-            raise Exception("Active particle system has 0 particles")
-        if(alive_only):
-            ok = False
-            for p in psys.particles:
-                if(p.alive_state == "ALIVE"):
-                    ok = True
-                    break
-            if(not ok):
-                raise Exception("Active particle system has 0 alive particles")
-        
-        mod = None
-        uv_no = None
-        if(colorize in ('VCOLS', 'UVTEX', 'GROUP_MONO', 'GROUP_COLOR', )):
-            if(uvtex is None):
-                raise Exception("Cannot find active uv layout on emitter")
-            for m in o.modifiers:
-                if(m.type == 'PARTICLE_SYSTEM'):
-                    if(m.particle_system == psys):
-                        mod = m
-                        break
-            uv_no = o.data.uv_layers.active_index
-        
-        if(colorize == 'UVTEX'):
-            try:
-                if(o.active_material is None):
-                    raise Exception("Cannot find active material")
-                uvtexnode = o.active_material.node_tree.nodes.active
-                if(uvtexnode is None):
-                    raise Exception("Cannot find active image texture in active material")
-                uvimage = uvtexnode.image
-                if(uvimage is None):
-                    raise Exception("Cannot find active image texture with loaded image in active material")
-                uvimage.update()
-                uvarray = np.asarray(uvimage.pixels)
-                uvarray = uvarray.reshape((uvimage.size[1], uvimage.size[0], 4))
-                uvlayer = bm.loops.layers.uv.active
-                if(uvlayer is None):
-                    raise Exception("Cannot find active UV layout")
-            except Exception as e:
-                raise Exception(str(e))
-        if(colorize == 'VCOLS'):
-            try:
-                col_layer = bm.loops.layers.color.active
-                if(col_layer is None):
-                    raise Exception()
-            except Exception:
-                raise Exception("Cannot find active vertex colors")
-            # for vertex groups, uv layout is required.. non-overlapping for best results
-            uvlayer = bm.loops.layers.uv.active
-            if(uvlayer is None):
-                raise Exception("Cannot find active UV layout")
-        if(colorize in ('GROUP_MONO', 'GROUP_COLOR')):
-            try:
-                group_layer = bm.verts.layers.deform.active
-                if(group_layer is None):
-                    raise Exception()
-                group_layer_index = o.vertex_groups.active.index
-            except Exception:
-                raise Exception("Cannot find active vertex group")
-            # for vertex groups, uv layout is required.. non-overlapping for best results
-            uvlayer = bm.loops.layers.uv.active
-            if(uvlayer is None):
-                raise Exception("Cannot find active UV layout")
-        
-        # flatten mesh by uv and add original face indexes as int layer
-        def simple_flatten_uv_mesh(bm):
-            bm.faces.index_update()
-            bm.faces.ensure_lookup_table()
-            r = bmesh.new()
-            ilayer = r.faces.layers.int.new('face_indexes')
-            for f in bm.faces:
-                fvs = []
-                for i, l in enumerate(f.loops):
-                    uv = l[uvlayer].uv
-                    rv = r.verts.new((uv.x, uv.y, 0.0))
-                    fvs.append(rv)
-                rf = r.faces.new(fvs)
-                rf[ilayer] = f.index
-            r.faces.index_update()
-            r.faces.ensure_lookup_table()
-            return r
-        
-        if(colorize in ('VCOLS', 'GROUP_MONO', 'GROUP_COLOR', )):
-            # i do not need extra flat mesh each time..
-            bmf = simple_flatten_uv_mesh(bm)
-            bmf_il = bmf.faces.layers.int['face_indexes']
-            # with that i can ray_cast uv location and get original index of face i hit
-            bmf_bvh = BVHTree.FromBMesh(bmf)
-        
-        for i, p in enumerate(psys.particles):
-            if(p.alive_state != "ALIVE" and alive_only):
-                continue
-            
-            vs.append(p.location.to_tuple())
-            
-            n = Vector((1.0, 0.0, 0.0, ))
-            n.rotate(p.rotation)
-            ns.append(n.normalized().to_tuple())
-            
+        try:
+            psys = o.particle_systems.active
+            if(psys is None):
+                raise Exception("Cannot find active particle system")
+            particles = psys.particles
+            l = len(particles)
+            if(l == 0):
+                raise Exception("Active particle system has 0 particles")
+            
+            mask = np.ones(l, dtype=bool, )
+            if(alive_only):
+                # alive_state is enum and can't be read in bulk, alive particle is born and not dead yet, as particle system decides it
+                bt = np.zeros(l, dtype=np.float32, )
+                particles.foreach_get("birth_time", bt, )
+                dt = np.zeros(l, dtype=np.float32, )
+                particles.foreach_get("die_time", dt, )
+                f = context.scene.frame_current_final
+                mask = (bt <= f) & (f < dt)
+                if(not np.any(mask)):
+                    raise Exception("Active particle system has 0 alive particles")
+            
+            vs = np.zeros(l * 3, dtype=np.float32, )
+            particles.foreach_get("location", vs, )
+            vs.shape = (-1, 3)
+            vs = vs[mask]
+            # particle x axis rotated by particle rotation quaternion, first column of rotation matrix
+            q = np.zeros(l * 4, dtype=np.float32, )
+            particles.foreach_get("rotation", q, )
+            q.shape = (-1, 4)
+            w, x, y, z = q[mask].T
+            ns = np.column_stack((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y + z * w), 2.0 * (x * z - y * w), )).astype(np.float32)
+            d = np.sqrt(np.einsum('ij,ij->i', ns, ns, ))
+            d[d == 0.0] = 1.0
+            ns /= d[:, np.newaxis]
+            
+            n = len(vs)
+            cs = np.zeros((n, 3), dtype=np.float32, )
             if(colorize is None):
-                cs.append((1.0, 0.0, 0.0, ))
+                cs[:] = (1.0, 0.0, 0.0, )
             elif(colorize == 'CONSTANT'):
-                cs.append(constant_color)
-            elif(colorize == 'VCOLS'):
-                uv = p.uv_on_emitter(mod)
-                # intersect with flattened mesh and get original index of face from emitter mesh
-                fl, fn, fi, di = bmf_bvh.ray_cast(Vector((uv.x, uv.y, -0.1)), Vector((0.0, 0.0, 1.0)), 0.2, )
-                fpoly = bmf.faces[fi]
-                oi = fpoly[bmf_il]
-                poly = bm.faces[oi]
-                # get final color from barycentric weights
-                ws = poly_3d_calc([fv.co for fv in fpoly.verts], p.location)
-                cols = [l[col_layer][:3] for l in poly.loops]
-                r = sum([cc[0] * ws[ci] for ci, cc in enumerate(cols)])
-                g = sum([cc[1] * ws[ci] for ci, cc in enumerate(cols)])
-                b = sum([cc[2] * ws[ci] for ci, cc in enumerate(cols)])
-                cs.append((r, g, b, ))
-            elif(colorize == 'UVTEX'):
-                uv = p.uv_on_emitter(mod)
-                w, h = uvimage.size
-                # x,y % 1.0 to wrap around if uv coordinate is outside 0.0-1.0 range
-                x = int(round(remap(uv.x % 1.0, 0.0, 1.0, 0, w - 1)))
-                y = int(round(remap(uv.y % 1.0, 0.0, 1.0, 0, h - 1)))
-                cs.append(tuple(uvarray[y][x][:3].tolist()))
-            elif(colorize == 'GROUP_MONO'):
-                uv = p.uv_on_emitter(mod)
-                fl, fn, fi, di = bmf_bvh.ray_cast(Vector((uv.x, uv.y, -0.1)), Vector((0.0, 0.0, 1.0)), 0.2, )
-                fpoly = bmf.faces[fi]
-                oi = fpoly[bmf_il]
-                poly = bm.faces[oi]
-                ws = poly_3d_calc([fv.co for fv in fpoly.verts], p.location)
-                weights = [pv[group_layer].get(group_layer_index, 0.0) for pv in poly.verts]
-                w = sum([ww * ws[wi] for wi, ww in enumerate(weights)])
-                cs.append((w, w, w, ))
-            elif(colorize == 'GROUP_COLOR'):
-                uv = p.uv_on_emitter(mod)
-                fl, fn, fi, di = bmf_bvh.ray_cast(Vector((uv.x, uv.y, -0.1)), Vector((0.0, 0.0, 1.0)), 0.2, )
-                fpoly = bmf.faces[fi]
-                oi = fpoly[bmf_il]
-                poly = bm.faces[oi]
-                ws = poly_3d_calc([fv.co for fv in fpoly.verts], p.location)
-                weights = [pv[group_layer].get(group_layer_index, 0.0) for pv in poly.verts]
-                w = sum([ww * ws[wi] for wi, ww in enumerate(weights)])
-                hue = remap(1.0 - w, 0.0, 1.0, 0.0, 1 / 1.5)
-                c = Color()
-                c.hsv = (hue, 1.0, 1.0, )
-                cs.append((c.r, c.g, c.b, ))
-        
-        a = np.concatenate((vs, ns, cs), axis=1, )
-        np.random.shuffle(a)
-        vs = a[:, :3]
-        ns = a[:, 3:6]
-        cs = a[:, 6:]
-        
-        self.vs = vs[:]
-        self.ns = ns[:]
-        self.cs = cs[:]
+                cs[:] = constant_color[:3]
+            else:
+                if(uvtex is None):
+                    raise Exception("Cannot find active uv layout on emitter")
+                mod = None
+                for m in o.modifiers:
+                    if(m.type == 'PARTICLE_SYSTEM'):
+                        if(m.particle_system == psys):
+                            mod = m
+                            break
+                uvlayer = me.uv_layers.active
+                if(uvlayer is None):
+                    raise Exception("Cannot find active UV layout")
+                # no bulk access to this one
+                puvs = np.array([tuple(p.uv_on_emitter(mod)) for i, p in enumerate(particles) if mask[i]], dtype=np.float64, ).reshape(-1, 2)
+                
+                if(colorize == 'UVTEX'):
+                    texture = PCVTextureSampler.from_object(o)
+                    cs = texture.sample(puvs)[:, :3]
+                else:
+                    if(colorize == 'VCOLS'):
+                        col_layer = me.vertex_colors.active
+                        if(col_layer is None):
+                            raise Exception("Cannot find active vertex colors")
+                        values = np.zeros(len(me.loops) * 4, dtype=np.float32, )
+                        col_layer.data.foreach_get("color", values, )
+                        values.shape = (-1, 4)
+                        values = values[:, :3]
+                    else:
+                        if(o.vertex_groups.active is None):
+                            raise Exception("Cannot find active vertex group")
+                        # per loop weights, so everything can be interpolated with loop indices
+                        ws = PCVMeshData.vertex_group_weights(me, o.vertex_groups.active.index, )
+                        vi = np.zeros(len(me.loops), dtype=np.int32, )
+                        me.loops.foreach_get("vertex_index", vi, )
+                        values = ws[vi][:, np.newaxis]
+                    
+                    # for vertex colors and groups uv layout is required.. non-overlapping for best results
+                    me.calc_loop_triangles()
+                    nt = len(me.loop_triangles)
+                    if(nt == 0):
+                        raise Exception("Mesh has no faces")
+                    tls = np.zeros(nt * 3, dtype=np.int32, )
+                    me.loop_triangles.foreach_get("loops", tls, )
+                    tls.shape = (-1, 3)
+                    uvs = np.zeros(len(me.loops) * 2, dtype=np.float64, )
+                    uvlayer.data.foreach_get("uv", uvs, )
+                    uvs.shape = (-1, 2)
+                    ti, ws = PCVMeshData.locate_uvs(uvs[tls], puvs, )
+                    found = ti >= 0
+                    v = np.einsum('ij,ijk->ik', ws[found], values[tls[ti[found]]], )
+                    if(colorize == 'VCOLS'):
+                        cs[found] = v
+                    elif(colorize == 'GROUP_MONO'):
+                        cs[found] = v
+                    else:
+                        cs[found] = PCVMeshData.group_colors(v[:, 0])
+        except Exception as e:
+            owner.to_mesh_clear()
+            raise Exception(str(e))
         
-        if(colorize in ('VCOLS', 'GROUP_MONO', 'GROUP_COLOR', )):
-            bmf.free()
+        if(rnd is None):
+            rnd = PCVRandomStreams()
+        i = rnd.stream().permutation(len(vs))
+        self.vs = vs[i]
+        self.ns = ns[i]
+        self.cs = cs[i]
         
-        bm.free()
         owner.to_mesh_clear()
 
 
 class PCVRandomVolumeSampler():
-    def __init__(self, ob, num_samples, rnd, ):
+    def __init__(self, context, ob, num_samples, rnd, batch_size=1000000, budget=10000000, ):
+        # rejection sampling in large batches, candidates are classified by ray parity along all three axes at once in numpy
         log("{}:".format(self.__class__.__name__), 0)
         
-        def remap(v, min1, max1, min2, max2, ):
-            def clamp(v, vmin, vmax):
-                if(vmax <= vmin):
-                    raise ValueError("Maximum value is smaller than or equal to minimum.")
-                if(v <= vmin):
-                    return vmin
-                if(v >= vmax):
-                    return vmax
-                return v
-            
-            def normalize(v, vmin, vmax):
-                return (v - vmin) / (vmax - vmin)
-            
-            def interpolate(nv, vmin, vmax):
-                return vmin + (vmax - vmin) * nv
-            
-            if(max1 - min1 == 0):
-                # handle zero division when min1 = max1
-                return min2
-            
-            r = interpolate(normalize(v, min1, max1), min2, max2)
-            return r
+        self.budget = budget
         
-        def is_point_inside_mesh_v1(point, ob, mwi, ):
-            axes = [Vector((1.0, 0.0, 0.0)), Vector((0.0, 1.0, 0.0)), Vector((0.0, 0.0, 1.0)), ]
-            r = False
-            for a in axes:
-                o = mwi @ point
-                c = 0
-                while True:
-                    _, l, n, i = ob.ray_cast(o, o + a * 10000.0)
-                    if(i == -1):
-                        break
-                    c += 1
-                    o = l + a * 0.00001
-                if(c % 2 == 0):
-                    r = True
-                    break
-            return not r
+        depsgraph = context.evaluated_depsgraph_get()
+        owner = ob.evaluated_get(depsgraph)
+        me = owner.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph, )
+        if(me is None):
+            raise Exception("Object does not have geometry data.")
+        
+        me.calc_loop_triangles()
+        nt = len(me.loop_triangles)
+        if(nt == 0):
+            owner.to_mesh_clear()
+            raise Exception("Mesh has no faces")
+        tris = np.zeros(nt * 3, dtype=np.int32, )
+        me.loop_triangles.foreach_get("vertices", tris, )
+        tris.shape = (-1, 3)
+        mvs = np.zeros(len(me.vertices) * 3, dtype=np.float64, )
+        me.vertices.foreach_get("co", mvs, )
+        mvs.shape = (-1, 3)
+        owner.to_mesh_clear()
         
-        def is_point_inside_mesh_v2(p, o, shift=0.000001, search_distance=10000.0, ):
-            p = Vector(p)
-            path = []
-            hits = 0
-            direction = Vector((0.0, 0.0, 1.0))
-            opposite_direction = direction.copy()
-            opposite_direction.negate()
-            path.append(p)
-            loc = p
-            ok = True
-            
-            def shift_vector(co, no, v):
-                return co + (no.normalized() * v)
-            
-            while(ok):
-                end = shift_vector(loc, direction, search_distance)
-                loc = shift_vector(loc, direction, shift)
-                _, loc, nor, ind = o.ray_cast(loc, end)
-                if(ind != -1):
-                    a = shift_vector(loc, opposite_direction, shift)
-                    path.append(a)
-                    hits += 1
-                else:
-                    ok = False
-            if(hits % 2 == 1):
-                return True
-            return False
+        self.tris = tris
+        self.mvs = mvs
+        self._grids = {}
         
-        def is_point_inside_mesh_v3(p, o):
-            _, loc, nor, ind = o.closest_point_on_mesh(p)
-            if(ind != -1):
-                v = loc - p
-                d = v.dot(nor)
-                if(d >= 0):
-                    return True, loc, nor, ind
-            return False, None, None, None
-        
-        def max_values(o):
-            bbox = [Vector(b) for b in o.bound_box]
-            nx = sorted(bbox, key=lambda c: c.x, reverse=False)[0].x
-            ny = sorted(bbox, key=lambda c: c.y, reverse=False)[0].y
-            nz = sorted(bbox, key=lambda c: c.z, reverse=False)[0].z
-            x = sorted(bbox, key=lambda c: c.x, reverse=True)[0].x
-            y = sorted(bbox, key=lambda c: c.y, reverse=True)[0].y
-            z = sorted(bbox, key=lambda c: c.z, reverse=True)[0].z
-            return nx, ny, nz, x, y, z
-        
-        xmin, ymin, zmin, xmax, ymax, zmax = max_values(ob)
-        
-        def sample():
-            x = remap(rnd.random(), 0.0, 1.0, xmin, xmax)
-            y = remap(rnd.random(), 0.0, 1.0, ymin, ymax)
-            z = remap(rnd.random(), 0.0, 1.0, zmin, zmax)
-            return Vector((x, y, z))
+        bmin = mvs.min(axis=0)
+        bmax = mvs.max(axis=0)
         
+        vs = np.zeros((num_samples, 3), dtype=np.float32, )
+        filled = 0
+        drawn = 0
+        rate = 0.5
+        batch = 0
+        progress = Progress(num_samples, indent=1, )
+        while(filled < num_samples):
+            need = num_samples - filled
+            l = int(min(max(need / rate * 1.1, 1000), batch_size))
+            ps = bmin + rnd.stream(batch).random((l, 3)) * (bmax - bmin)
+            batch += 1
+            ok = self.inside(ps)
+            k = np.count_nonzero(ok)
+            drawn += l
+            if(k == 0 and filled == 0 and drawn >= batch_size * 10):
+                raise Exception("Cannot find any point inside mesh volume, mesh might not be closed")
+            rate = max(k / l, 0.001)
+            a = ps[ok][:need]
+            vs[filled:filled + len(a)] = a
+            filled += len(a)
+            progress.step(len(a))
+        
+        # normal of closest surface point, exact, but one bvh query per sample, mathutils has no bulk nearest query
+        # it is the only per point python loop left and it dominates run time for large number of samples
+        log("normals..", 1)
+        bvh = BVHTree.FromPolygons(mvs.tolist(), tris.tolist(), )
+        ns = np.zeros((num_samples, 3), dtype=np.float32, )
+        for i, v in enumerate(vs.tolist()):
+            _, n, _, _ = bvh.find_nearest(v)
+            if(n is not None):
+                ns[i] = n
+        
+        self.vs = vs
+        self.ns = ns
+        self.cs = np.ones((num_samples, 3), dtype=np.float32, )
+    
+    def _grid(self, axis, ):
+        # triangles projected along axis, binned to 2d grid by their bounding rectangle, with precalculated edge functions and planes
+        if(axis in self._grids):
+            return self._grids[axis]
+        a, b = [i for i in range(3) if i != axis]
+        v = self.mvs
+        t = self.tris
+        tv = v[t]
+        tx = tv[:, :, a]
+        ty = tv[:, :, b]
+        nt = len(t)
+        
+        # edge functions e = A * y + B * x + C, evaluated from lower vertex index, so shared edges give exactly opposite values
+        # then flipped to be positive inside, points on edges are assigned by top-left like rule, so ray through shared edge or vertex is counted once
+        area = (tx[:, 1] - tx[:, 0]) * (ty[:, 2] - ty[:, 0]) - (tx[:, 2] - tx[:, 0]) * (ty[:, 1] - ty[:, 0])
+        o = np.sign(area)
+        coefs = np.zeros((nt, 3, 3), dtype=np.float64, )
+        edges = np.zeros((nt, 3), dtype=bool, )
+        for k, (u, w) in enumerate(((0, 1), (1, 2), (2, 0), )):
+            sw = t[:, u] > t[:, w]
+            p0 = v[np.where(sw, t[:, w], t[:, u])]
+            p1 = v[np.where(sw, t[:, u], t[:, w])]
+            dx = p1[:, a] - p0[:, a]
+            dy = p1[:, b] - p0[:, b]
+            f = np.where(sw, -1.0, 1.0) * o
+            coefs[:, k, 0] = dx * f
+            coefs[:, k, 1] = -dy * f
+            coefs[:, k, 2] = (dy * p0[:, a] - dx * p0[:, b]) * f
+            dx *= f
+            dy *= f
+            edges[:, k] = (dy > 0.0) | ((dy == 0.0) & (dx > 0.0))
+        # plane height h = P * x + Q * y + R
+        n = np.cross(tv[:, 1] - tv[:, 0], tv[:, 2] - tv[:, 0], )
+        nc = n[:, axis]
+        # triangles parallel with ray don't have area in projection and are never hit
+        valid = (o != 0.0) & (nc != 0.0)
+        nc[nc == 0.0] = 1.0
+        planes = np.zeros((nt, 3), dtype=np.float64, )
+        planes[:, 0] = -n[:, a] / nc
+        planes[:, 1] = -n[:, b] / nc
+        planes[:, 2] = tv[:, 0, axis] - planes[:, 0] * tx[:, 0] - planes[:, 1] * ty[:, 0]
+        
+        grid = PCVMeshData.triangle_grid(tx, ty, np.nonzero(valid)[0], )
+        
+        r = (a, b, grid, coefs, edges, planes, )
+        self._grids[axis] = r
+        return r
+    
+    def _crossings(self, ps, axis, ):
+        # number of triangles crossed by ray from points in positive axis direction
+        a, b, grid, coefs, edges, planes = self._grid(axis)
+        cell = PCVMeshData.grid_cells(grid, ps[:, a], 0) * grid['g'] + PCVMeshData.grid_cells(grid, ps[:, b], 1)
+        n = grid['counts'][cell]
+        r = np.zeros(len(ps), dtype=np.int64, )
+        # split queries to keep number of tested pairs within budget
+        cn = np.cumsum(n)
+        i = 0
+        while(i < len(ps)):
+            base = cn[i - 1] if i > 0 else 0
+            j = max(int(np.searchsorted(cn, base + self.budget, side='right', )), i + 1)
+            q, t = PCVMeshData.grid_pairs(grid, ps[i:j, a], ps[i:j, b], )
+            q += i
+            x = ps[q, a]
+            y = ps[q, b]
+            c = coefs[t]
+            e = c[:, :, 0] * y[:, np.newaxis] + c[:, :, 1] * x[:, np.newaxis] + c[:, :, 2]
+            hit = np.all((e > 0.0) | ((e == 0.0) & edges[t]), axis=1, )
+            pl = planes[t]
+            hit &= (pl[:, 0] * x + pl[:, 1] * y + pl[:, 2]) > ps[q, axis]
+            r[i:j] = np.bincount(q[hit] - i, minlength=j - i, )
+            i = j
+        return r
+    
+    def inside(self, ps, ):
+        # majority of parity tests along x, y and z, survives small holes and rays grazing surface
+        votes = np.zeros(len(ps), dtype=np.int8, )
+        for axis in range(3):
+            votes += (self._crossings(ps, axis) % 2).astype(np.int8)
+        return votes >= 2
+
+
+class PCVBatchSampler():
+    def __init__(self, context, objects, source='SURFACE', algorithm='WEIGHTED_RANDOM_IN_TRIANGLE', num_samples=100000, minimal_distance=0.1, sampling_exponent=10, alive_only=True, colorize='CONSTANT', constant_color=(0.7, 0.7, 0.7, ), seed=0, threads=None, ):
+        # mesh data of all objects are read on main thread, surface sampling runs in thread pool, numpy releases gil in heavy parts
+        # each object has its own random streams seeded with seed and object name, so result does not depend on object order or number of threads
+        log("{}:".format(self.__class__.__name__), 0)
+        
+        jobs = []
+        log("reading {} objects..".format(len(objects)), 1)
+        for o in objects:
+            if(o.type != 'MESH' and colorize != 'CONSTANT'):
+                raise Exception("Object '{}' does not support UV textures, vertex colors or vertex groups.".format(o.name))
+            rnd = PCVRandomStreams((seed, zlib.crc32(o.name.encode('utf-8')), ))
+            if(source == 'VERTICES'):
+                g = PCVVertexSampler(context, o, colorize=colorize, constant_color=constant_color, rnd=rnd, )
+                jobs.append((o, None, (g.vs, g.ns, g.cs, ), ))
+            elif(source == 'PARTICLES'):
+                g = PCVParticleSystemSampler(context, o, alive_only=alive_only, colorize=colorize, constant_color=constant_color, uvtex=(o.data.uv_layers.active if o.type == 'MESH' else None), rnd=rnd, )
+                jobs.append((o, None, (g.vs, g.ns, g.cs, ), ))
+            elif(source == 'SURFACE'):
+                d = PCVTriangleSurfaceSampler.read(context, o, colorize, )
+                jobs.append((o, rnd, d, ))
+            else:
+                raise Exception("Source type not implemented.")
+        
+        def work(job):
+            o, rnd, d = job
+            if(rnd is None):
+                return d
+            # objects are already spread over threads
+            if(algorithm == 'POISSON_DISK_SAMPLING'):
+                return PCVPoissonDiskSurfaceSampler.generate(d, rnd, minimal_distance, sampling_exponent, colorize, constant_color, threads=1, )
+            return PCVTriangleSurfaceSampler.generate(d, num_samples, rnd, colorize, constant_color, threads=1, )
+        
+        log("sampling..", 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+            rs = list(pool.map(work, jobs))
+        
+        self.objects = [j[0] for j in jobs]
+        self.results = rs
+        self.source = source
+        log("generated {} points.".format(sum([len(r[0]) for r in rs])), 1)
+    
+    def join(self, matrix=None, ):
+        # all points in one cloud, points are transformed to world and then to local space of object with given world matrix
         vs = []
         ns = []
         cs = []
-        progress = Progress(num_samples, indent=1, )
-        while(len(vs) < num_samples):
-            a = sample()
-            ok1 = is_point_inside_mesh_v1(a, ob, Matrix())
-            ok2 = is_point_inside_mesh_v2(a, ob)
-            ok3, location, normal, index = is_point_inside_mesh_v3(a, ob)
-            if(ok1 and ok2 and ok3):
-                vs.append(a.to_tuple())
-                ns.append(normal.to_tuple())
-                cs.append((1.0, 1.0, 1.0, ))
-                progress.step()
-        
-        self.vs = vs[:]
-        self.ns = ns[:]
-        self.cs = cs[:]
+        im = Matrix()
+        if(matrix is not None):
+            im = matrix.inverted()
+        for o, (v, n, c) in zip(self.objects, self.results):
+            m = im @ o.matrix_world
+            if(self.source == 'PARTICLES'):
+                # particle locations and rotations are in world space already
+                m = im
+            v, n = PCVTransform(m).apply(v.copy(), n.copy(), )
+            vs.append(v)
+            ns.append(n)
+            cs.append(c)
+        if(len(vs) == 0):
+            z = np.zeros((0, 3), dtype=np.float32, )
+            return z, z.copy(), z.copy()
+        return np.concatenate(vs), np.concatenate(ns), np.concatenate(cs)
+
+
+class PCVNeighbors():
+    # batched neighbor queries over voxel hash, points are sorted by cell key and all 27 neighbouring cells of a chunk of query points are looked up at once
+    # cell size >= search radius guarantees all neighbors within radius are found, knn queries not resolved within cell size are repeated with cell doubled
+    def __init__(self, vs, chunk_size=100000, budget=20000000, ):
+        self.vs = np.asarray(vs, dtype=np.float32, )
+        # number of query points processed at once
+        self.chunk_size = chunk_size
+        # maximum number of candidate pairs processed at once, query chunk is split when exceeded
+        self.budget = budget
+        self.cell = None
+    
+    def _build(self, cell, ):
+        vs = self.vs
+        mn = np.min(vs, axis=0, ).astype(np.float64)
+        mx = np.max(vs, axis=0, ).astype(np.float64)
+        # +1 and +2 padding, so neighbouring keys of border cells never wrap into other rows
+        dims = np.floor((mx - mn) / cell).astype(np.int64) + 3
+        if(np.prod(dims.astype(np.float64)) > 2 ** 62):
+            raise ValueError("Cell size {} is too small for point cloud extent".format(cell))
+        ijk = np.floor((vs - mn) / cell).astype(np.int64) + 1
+        keys = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+        del ijk
+        order = np.argsort(keys, kind='stable', )
+        
+        d = np.array([-1, 0, 1], dtype=np.int64, )
+        offsets = (d[:, None, None] * dims[1] + d[None, :, None]) * dims[2] + d[None, None, :]
+        
+        self.cell = cell
+        self.origin = mn
+        self.dims = dims
+        self.order = order
+        # everything else works with points sorted by cell, candidates from one cell are then contiguous in memory
+        self.skeys = keys[order]
+        self.svs = vs[order]
+        self.offsets = offsets.ravel()
+    
+    def _pairs(self, p, keys=None, ):
+        # p are query positions in sorted points, yields (p, q, o), q is index into p, o is position of candidate in sorted points, self pairs are excluded
+        # or when cell keys are given, p are indexes of external query points and nothing is excluded
+        if(keys is None):
+            nk = self.skeys[p][:, None] + self.offsets[None, :]
+        else:
+            nk = keys[:, None] + self.offsets[None, :]
+        s = np.searchsorted(self.skeys, nk, side='left', )
+        n = np.searchsorted(self.skeys, nk, side='right', ) - s
+        total = int(np.sum(n))
+        if(total > self.budget and len(p) > 1):
+            h = len(p) // 2
+            if(keys is None):
+                yield from self._pairs(p[:h])
+                yield from self._pairs(p[h:])
+            else:
+                yield from self._pairs(p[:h], keys[:h], )
+                yield from self._pairs(p[h:], keys[h:], )
+            return
+        
+        s = s.ravel()
+        n = n.ravel()
+        q = np.repeat(np.arange(len(p), dtype=np.int64, ), len(self.offsets), )
+        m = n > 0
+        s = s[m]
+        n = n[m]
+        q = q[m]
+        q = np.repeat(q, n, )
+        o = np.arange(total, dtype=np.int64, ) - np.repeat(np.cumsum(n) - n - s, n, )
+        if(keys is not None):
+            yield p, q, o
+            return
+        m = o != p[q]
+        yield p, q[m], o[m]
+    
+    def _distances(self, p, q, o, ):
+        # np.take is considerably faster than fancy indexing here
+        d = np.take(self.svs, o, axis=0, )
+        d -= np.take(self.svs, np.take(p, q, ), axis=0, )
+        return np.einsum('ij,ij->i', d, d, )
+    
+    def radius_count(self, radius, ):
+        # number of other points within radius for each point
+        l = len(self.vs)
+        counts = np.zeros(l, dtype=np.int64, )
+        if(l < 2):
+            return counts
+        self._build(radius)
+        r2 = radius ** 2
+        progress = Progress(l, indent=1, )
+        for i in range(0, l, self.chunk_size):
+            for p, q, o in self._pairs(np.arange(i, min(i + self.chunk_size, l), dtype=np.int64, )):
+                d2 = self._distances(p, q, o, )
+                counts[self.order[p]] += np.bincount(q[d2 <= r2], minlength=len(p), )
+            progress.step(min(self.chunk_size, l - i))
+        return counts
+    
+    def within(self, vs, radius, ):
+        # for each of other points, True if there is any point within radius
+        vs = np.asarray(vs, dtype=np.float32, )
+        mask = np.zeros(len(vs), dtype=bool, )
+        if(len(self.vs) == 0):
+            return mask
+        if(self.cell != radius):
+            self._build(radius)
+        r2 = radius ** 2
+        for i in range(0, len(vs), self.chunk_size):
+            c = vs[i:i + self.chunk_size]
+            ijk = np.floor((c - self.origin) / self.cell).astype(np.int64) + 1
+            # points outside of grid have no neighbors, and their keys would wrap
+            ok = np.all((ijk >= 0) & (ijk < self.dims), axis=1, )
+            qi = np.nonzero(ok)[0]
+            ijk = ijk[ok]
+            keys = (ijk[:, 0] * self.dims[1] + ijk[:, 1]) * self.dims[2] + ijk[:, 2]
+            for p, q, o in self._pairs(qi, keys, ):
+                d = np.take(self.svs, o, axis=0, )
+                d -= np.take(c, np.take(p, q, ), axis=0, )
+                d2 = np.einsum('ij,ij->i', d, d, )
+                mask[i + p[q[d2 <= r2]]] = True
+        return mask
+    
+    def _knn_cell(self, k, ):
+        # initial cell size estimate, from bounding box volume and then corrected by measured cell occupancy, points are assumed to be spread over surfaces
+        vs = self.vs
+        l = len(vs)
+        e = np.max(vs, axis=0, ) - np.min(vs, axis=0, )
+        e = e[e > 0]
+        if(len(e) == 0):
+            return 1.0
+        c = (np.prod(e) * k / l) ** (1 / len(e))
+        self._build(c)
+        u = np.count_nonzero(np.diff(self.skeys)) + 1
+        m = l / u
+        t = max(k / 2, 1.0)
+        return c * math.sqrt(t / m)
+    
+    def iter_knn(self, k, ):
+        # yields (qi, idx, d2) in chunks, idx and d2 are (len(qi), k) arrays sorted by distance, order of chunks is arbitrary
+        l = len(self.vs)
+        k = min(k, l - 1)
+        if(k < 1):
+            return
+        cell = self._knn_cell(k)
+        remaining = None
+        progress = Progress(l, indent=1, )
+        while(True):
+            self._build(cell)
+            c2 = cell ** 2
+            if(remaining is None):
+                todo = np.arange(l, dtype=np.int64, )
+            else:
+                # original indexes to sorted positions of current grid
+                inv = np.empty(l, dtype=np.int64, )
+                inv[self.order] = np.arange(l, dtype=np.int64, )
+                todo = np.sort(inv[remaining])
+            unresolved = []
+            for i in range(0, len(todo), self.chunk_size):
+                for p, q, o in self._pairs(todo[i:i + self.chunk_size]):
+                    d2 = self._distances(p, q, o, )
+                    # resolved when there are k candidates within cell, farther points might have been missed
+                    m = d2 <= c2
+                    q = q[m]
+                    o = o[m]
+                    d2 = d2[m]
+                    # q is already non-decreasing, sort by distance within each query with single key
+                    s = np.argsort(q + d2 / (c2 * 1.001), )
+                    o = o[s]
+                    d2 = d2[s]
+                    cnt = np.bincount(q, minlength=len(p), )
+                    gs = np.cumsum(cnt) - cnt
+                    ok = cnt >= k
+                    unresolved.append(self.order[p[~ok]])
+                    if(not np.any(ok)):
+                        continue
+                    g = gs[ok][:, None] + np.arange(k, dtype=np.int64, )[None, :]
+                    progress.step(int(np.count_nonzero(ok)))
+                    yield self.order[p[ok]], self.order[o[g]], d2[g]
+            remaining = np.concatenate(unresolved)
+            if(len(remaining) == 0):
+                break
+            cell *= 2
+    
+    def knn_mean_distance(self, k, ):
+        # mean distance to k nearest neighbors for each point
+        ds = np.zeros(len(self.vs), dtype=np.float32, )
+        for qi, idx, d2 in self.iter_knn(k):
+            ds[qi] = np.mean(np.sqrt(d2), axis=1, )
+        return ds
+
+    def pca_normals(self, k, viewpoint=None, ):
+        # normal is eigenvector of smallest eigenvalue of covariance of point and its k nearest neighbors
+        # normals are unoriented unless viewpoint is given, then they are flipped to face it
+        vs = self.vs
+        ns = np.zeros((len(vs), 3), dtype=np.float32, )
+        ns[:, 2] = 1.0
+        for qi, idx, d2 in self.iter_knn(k):
+            ps = np.concatenate((vs[qi][:, None, :], np.take(vs, idx, axis=0, ), ), axis=1, ).astype(np.float64)
+            ps -= np.mean(ps, axis=1, )[:, None, :]
+            cov = np.einsum('nki,nkj->nij', ps, ps, )
+            w, v = np.linalg.eigh(cov)
+            ns[qi] = v[:, :, 0]
+        if(viewpoint is not None):
+            d = np.asarray(viewpoint, dtype=np.float32, ) - vs
+            m = np.einsum('ij,ij->i', ns, d, ) < 0.0
+            ns[m] *= -1.0
+        return ns
+
+
+class PCVRegion():
+    # points inside convex region, point is inside when dot((x, y, z, 1), plane) >= 0 for all planes, the same test as clip planes shader does
+    # points are bucketed to coarse grid, cells entirely inside or outside are resolved from their corners, only points in cells crossing region boundary are tested
+    def __init__(self, vs, cells=64, ):
+        self.vs = vs
+        l = len(vs)
+        mn = np.min(vs, axis=0, ).astype(np.float64)
+        mx = np.max(vs, axis=0, ).astype(np.float64)
+        size = (mx - mn) / cells
+        size[size <= 0.0] = 1.0
+        ijk = np.clip(np.floor((vs - mn) / size).astype(np.int64), 0, cells - 1, )
+        keys = (ijk[:, 0] * cells + ijk[:, 1]) * cells + ijk[:, 2]
+        del ijk
+        order = np.argsort(keys, kind='stable', )
+        if(l < 2 ** 31):
+            order = order.astype(np.int32)
+        counts = np.bincount(keys, minlength=cells ** 3, )
+        del keys
+        
+        occupied = np.nonzero(counts)[0]
+        self.order = order
+        self.counts = counts[occupied]
+        self.starts = (np.cumsum(counts) - counts)[occupied]
+        ijk = np.column_stack((occupied // (cells * cells), (occupied // cells) % cells, occupied % cells, ))
+        lo = mn + ijk * size
+        corners = np.array(list(itertools.product((0, 1), repeat=3, )), dtype=np.float64, )
+        self.corners = lo[:, None, :] + corners[None, :, :] * size
+    
+    @classmethod
+    def frustum_planes(cls, m, ):
+        # planes of view frustum from projection matrix, point is inside when -w <= x, y, z <= w
+        m = np.array(m, dtype=np.float64, )
+        return np.array((m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2], ))
+    
+    def _gather(self, cells, ):
+        n = self.counts[cells]
+        total = int(np.sum(n))
+        i = np.arange(total, dtype=np.int64, ) + np.repeat(self.starts[cells] - (np.cumsum(n) - n), n, )
+        return self.order[i]
+    
+    def query(self, planes, ):
+        # sorted indexes of points inside
+        planes = np.array(planes, dtype=np.float64, ).reshape(-1, 4)
+        d = np.einsum('cki,pi->ckp', self.corners, planes[:, :3], ) + planes[:, 3]
+        inside = np.all(d >= 0.0, axis=(1, 2), )
+        outside = np.any(np.all(d < 0.0, axis=1, ), axis=1, )
+        partial = ~(inside | outside)
+        r = self._gather(np.nonzero(inside)[0])
+        p = self._gather(np.nonzero(partial)[0])
+        if(len(p)):
+            d = self.vs[p].astype(np.float64) @ planes[:, :3].T + planes[:, 3]
+            r = np.concatenate((r, p[np.all(d >= 0.0, axis=1, )], ))
+        return np.sort(r).astype(np.int64)
+
+
+class PCVRasterizer():
+    # software point rasterizer, draws the same image as offscreen render with basic shaders, for render nodes without gpu
+    # points are sorted front to back and splatted in chunks, first point reaching a pixel wins, which is what depth test with GL_LESS does
+    cache = {}
+    
+    def __init__(self, width, height, chunk_size=250000, budget=4000000, targets=1, ):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        # fragments splatted at once, each point has point size squared of them, so number of points in chunk depends on point size
+        self.budget = budget
+        self.index_dtype = np.int32 if(width * height < 2 ** 31) else np.int64
+        # rows from bottom, the same as glReadPixels and image pixels, rgba of each target side by side, so all are splatted at once
+        self.pixels = np.zeros((height * width, 4 * targets), dtype=np.float32, )
+        self.covered = np.zeros(height * width, dtype=bool, )
+    
+    @classmethod
+    def points(cls, path, options, ):
+        # point cloud read from file when it is not loaded in viewport, i.e. blender running in background
+        k = (os.path.getmtime(path), options, )
+        if(path in cls.cache):
+            if(cls.cache[path][0] == k):
+                return cls.cache[path][1]
+        d = PCVSequence.read(path, options, )
+        d = (d['vs'], d['ns'], d['cs'], )
+        cls.cache = {path: (k, d, ), }
+        return d
+    
+    @classmethod
+    def clear(cls, ):
+        cls.cache = {}
+    
+    @classmethod
+    def depth(cls, vs, matrix, center, maxdist, ):
+        # f_depth of depth shaders, clip space z of point relative to center
+        m = np.array(matrix, dtype=np.float64, )
+        z = np.dot(vs, m[2, :3], ) + m[2, 3]
+        d = (np.dot(center, m[2, :3], ) + m[2, 3]) - z
+        return (((d - (-maxdist)) / (maxdist - d)) / 2).astype(np.float32)
+    
+    @classmethod
+    def illumination(cls, ns, light_direction, light_intensity, shadow_direction, shadow_intensity, ):
+        # light - shadow of illumination shaders
+        l = np.maximum(np.dot(ns, -np.array(light_direction, dtype=np.float32, ), ), 0.0, )[:, None] * np.array(light_intensity, dtype=np.float32, )
+        s = np.maximum(np.dot(ns, -np.array(shadow_direction, dtype=np.float32, ), ), 0.0, )[:, None] * np.array(shadow_intensity, dtype=np.float32, )
+        return l - s
+    
+    def _project(self, vs, m, ):
+        # window coordinates and depth of points inside clip volume, points are clipped by center like gpu does
+        xs = []
+        ys = []
+        zs = []
+        ii = []
+        for i in range(0, len(vs), self.chunk_size):
+            v = vs[i:i + self.chunk_size]
+            h = np.dot(v, m[:, :3].T, ) + m[:, 3]
+            w = h[:, 3]
+            ok = (w > 0.0) & np.all(np.abs(h[:, :3]) <= w[:, None], axis=1, )
+            h = h[ok]
+            w = w[ok]
+            xs.append(((h[:, 0] / w + 1.0) * 0.5 * self.width).astype(np.float32))
+            ys.append(((h[:, 1] / w + 1.0) * 0.5 * self.height).astype(np.float32))
+            zs.append((h[:, 2] / w).astype(np.float32))
+            ii.append(np.nonzero(ok)[0] + i)
+        return np.concatenate(xs), np.concatenate(ys), np.concatenate(zs), np.concatenate(ii),
+    
+    def draw(self, vs, colors, matrix, point_size, alpha_radius, ):
+        # vs in object space, matrix is projection @ view @ object matrix, colors are final rgba of each point, (n, 4 * targets)
+        x, y, z, ii = self._project(vs, np.array(matrix, dtype=np.float64, ), )
+        order = np.argsort(z, kind='stable', )
+        x = x[order]
+        y = y[order]
+        ii = ii[order]
+        
+        # pixels of point sprite are those with center inside point square, then those outside of alpha radius are discarded like in fragment shader
+        s = np.float32(point_size)
+        k = int(math.ceil(s)) + 1
+        # float32 offsets, with integer offsets candidates would be promoted to float64
+        dx = np.tile(np.arange(k, dtype=np.float32, ), k, )
+        dy = np.repeat(np.arange(k, dtype=np.float32, ), k, )
+        w = self.width
+        h = self.height
+        n = max(1, self.budget // (k * k))
+        for i in range(0, len(x), n):
+            cx = x[i:i + n]
+            cy = y[i:i + n]
+            px = np.ceil(cx - s / 2 - np.float32(0.5))[:, None] + dx
+            py = np.ceil(cy - s / 2 - np.float32(0.5))[:, None] + dy
+            ox = 2.0 * (px + np.float32(0.5) - cx[:, None]) / s
+            oy = 2.0 * (py + np.float32(0.5) - cy[:, None]) / s
+            m = (ox < 1.0) & (oy < 1.0) & (ox * ox + oy * oy <= alpha_radius)
+            m &= (px >= 0) & (px < w) & (py >= 0) & (py < h)
+            p = np.nonzero(m)
+            pix = py[p].astype(self.index_dtype) * w + px[p].astype(self.index_dtype)
+            pts = p[0]
+            # fragments are in front to back order, take first of each pixel not yet covered by closer points
+            f = ~self.covered[pix]
+            pix = pix[f]
+            pts = pts[f]
+            pix, first = np.unique(pix, return_index=True, )
+            self.pixels[pix] = colors[ii[i + pts[first]]]
+            self.covered[pix] = True
+    
+    def image(self, target=0, ):
+        # flat rgba in 0.0-1.0, as offscreen buffer readback would have
+        return np.clip(self.pixels[:, target * 4:(target + 1) * 4], 0.0, 1.0, ).ravel()
 
 
 class PCV_OT_init(Operator):
@@ -5542,14 +6578,20 @@ class PCV_OT_render(Operator):
                 if(v['ready']):
                     if(v['draw']):
                         ok = True
+        # cpu backend can read points from file, e.g. when blender runs in background
+        if(pcv.render_backend == 'CPU' and pcv.filepath != ''):
+            ok = True
         return ok
     
     def execute(self, context):
         _t = time.time()
         
-        bgl.glEnable(bgl.GL_PROGRAM_POINT_SIZE)
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        bgl.glEnable(bgl.GL_BLEND)
+        pcv = context.object.point_cloud_visualizer
+        
+        if(pcv.render_backend == 'GPU'):
+            bgl.glEnable(bgl.GL_PROGRAM_POINT_SIZE)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glEnable(bgl.GL_BLEND)
         
         scene = context.scene
         render = scene.render
@@ -5558,88 +6600,26 @@ class PCV_OT_render(Operator):
         original_depth = image_settings.color_depth
         image_settings.color_depth = '8'
         
-        pcv = context.object.point_cloud_visualizer
-        
-        if(pcv.render_resolution_linked):
-            scale = render.resolution_percentage / 100
-            
-            if(pcv.render_supersampling > 1):
-                scale *= pcv.render_supersampling
-            
-            width = int(render.resolution_x * scale)
-            height = int(render.resolution_y * scale)
-        else:
-            scale = pcv.render_resolution_percentage / 100
-            
-            if(pcv.render_supersampling > 1):
-                scale *= pcv.render_supersampling
-            
-            width = int(pcv.render_resolution_x * scale)
-            height = int(pcv.render_resolution_y * scale)
+        width, height = self.resolution(context)
         
-        cloud = PCVManager.cache[pcv.uuid]
+        # streamed sequence might still show older frame
+        PCVSequence.update(scene, wait=True, )
+        cloud = PCVManager.cache.get(pcv.uuid)
         cam = scene.camera
         if(cam is None):
             self.report({'ERROR'}, "No camera found.")
             return {'CANCELLED'}
         
-        def get_output_path():
-            p = bpy.path.abspath(pcv.render_path)
-            ok = True
-            
-            # ensure soem directory and filename
-            h, t = os.path.split(p)
-            if(h == ''):
-                # next to blend file
-                h = bpy.path.abspath('//')
-            
-            if(not os.path.exists(h)):
-                self.report({'ERROR'}, "Directory does not exist ('{}').".format(h))
-                ok = False
-            if(not os.path.isdir(h)):
-                self.report({'ERROR'}, "Not a directory ('{}').".format(h))
-                ok = False
-            
-            if(t == ''):
-                # default name
-                t = 'pcv_render_###.png'
-            
-            # ensure extension
-            p = os.path.join(h, t)
-            p = bpy.path.ensure_ext(p, '.png', )
-            h, t = os.path.split(p)
-            
-            # ensure frame number
-            if('#' not in t):
-                n, e = os.path.splitext(t)
-                n = '{}_###'.format(n)
-                t = '{}{}'.format(n, e)
-            
-            # return with a bit of luck valid path
-            p = os.path.join(h, t)
-            return ok, p
-        
-        def swap_frame_number(p):
-            fn = scene.frame_current
-            h, t = os.path.split(p)
-            
-            # swap all occurences of # with zfilled frame number
-            pattern = r'#+'
-            
-            def repl(m):
-                l = len(m.group(0))
-                return str(fn).zfill(l)
-            
-            t = re.sub(pattern, repl, t, )
-            p = os.path.join(h, t)
-            return p
+        ext = '.png'
+        if(pcv.render_file_format == 'OPEN_EXR'):
+            ext = '.exr'
         
         bd = context.blend_data
         if(bd.filepath == "" and not bd.is_saved):
             self.report({'ERROR'}, "Save .blend file first.")
             return {'CANCELLED'}
         
-        ok, output_path = get_output_path()
+        ok, output_path = self.output_path(self, context, ext, )
         if(not ok):
             return {'CANCELLED'}
         
@@ -5647,153 +6627,306 @@ class PCV_OT_render(Operator):
         pcv.render_path = output_path
         
         # swap frame number
-        output_path = swap_frame_number(output_path)
+        output_path = self.frame_path(output_path, scene.frame_current, )
         
-        # TODO: on my machine, maximum size is 16384, is it max in general or just my hardware? check it, and add some warning, or hadle this: RuntimeError: gpu.offscreen.new(...) failed with 'GPUFrameBuffer: framebuffer status GL_FRAMEBUFFER_INCOMPLETE_ATTACHMENT somehow..
-        offscreen = GPUOffScreen(width, height)
-        offscreen.bind()
-        try:
-            gpu.matrix.load_matrix(Matrix.Identity(4))
-            gpu.matrix.load_projection_matrix(Matrix.Identity(4))
+        if(pcv.render_backend == 'CPU'):
+            try:
+                buffer = self.rasterize(context, cloud, width, height, )
+            except Exception as e:
+                self.report({'ERROR'}, str(e))
+                return {'CANCELLED'}
+        else:
+            # TODO: on my machine, maximum size is 16384, is it max in general or just my hardware? check it, and add some warning, or hadle this: RuntimeError: gpu.offscreen.new(...) failed with 'GPUFrameBuffer: framebuffer status GL_FRAMEBUFFER_INCOMPLETE_ATTACHMENT somehow..
+            offscreen = GPUOffScreen(width, height)
+            offscreen.bind()
+            try:
+                self.draw(context, cloud, width, height, )
+                buffer = self.readback(width, height, )
+            except Exception as e:
+                self.report({'ERROR'}, str(e))
+                return {'CANCELLED'}
             
-            bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
-            bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
-            
-            o = cloud['object']
-            vs = cloud['vertices']
-            cs = cloud['colors']
-            ns = cloud['normals']
-            
-            dp = pcv.render_display_percent
-            l = int((len(vs) / 100) * dp)
-            if(dp >= 99):
-                l = len(vs)
-            vs = vs[:l]
-            cs = cs[:l]
-            ns = ns[:l]
-            
-            use_smoothstep = False
-            if(pcv.render_smoothstep):
-                # for anti-aliasing basic shader should be enabled
-                # if(not pcv.illumination and not pcv.override_default_shader):
-                if(not pcv.override_default_shader):
-                    use_smoothstep = True
-                    # sort by depth
-                    mw = o.matrix_world
-                    depth = []
-                    for i, v in enumerate(vs):
-                        vw = mw @ Vector(v)
-                        depth.append(world_to_camera_view(scene, cam, vw)[2])
-                    zps = zip(depth, vs, cs, ns)
-                    sps = sorted(zps, key=lambda a: a[0])
-                    # split and reverse
-                    vs = [a for _, a, b, c in sps][::-1]
-                    cs = [b for _, a, b, c in sps][::-1]
-                    ns = [c for _, a, b, c in sps][::-1]
-            
-            if(pcv.dev_depth_enabled):
-                if(pcv.illumination):
-                    shader = GPUShader(PCVShaders.depth_vertex_shader_illumination, PCVShaders.depth_fragment_shader_illumination, )
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, "normal": ns, })
-                elif(pcv.dev_depth_false_colors):
-                    shader = GPUShader(PCVShaders.depth_vertex_shader_false_colors, PCVShaders.depth_fragment_shader_false_colors, )
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, })
-                else:
-                    shader = GPUShader(PCVShaders.depth_vertex_shader_simple, PCVShaders.depth_fragment_shader_simple, )
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, })
-            elif(pcv.dev_normal_colors_enabled):
-                shader = GPUShader(PCVShaders.normal_colors_vertex_shader, PCVShaders.normal_colors_fragment_shader, )
-                batch = batch_for_shader(shader, 'POINTS', {"position": vs, "normal": ns, })
-            elif(pcv.dev_position_colors_enabled):
-                shader = GPUShader(PCVShaders.position_colors_vertex_shader, PCVShaders.position_colors_fragment_shader, )
-                batch = batch_for_shader(shader, 'POINTS', {"position": vs, })
-            elif(pcv.illumination):
-                if(use_smoothstep):
-                    shader = GPUShader(PCVShaders.vertex_shader_illumination_render_smooth, PCVShaders.fragment_shader_illumination_render_smooth)
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, "normal": ns, })
-                else:
-                    shader = GPUShader(PCVShaders.vertex_shader_illumination, PCVShaders.fragment_shader_illumination)
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, "normal": ns, })
+            finally:
+                bgl.glDisable(bgl.GL_PROGRAM_POINT_SIZE)
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+                bgl.glDisable(bgl.GL_BLEND)
+                offscreen.unbind()
+                offscreen.free()
+        
+        # image from buffer
+        image_name = "pcv_output"
+        if(image_name not in bpy.data.images):
+            bpy.data.images.new(image_name, width, height, float_buffer=(pcv.render_file_format == 'OPEN_EXR'), )
+        image = bpy.data.images[image_name]
+        if(pcv.render_backend == 'CPU'):
+            if(hasattr(image.pixels, 'foreach_set')):
+                image.pixels.foreach_set(buffer)
             else:
-                if(use_smoothstep):
-                    shader = GPUShader(PCVShaders.vertex_shader_simple_render_smooth, PCVShaders.fragment_shader_simple_render_smooth)
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, })
-                else:
-                    shader = GPUShader(PCVShaders.vertex_shader_simple, PCVShaders.fragment_shader_simple)
-                    batch = batch_for_shader(shader, 'POINTS', {"position": vs, "color": cs, })
+                image.pixels[:] = buffer.tolist()
+        else:
+            image.pixels = [v / 255 for v in buffer]
+        # image.scale(width, height)
+        
+        if(pcv.render_supersampling > 1):
+            width = int(width / pcv.render_supersampling)
+            height = int(height / pcv.render_supersampling)
+            image.scale(width, height)
+        
+        self.save(self, scene, image, output_path, pcv.render_file_format, )
+        
+        # restore
+        image_settings.color_depth = original_depth
+        # cleanup
+        bpy.data.images.remove(image)
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        print("PCV: Frame completed in {}.".format(_d))
+        
+        return {'FINISHED'}
+    
+    @classmethod
+    def resolution(cls, context, ):
+        # render size in pixels, including supersampling
+        render = context.scene.render
+        pcv = context.object.point_cloud_visualizer
+        if(pcv.render_resolution_linked):
+            scale = render.resolution_percentage / 100
             
-            shader.bind()
+            if(pcv.render_supersampling > 1):
+                scale *= pcv.render_supersampling
             
-            view_matrix = cam.matrix_world.inverted()
-            depsgraph = bpy.context.evaluated_depsgraph_get()
-            camera_matrix = cam.calc_matrix_camera(depsgraph, x=render.resolution_x, y=render.resolution_y, scale_x=render.pixel_aspect_x, scale_y=render.pixel_aspect_y, )
-            perspective_matrix = camera_matrix @ view_matrix
+            width = int(render.resolution_x * scale)
+            height = int(render.resolution_y * scale)
+        else:
+            scale = pcv.render_resolution_percentage / 100
             
-            shader.uniform_float("perspective_matrix", perspective_matrix)
-            shader.uniform_float("object_matrix", o.matrix_world)
             if(pcv.render_supersampling > 1):
-                shader.uniform_float("point_size", pcv.render_point_size * pcv.render_supersampling)
-            else:
-                shader.uniform_float("point_size", pcv.render_point_size)
-            shader.uniform_float("alpha_radius", pcv.alpha_radius)
-            shader.uniform_float("global_alpha", pcv.global_alpha)
+                scale *= pcv.render_supersampling
             
-            if(pcv.dev_depth_enabled):
-                # pm = bpy.context.region_data.perspective_matrix
-                # shader.uniform_float("perspective_matrix", pm)
-                # shader.uniform_float("object_matrix", o.matrix_world)
-                
-                # NOTE: precalculating and storing following should speed up things a bit, but then it won't reflect edits..
-                cx = np.sum(vs[:, 0]) / len(vs)
-                cy = np.sum(vs[:, 1]) / len(vs)
-                cz = np.sum(vs[:, 2]) / len(vs)
-                _, _, s = o.matrix_world.decompose()
-                l = s.length
-                maxd = abs(np.max(vs))
-                mind = abs(np.min(vs))
-                maxdist = maxd
-                if(mind > maxd):
-                    maxdist = mind
-                shader.uniform_float("maxdist", float(maxdist) * l)
-                shader.uniform_float("center", (cx, cy, cz, ))
-                
-                shader.uniform_float("brightness", pcv.dev_depth_brightness)
-                shader.uniform_float("contrast", pcv.dev_depth_contrast)
-                
-                # shader.uniform_float("point_size", pcv.point_size)
-                # shader.uniform_float("alpha_radius", pcv.alpha_radius)
-                # shader.uniform_float("global_alpha", pcv.global_alpha)
-                
-                if(pcv.illumination):
-                    cm = Matrix(((-1.0, 0.0, 0.0, 0.0, ), (0.0, -0.0, 1.0, 0.0, ), (0.0, -1.0, -0.0, 0.0, ), (0.0, 0.0, 0.0, 1.0, ), ))
-                    _, obrot, _ = o.matrix_world.decompose()
-                    mr = obrot.to_matrix().to_4x4()
-                    mr.invert()
-                    direction = cm @ pcv.light_direction
-                    direction = mr @ direction
-                    shader.uniform_float("light_direction", direction)
-                    inverted_direction = direction.copy()
-                    inverted_direction.negate()
-                    c = pcv.light_intensity
-                    shader.uniform_float("light_intensity", (c, c, c, ))
-                    shader.uniform_float("shadow_direction", inverted_direction)
-                    c = pcv.shadow_intensity
-                    shader.uniform_float("shadow_intensity", (c, c, c, ))
-                    if(pcv.dev_depth_false_colors):
-                        shader.uniform_float("color_a", pcv.dev_depth_color_a)
-                        shader.uniform_float("color_b", pcv.dev_depth_color_b)
-                    else:
-                        shader.uniform_float("color_a", (1.0, 1.0, 1.0))
-                        shader.uniform_float("color_b", (0.0, 0.0, 0.0))
-                else:
-                    if(pcv.dev_depth_false_colors):
-                        shader.uniform_float("color_a", pcv.dev_depth_color_a)
-                        shader.uniform_float("color_b", pcv.dev_depth_color_b)
-            elif(pcv.dev_normal_colors_enabled):
-                pass
-            elif(pcv.dev_position_colors_enabled):
-                pass
-            elif(pcv.illumination and pcv.has_normals and cloud['illumination']):
+            width = int(pcv.render_resolution_x * scale)
+            height = int(pcv.render_resolution_y * scale)
+        return width, height
+    
+    @classmethod
+    def output_path(cls, operator, context, ext, ):
+        # output path with # for frame number, errors are reported to operator
+        pcv = context.object.point_cloud_visualizer
+        p = bpy.path.abspath(pcv.render_path)
+        ok = True
+        
+        # ensure soem directory and filename
+        h, t = os.path.split(p)
+        if(h == ''):
+            # next to blend file
+            h = bpy.path.abspath('//')
+        
+        if(not os.path.exists(h)):
+            operator.report({'ERROR'}, "Directory does not exist ('{}').".format(h))
+            ok = False
+        if(not os.path.isdir(h)):
+            operator.report({'ERROR'}, "Not a directory ('{}').".format(h))
+            ok = False
+        
+        if(t == ''):
+            # default name
+            t = 'pcv_render_###.png'
+        
+        # ensure extension
+        n, e = os.path.splitext(t)
+        if(e.lower() in ('.png', '.exr', )):
+            t = n
+        p = os.path.join(h, t)
+        p = bpy.path.ensure_ext(p, ext, )
+        h, t = os.path.split(p)
+        
+        # ensure frame number
+        if('#' not in t):
+            n, e = os.path.splitext(t)
+            n = '{}_###'.format(n)
+            t = '{}{}'.format(n, e)
+        
+        # return with a bit of luck valid path
+        p = os.path.join(h, t)
+        return ok, p
+    
+    @classmethod
+    def frame_path(cls, p, fn, ):
+        h, t = os.path.split(p)
+        
+        # swap all occurences of # with zfilled frame number
+        pattern = r'#+'
+        
+        def repl(m):
+            l = len(m.group(0))
+            return str(fn).zfill(l)
+        
+        t = re.sub(pattern, repl, t, )
+        p = os.path.join(h, t)
+        return p
+    
+    @classmethod
+    def points(cls, context, cloud, ):
+        # rendered part of points, sorted by depth for smooth circles
+        scene = context.scene
+        cam = scene.camera
+        pcv = context.object.point_cloud_visualizer
+        
+        o = cloud['object']
+        vs = cloud['vertices']
+        cs = cloud['colors']
+        ns = cloud['normals']
+        
+        dp = pcv.render_display_percent
+        l = int((len(vs) / 100) * dp)
+        if(dp >= 99):
+            l = len(vs)
+        vs = vs[:l]
+        cs = cs[:l]
+        ns = ns[:l]
+        
+        use_smoothstep = False
+        order = None
+        if(pcv.render_smoothstep):
+            # for anti-aliasing basic shader should be enabled
+            # if(not pcv.illumination and not pcv.override_default_shader):
+            if(not pcv.override_default_shader):
+                use_smoothstep = True
+                # sort by depth, farthest first, camera looks along -z so that is ascending z in camera space
+                # order is kept in cache and reused while camera, object and points are the same
+                m = np.array(cam.matrix_world.inverted() @ o.matrix_world, dtype=np.float64, )
+                key = (tuple(m.ravel()), cloud.get('version', 0), l, )
+                if(pcv.render_smoothstep_cache and 'render_order' in cloud.keys()):
+                    k, v = cloud['render_order']
+                    if(k == key):
+                        order = v
+                if(order is None):
+                    z = np.dot(vs, m[2, :3], ) + m[2, 3]
+                    order = np.argsort(z, kind='stable', )
+                    if(pcv.render_smoothstep_cache):
+                        cloud['render_order'] = (key, order, )
+                    elif('render_order' in cloud.keys()):
+                        del cloud['render_order']
+                vs = vs[order]
+                cs = cs[order]
+                ns = ns[order]
+        
+        return vs, cs, ns, order, use_smoothstep
+    
+    @classmethod
+    def mode(cls, pcv, ):
+        # render uses the same dev shader as viewport
+        if(pcv.dev_depth_enabled):
+            return 'DEPTH'
+        elif(pcv.dev_normal_colors_enabled):
+            return 'NORMAL'
+        elif(pcv.dev_position_colors_enabled):
+            return 'POSITION'
+        return 'COLOR'
+    
+    @classmethod
+    def shader(cls, pcv, mode, use_smoothstep, ):
+        # shader of render pass and names of attributes it reads
+        if(mode == 'DEPTH'):
+            if(pcv.illumination):
+                return GPUShader(PCVShaders.depth_vertex_shader_illumination, PCVShaders.depth_fragment_shader_illumination, ), ('position', 'normal', )
+            elif(pcv.dev_depth_false_colors):
+                return GPUShader(PCVShaders.depth_vertex_shader_false_colors, PCVShaders.depth_fragment_shader_false_colors, ), ('position', )
+            return GPUShader(PCVShaders.depth_vertex_shader_simple, PCVShaders.depth_fragment_shader_simple, ), ('position', )
+        elif(mode == 'NORMAL'):
+            return GPUShader(PCVShaders.normal_colors_vertex_shader, PCVShaders.normal_colors_fragment_shader, ), ('position', 'normal', )
+        elif(mode == 'POSITION'):
+            return GPUShader(PCVShaders.position_colors_vertex_shader, PCVShaders.position_colors_fragment_shader, ), ('position', )
+        elif(pcv.illumination):
+            if(use_smoothstep):
+                return GPUShader(PCVShaders.vertex_shader_illumination_render_smooth, PCVShaders.fragment_shader_illumination_render_smooth), ('position', 'color', 'normal', )
+            return GPUShader(PCVShaders.vertex_shader_illumination, PCVShaders.fragment_shader_illumination), ('position', 'color', 'normal', )
+        if(use_smoothstep):
+            return GPUShader(PCVShaders.vertex_shader_simple_render_smooth, PCVShaders.fragment_shader_simple_render_smooth), ('position', 'color', )
+        return GPUShader(PCVShaders.vertex_shader_simple, PCVShaders.fragment_shader_simple), ('position', 'color', )
+    
+    @classmethod
+    def draw(cls, context, cloud, width, height, state=None, ):
+        # draw cloud to bound offscreen buffer, state is optional dict to keep shader and batch in between calls
+        pcv = context.object.point_cloud_visualizer
+        
+        gpu.matrix.load_matrix(Matrix.Identity(4))
+        gpu.matrix.load_projection_matrix(Matrix.Identity(4))
+        
+        bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
+        bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
+        
+        vs, cs, ns, order, use_smoothstep = cls.points(context, cloud, )
+        l = len(vs)
+        mode = cls.mode(pcv)
+        
+        # shader and batch are kept in state between frames while points, display percentage, order and shader options are the same
+        key = (id(cloud), cloud.get('version', 0), l, id(order), use_smoothstep, pcv.dev_depth_enabled, pcv.dev_depth_false_colors, pcv.dev_normal_colors_enabled, pcv.dev_position_colors_enabled, pcv.illumination, )
+        if(state is not None and state.get('key') == key):
+            shader = state['shader']
+            batch = state['batch']
+        else:
+            shader, names = cls.shader(pcv, mode, use_smoothstep, )
+            content = {'position': vs, 'color': cs, 'normal': ns, }
+            batch = batch_for_shader(shader, 'POINTS', {k: content[k] for k in names}, )
+            if(state is not None):
+                # keep references, so ids in key can't be reused by other objects
+                state.update({'key': key, 'shader': shader, 'batch': batch, 'refs': (cloud, order, ), })
+        
+        cls.uniforms(context, cloud, shader, vs, mode, )
+        batch.draw(shader)
+    
+    @classmethod
+    def uniforms(cls, context, cloud, shader, vs, mode, ):
+        # bind shader and set uniforms of render pass
+        scene = context.scene
+        render = scene.render
+        cam = scene.camera
+        pcv = context.object.point_cloud_visualizer
+        o = cloud['object']
+        
+        shader.bind()
+        
+        view_matrix = cam.matrix_world.inverted()
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        camera_matrix = cam.calc_matrix_camera(depsgraph, x=render.resolution_x, y=render.resolution_y, scale_x=render.pixel_aspect_x, scale_y=render.pixel_aspect_y, )
+        perspective_matrix = camera_matrix @ view_matrix
+        
+        shader.uniform_float("perspective_matrix", perspective_matrix)
+        shader.uniform_float("object_matrix", o.matrix_world)
+        if(pcv.render_supersampling > 1):
+            shader.uniform_float("point_size", pcv.render_point_size * pcv.render_supersampling)
+        else:
+            shader.uniform_float("point_size", pcv.render_point_size)
+        shader.uniform_float("alpha_radius", pcv.alpha_radius)
+        shader.uniform_float("global_alpha", pcv.global_alpha)
+        
+        if(mode == 'DEPTH'):
+            # pm = bpy.context.region_data.perspective_matrix
+            # shader.uniform_float("perspective_matrix", pm)
+            # shader.uniform_float("object_matrix", o.matrix_world)
+            
+            # NOTE: precalculating and storing following should speed up things a bit, but then it won't reflect edits..
+            cx = np.sum(vs[:, 0]) / len(vs)
+            cy = np.sum(vs[:, 1]) / len(vs)
+            cz = np.sum(vs[:, 2]) / len(vs)
+            _, _, s = o.matrix_world.decompose()
+            l = s.length
+            maxd = abs(np.max(vs))
+            mind = abs(np.min(vs))
+            maxdist = maxd
+            if(mind > maxd):
+                maxdist = mind
+            shader.uniform_float("maxdist", float(maxdist) * l)
+            shader.uniform_float("center", (cx, cy, cz, ))
+            
+            shader.uniform_float("brightness", pcv.dev_depth_brightness)
+            shader.uniform_float("contrast", pcv.dev_depth_contrast)
+            
+            # shader.uniform_float("point_size", pcv.point_size)
+            # shader.uniform_float("alpha_radius", pcv.alpha_radius)
+            # shader.uniform_float("global_alpha", pcv.global_alpha)
+            
+            if(pcv.illumination):
                 cm = Matrix(((-1.0, 0.0, 0.0, 0.0, ), (0.0, -0.0, 1.0, 0.0, ), (0.0, -1.0, -0.0, 0.0, ), (0.0, 0.0, 0.0, 1.0, ), ))
                 _, obrot, _ = o.matrix_world.decompose()
                 mr = obrot.to_matrix().to_4x4()
@@ -5801,97 +6934,346 @@ class PCV_OT_render(Operator):
                 direction = cm @ pcv.light_direction
                 direction = mr @ direction
                 shader.uniform_float("light_direction", direction)
-                
                 inverted_direction = direction.copy()
                 inverted_direction.negate()
-                
                 c = pcv.light_intensity
                 shader.uniform_float("light_intensity", (c, c, c, ))
                 shader.uniform_float("shadow_direction", inverted_direction)
                 c = pcv.shadow_intensity
                 shader.uniform_float("shadow_intensity", (c, c, c, ))
-                # shader.uniform_float("show_normals", float(pcv.show_normals))
-                # shader.uniform_float("show_illumination", float(pcv.illumination))
+                if(pcv.dev_depth_false_colors):
+                    shader.uniform_float("color_a", pcv.dev_depth_color_a)
+                    shader.uniform_float("color_b", pcv.dev_depth_color_b)
+                else:
+                    shader.uniform_float("color_a", (1.0, 1.0, 1.0))
+                    shader.uniform_float("color_b", (0.0, 0.0, 0.0))
             else:
-                pass
-            
-            batch.draw(shader)
-            
-            buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
-            bgl.glReadBuffer(bgl.GL_BACK)
-            bgl.glReadPixels(0, 0, width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, buffer)
+                if(pcv.dev_depth_false_colors):
+                    shader.uniform_float("color_a", pcv.dev_depth_color_a)
+                    shader.uniform_float("color_b", pcv.dev_depth_color_b)
+        elif(mode == 'NORMAL'):
+            pass
+        elif(mode == 'POSITION'):
+            pass
+        elif(pcv.illumination and pcv.has_normals and cloud['illumination']):
+            cm = Matrix(((-1.0, 0.0, 0.0, 0.0, ), (0.0, -0.0, 1.0, 0.0, ), (0.0, -1.0, -0.0, 0.0, ), (0.0, 0.0, 0.0, 1.0, ), ))
+            _, obrot, _ = o.matrix_world.decompose()
+            mr = obrot.to_matrix().to_4x4()
+            mr.invert()
+            direction = cm @ pcv.light_direction
+            direction = mr @ direction
+            shader.uniform_float("light_direction", direction)
             
-        except Exception as e:
-            self.report({'ERROR'}, str(e))
-            return {'CANCELLED'}
+            inverted_direction = direction.copy()
+            inverted_direction.negate()
             
-        finally:
-            bgl.glDisable(bgl.GL_PROGRAM_POINT_SIZE)
-            bgl.glDisable(bgl.GL_DEPTH_TEST)
-            bgl.glDisable(bgl.GL_BLEND)
-            offscreen.unbind()
-            offscreen.free()
-        
-        # image from buffer
-        image_name = "pcv_output"
-        if(image_name not in bpy.data.images):
-            bpy.data.images.new(image_name, width, height)
-        image = bpy.data.images[image_name]
-        image.pixels = [v / 255 for v in buffer]
-        # image.scale(width, height)
-        
-        if(pcv.render_supersampling > 1):
-            width = int(width / pcv.render_supersampling)
-            height = int(height / pcv.render_supersampling)
-            image.scale(width, height)
+            c = pcv.light_intensity
+            shader.uniform_float("light_intensity", (c, c, c, ))
+            shader.uniform_float("shadow_direction", inverted_direction)
+            c = pcv.shadow_intensity
+            shader.uniform_float("shadow_intensity", (c, c, c, ))
+            # shader.uniform_float("show_normals", float(pcv.show_normals))
+            # shader.uniform_float("show_illumination", float(pcv.illumination))
+        else:
+            pass
+    
+    @classmethod
+    def draw_passes(cls, context, cloud, width, height, modes, ):
+        # draw each pass to bound offscreen buffer and read it back, points are uploaded once, all pass shaders read their attributes by name from the same buffer
+        pcv = context.object.point_cloud_visualizer
+        vs, cs, ns, order, use_smoothstep = cls.points(context, cloud, )
+        
+        fmt = GPUVertFormat()
+        fmt.attr_add(id="position", comp_type='F32', len=3, fetch_mode='FLOAT', )
+        fmt.attr_add(id="color", comp_type='F32', len=4, fetch_mode='FLOAT', )
+        fmt.attr_add(id="normal", comp_type='F32', len=3, fetch_mode='FLOAT', )
+        vbo = GPUVertBuf(fmt, len(vs), )
+        vbo.attr_fill("position", vs, )
+        vbo.attr_fill("color", cs, )
+        vbo.attr_fill("normal", ns, )
+        batch = GPUBatch(type='POINTS', buf=vbo, )
         
-        # save as image file
-        def save_render(operator, scene, image, output_path, ):
-            rs = scene.render
-            s = rs.image_settings
-            ff = s.file_format
-            cm = s.color_mode
-            cd = s.color_depth
-            
-            vs = scene.view_settings
-            vsvt = vs.view_transform
-            vsl = vs.look
-            vs.view_transform = 'Standard'
-            vs.look = 'None'
+        result = []
+        for mode in modes:
+            gpu.matrix.load_matrix(Matrix.Identity(4))
+            gpu.matrix.load_projection_matrix(Matrix.Identity(4))
+            bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
+            bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
             
+            shader, _ = cls.shader(pcv, mode, use_smoothstep, )
+            cls.uniforms(context, cloud, shader, vs, mode, )
+            batch.draw(shader)
+            # copy, buffer is reused by next pass
+            result.append(cls.pixels(cls.readback(width, height, ), width, height, ).copy())
+        return result
+    
+    @classmethod
+    def downsample(cls, pixels, factor, ):
+        # box filter of supersampled uint8 pixels
+        if(factor <= 1):
+            return pixels
+        h = (pixels.shape[0] // factor) * factor
+        w = (pixels.shape[1] // factor) * factor
+        pixels = pixels[:h, :w].reshape(h // factor, factor, w // factor, factor, 4).mean(axis=(1, 3), )
+        return np.round(pixels).astype(np.uint8)
+    
+    @classmethod
+    def readback(cls, width, height, ):
+        buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
+        bgl.glReadBuffer(bgl.GL_BACK)
+        bgl.glReadPixels(0, 0, width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, buffer)
+        return buffer
+    
+    @classmethod
+    def pixels(cls, buffer, width, height, ):
+        # readback buffer to uint8 array, rows from bottom
+        try:
+            a = np.frombuffer(buffer, dtype=np.uint8, count=width * height * 4, )
+        except TypeError:
+            # no buffer protocol on bgl.Buffer in older versions
+            a = np.array(buffer.to_list(), dtype=np.int8, ).view(np.uint8)
+        return a.reshape(height, width, 4)
+    
+    @classmethod
+    def save(cls, operator, scene, image, output_path, file_format, ):
+        rs = scene.render
+        s = rs.image_settings
+        ff = s.file_format
+        cm = s.color_mode
+        cd = s.color_depth
+        
+        vs = scene.view_settings
+        vsvt = vs.view_transform
+        vsl = vs.look
+        vs.view_transform = 'Standard'
+        vs.look = 'None'
+        
+        if(file_format == 'OPEN_EXR'):
+            s.file_format = 'OPEN_EXR'
+            s.color_mode = 'RGBA'
+            s.color_depth = '32'
+        else:
             s.file_format = 'PNG'
             s.color_mode = 'RGBA'
             s.color_depth = '8'
-            
-            try:
-                image.save_render(output_path)
-                log("image '{}' saved".format(output_path))
-            except Exception as e:
-                s.file_format = ff
-                s.color_mode = cm
-                s.color_depth = cd
-                vs.view_transform = vsvt
-                vs.look = vsl
-                
-                log("error: {}".format(e))
-                operator.report({'ERROR'}, "Unable to save render image, see console for details.")
-                return
-            
+        
+        try:
+            image.save_render(output_path)
+            log("image '{}' saved".format(output_path))
+        except Exception as e:
             s.file_format = ff
             s.color_mode = cm
             s.color_depth = cd
             vs.view_transform = vsvt
             vs.look = vsl
+            
+            log("error: {}".format(e))
+            operator.report({'ERROR'}, "Unable to save render image, see console for details.")
+            return False
         
-        save_render(self, scene, image, output_path, )
+        s.file_format = ff
+        s.color_mode = cm
+        s.color_depth = cd
+        vs.view_transform = vsvt
+        vs.look = vsl
+        return True
+    
+    @classmethod
+    def rasterize(cls, context, cloud, width, height, ):
+        # the same as draw, but with PCVRasterizer, needs no gpu
+        pcv = context.object.point_cloud_visualizer
+        return cls.rasterize_passes(context, cloud, width, height, [cls.mode(pcv)], )[0]
+    
+    @classmethod
+    def rasterize_passes(cls, context, cloud, width, height, modes, ):
+        # points are projected and splatted once, list of images in order of modes is returned
+        scene = context.scene
+        render = scene.render
+        cam = scene.camera
+        pcv = context.object.point_cloud_visualizer
+        o = context.object
         
-        # restore
-        image_settings.color_depth = original_depth
-        # cleanup
-        bpy.data.images.remove(image)
+        if(cloud is not None):
+            vs = cloud['vertices']
+            cs = cloud['colors']
+            ns = cloud['normals']
+            illumination = cloud['illumination']
+        else:
+            vs, ns, cs = PCVRasterizer.points(bpy.path.abspath(pcv.filepath), PCVManager.color_options(), )
+            illumination = pcv.illumination
+        
+        dp = pcv.render_display_percent
+        l = int((len(vs) / 100) * dp)
+        if(dp >= 99):
+            l = len(vs)
+        vs = vs[:l]
+        cs = cs[:l]
+        ns = ns[:l]
+        
+        view_matrix = cam.matrix_world.inverted()
+        depsgraph = context.evaluated_depsgraph_get()
+        camera_matrix = cam.calc_matrix_camera(depsgraph, x=render.resolution_x, y=render.resolution_y, scale_x=render.pixel_aspect_x, scale_y=render.pixel_aspect_y, )
+        matrix = camera_matrix @ view_matrix @ o.matrix_world
+        
+        colors = np.concatenate([cls.colors(context, vs, ns, cs, illumination, matrix, m, ) for m in modes], axis=1, )
+        
+        point_size = pcv.render_point_size
+        if(pcv.render_supersampling > 1):
+            point_size *= pcv.render_supersampling
+        r = PCVRasterizer(width, height, targets=len(modes), )
+        r.draw(vs, colors, matrix, point_size, pcv.alpha_radius, )
+        return [r.image(i) for i in range(len(modes))]
+    
+    @classmethod
+    def colors(cls, context, vs, ns, cs, illumination, matrix, mode, ):
+        # final rgba of points in render pass, what fragment shader would output
+        pcv = context.object.point_cloud_visualizer
+        o = context.object
+        l = len(vs)
+        
+        def light():
+            cm = Matrix(((-1.0, 0.0, 0.0, 0.0, ), (0.0, -0.0, 1.0, 0.0, ), (0.0, -1.0, -0.0, 0.0, ), (0.0, 0.0, 0.0, 1.0, ), ))
+            _, obrot, _ = o.matrix_world.decompose()
+            mr = obrot.to_matrix().to_4x4()
+            mr.invert()
+            direction = cm @ pcv.light_direction
+            direction = mr @ direction
+            inverted_direction = direction.copy()
+            inverted_direction.negate()
+            c = pcv.light_intensity
+            d = pcv.shadow_intensity
+            return PCVRasterizer.illumination(ns, direction.to_3d(), (c, c, c, ), inverted_direction.to_3d(), (d, d, d, ), )
+        
+        colors = np.empty((l, 4), dtype=np.float32, )
+        colors[:, 3] = pcv.global_alpha
+        if(mode == 'DEPTH'):
+            center = np.sum(vs, axis=0, ) / len(vs)
+            _, _, s = o.matrix_world.decompose()
+            maxdist = max(abs(np.max(vs)), abs(np.min(vs)), ) * s.length
+            f = PCVRasterizer.depth(vs, matrix, center, maxdist, )[:, None]
+            if(pcv.illumination or pcv.dev_depth_false_colors):
+                a = np.array((1.0, 1.0, 1.0, ), dtype=np.float32, )
+                b = np.array((0.0, 0.0, 0.0, ), dtype=np.float32, )
+                if(pcv.dev_depth_false_colors):
+                    a = np.array(pcv.dev_depth_color_a, dtype=np.float32, )
+                    b = np.array(pcv.dev_depth_color_b, dtype=np.float32, )
+                c = b * (1.0 - f) + a * f
+            else:
+                c = np.repeat(f, 3, axis=1, )
+            c = (c - 0.5) * pcv.dev_depth_contrast + 0.5 + pcv.dev_depth_brightness
+            if(pcv.illumination):
+                c += light()
+            colors[:, :3] = c
+        elif(mode == 'NORMAL'):
+            colors[:, :3] = ns * 0.5 + 0.5
+        elif(mode == 'POSITION'):
+            colors[:, :3] = np.mod(vs, 1.0)
+        elif(pcv.illumination and pcv.has_normals and illumination):
+            colors[:, :3] = cs[:, :3] + light()
+        else:
+            colors[:, :3] = cs[:, :3]
+        
+        return colors
+
+
+class PCV_OT_render_passes(Operator):
+    bl_idname = "point_cloud_visualizer.render_passes"
+    bl_label = "Passes"
+    bl_description = "Render selected passes of displayed point cloud from active camera view, points are uploaded once and each pass is saved to its own image"
+    
+    @classmethod
+    def poll(cls, context):
+        if(not PCV_OT_render.poll(context)):
+            return False
+        pcv = context.object.point_cloud_visualizer
+        return len(pcv.render_passes) > 0
+    
+    def execute(self, context):
+        _t = time.time()
+        
+        pcv = context.object.point_cloud_visualizer
+        scene = context.scene
+        
+        if(scene.camera is None):
+            self.report({'ERROR'}, "No camera found.")
+            return {'CANCELLED'}
+        bd = context.blend_data
+        if(bd.filepath == "" and not bd.is_saved):
+            self.report({'ERROR'}, "Save .blend file first.")
+            return {'CANCELLED'}
+        
+        # keep order of enum items
+        modes = [i.identifier for i in pcv.bl_rna.properties['render_passes'].enum_items if i.identifier in pcv.render_passes]
+        
+        ext = '.png'
+        if(pcv.render_file_format == 'OPEN_EXR'):
+            ext = '.exr'
+        ok, output_path = PCV_OT_render.output_path(self, context, ext, )
+        if(not ok):
+            return {'CANCELLED'}
+        pcv.render_path = output_path
+        output_path = PCV_OT_render.frame_path(output_path, scene.frame_current, )
+        
+        width, height = PCV_OT_render.resolution(context)
+        ss = pcv.render_supersampling
+        # streamed sequence might still show older frame
+        PCVSequence.update(scene, wait=True, )
+        cloud = PCVManager.cache.get(pcv.uuid)
+        
+        if(pcv.render_backend == 'CPU'):
+            try:
+                images = PCV_OT_render.rasterize_passes(context, cloud, width, height, modes, )
+            except Exception as e:
+                self.report({'ERROR'}, str(e))
+                return {'CANCELLED'}
+            # cpu images are floats, kept for exr
+            images = [i.reshape(height, width, 4) for i in images]
+        else:
+            bgl.glEnable(bgl.GL_PROGRAM_POINT_SIZE)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glEnable(bgl.GL_BLEND)
+            offscreen = GPUOffScreen(width, height)
+            offscreen.bind()
+            try:
+                images = PCV_OT_render.draw_passes(context, cloud, width, height, modes, )
+            except Exception as e:
+                self.report({'ERROR'}, str(e))
+                return {'CANCELLED'}
+            finally:
+                bgl.glDisable(bgl.GL_PROGRAM_POINT_SIZE)
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+                bgl.glDisable(bgl.GL_BLEND)
+                offscreen.unbind()
+                offscreen.free()
+        
+        n, e = os.path.splitext(output_path)
+        for mode, pixels in zip(modes, images):
+            path = '{}_{}{}'.format(n, mode.lower(), e)
+            if(pcv.render_file_format == 'PNG'):
+                if(pixels.dtype != np.uint8):
+                    pixels = np.round(pixels * 255).astype(np.uint8)
+                pixels = PCV_OT_render.downsample(pixels, ss, )
+                PNGImageWriter(path, np.ascontiguousarray(pixels[::-1]), )
+                log("image '{}' saved".format(path))
+            else:
+                image = bpy.data.images.new("pcv_output", width, height, float_buffer=True, )
+                if(pixels.dtype == np.uint8):
+                    px = (pixels.astype(np.float32) / 255).ravel()
+                else:
+                    px = pixels.ravel()
+                if(hasattr(image.pixels, 'foreach_set')):
+                    image.pixels.foreach_set(px)
+                else:
+                    image.pixels[:] = px.tolist()
+                if(ss > 1):
+                    image.scale(int(width / ss), int(height / ss), )
+                ok = PCV_OT_render.save(self, scene, image, path, pcv.render_file_format, )
+                bpy.data.images.remove(image)
+                if(not ok):
+                    return {'CANCELLED'}
         
         _d = datetime.timedelta(seconds=time.time() - _t)
-        print("PCV: Frame completed in {}.".format(_d))
+        print("PCV: Passes completed in {}.".format(_d))
         
         return {'FINISHED'}
 
@@ -5901,6 +7283,9 @@ class PCV_OT_render_animation(Operator):
     bl_label = "Animation"
     bl_description = "Render displayed point cloud from active camera view to animation frames"
     
+    chunk: IntProperty(name="Chunk", default=0, min=0, description="Index of part of frame range to render, for splitting animation between processes or machines", )
+    chunks: IntProperty(name="Chunks", default=1, min=1, description="Number of parts frame range is split to", )
+    
     @classmethod
     def poll(cls, context):
         if(context.object is None):
@@ -5913,14 +7298,33 @@ class PCV_OT_render_animation(Operator):
                 if(v['ready']):
                     if(v['draw']):
                         ok = True
+        # cpu backend can read points from file, e.g. when blender runs in background
+        if(pcv.render_backend == 'CPU' and pcv.filepath != ''):
+            ok = True
         return ok
     
     def execute(self, context):
         scene = context.scene
+        pcv = context.object.point_cloud_visualizer
         
         if(scene.camera is None):
             self.report({'ERROR'}, "No camera found.")
             return {'CANCELLED'}
+        if(self.chunk >= self.chunks):
+            self.report({'ERROR'}, "Chunk index out of range.")
+            return {'CANCELLED'}
+        bd = context.blend_data
+        if(bd.filepath == "" and not bd.is_saved):
+            self.report({'ERROR'}, "Save .blend file first.")
+            return {'CANCELLED'}
+        
+        ext = '.png'
+        if(pcv.render_file_format == 'OPEN_EXR'):
+            ext = '.exr'
+        ok, output_path = PCV_OT_render.output_path(self, context, ext, )
+        if(not ok):
+            return {'CANCELLED'}
+        pcv.render_path = output_path
         
         def rm_ms(d):
             return d - datetime.timedelta(microseconds=d.microseconds)
@@ -5930,22 +7334,125 @@ class PCV_OT_render_animation(Operator):
         _t = time.time()
         log_format = 'PCV: Frame: {} ({}/{}) | Time: {} | Remaining: {}'
         frames = [i for i in range(scene.frame_start, scene.frame_end + 1, 1)]
+        # contiguous part of frame range
+        frames = [int(n) for n in np.array_split(np.array(frames, dtype=np.int64, ), self.chunks, )[self.chunk]]
         num_frames = len(frames)
         times = []
         
-        for i, n in enumerate(frames):
+        width, height = PCV_OT_render.resolution(context)
+        ss = pcv.render_supersampling
+        gpu_backend = (pcv.render_backend == 'GPU')
+        # png is encoded and written in threads while next frame is drawn, zlib releases gil, exr is saved by blender on main thread
+        threaded = (pcv.render_file_format == 'PNG')
+        
+        stages = collections.OrderedDict([('frame', 0.0), ('draw', 0.0), ('readback', 0.0), ('encode', 0.0), ('write', 0.0), ('wait', 0.0), ])
+        
+        def write(pixels, path, ):
+            # worker, pixels are uint8 rows from bottom
             t = time.time()
-            
-            scene.frame_set(n)
-            bpy.ops.point_cloud_visualizer.render()
-            
-            d = time.time() - t
-            times.append(d)
-            print(log_format.format(scene.frame_current, i + 1, num_frames,
-                                    rm_ms(datetime.timedelta(seconds=d)),
-                                    rm_ms(datetime.timedelta(seconds=(sum(times) / len(times)) * (num_frames - i - 1)), ), ))
-            
-        scene.frame_set(user_frame)
+            pixels = PCV_OT_render.downsample(pixels, ss, )
+            pixels = np.ascontiguousarray(pixels[::-1])
+            e = time.time() - t
+            t = time.time()
+            PNGImageWriter(path, pixels, )
+            return e, time.time() - t
+        
+        def collect(future, ):
+            t = time.time()
+            e, w = future.result()
+            stages['wait'] += time.time() - t
+            stages['encode'] += e
+            stages['write'] += w
+        
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, )
+        pending = collections.deque()
+        state = {}
+        offscreen = None
+        if(gpu_backend):
+            offscreen = GPUOffScreen(width, height)
+            bgl.glEnable(bgl.GL_PROGRAM_POINT_SIZE)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glEnable(bgl.GL_BLEND)
+        try:
+            for i, n in enumerate(frames):
+                t = time.time()
+                
+                t0 = time.time()
+                scene.frame_set(n)
+                # frame change handler does not wait for streamed frames
+                PCVSequence.update(scene, wait=True, )
+                stages['frame'] += time.time() - t0
+                
+                cloud = PCVManager.cache.get(pcv.uuid)
+                t0 = time.time()
+                if(gpu_backend):
+                    offscreen.bind()
+                    try:
+                        PCV_OT_render.draw(context, cloud, width, height, state, )
+                        stages['draw'] += time.time() - t0
+                        t0 = time.time()
+                        buffer = PCV_OT_render.readback(width, height, )
+                    finally:
+                        offscreen.unbind()
+                    pixels = PCV_OT_render.pixels(buffer, width, height, )
+                    stages['readback'] += time.time() - t0
+                else:
+                    pixels = PCV_OT_render.rasterize(context, cloud, width, height, )
+                    if(threaded):
+                        # png is 8 bit anyway, exr gets floats as they are
+                        pixels = np.round(pixels * 255).astype(np.uint8).reshape(height, width, 4)
+                    stages['draw'] += time.time() - t0
+                
+                path = PCV_OT_render.frame_path(output_path, n, )
+                if(threaded):
+                    pending.append(executor.submit(write, pixels, path, ))
+                    # frames not written yet are held in memory, so wait when workers fall behind
+                    while(len(pending) > 2):
+                        collect(pending.popleft())
+                else:
+                    t0 = time.time()
+                    image = bpy.data.images.new("pcv_output", width, height, float_buffer=True, )
+                    if(pixels.dtype == np.uint8):
+                        px = (pixels.astype(np.float32) / 255).ravel()
+                    else:
+                        px = pixels.astype(np.float32).ravel()
+                    if(hasattr(image.pixels, 'foreach_set')):
+                        image.pixels.foreach_set(px)
+                    else:
+                        image.pixels[:] = px.tolist()
+                    if(ss > 1):
+                        image.scale(int(width / ss), int(height / ss), )
+                    stages['encode'] += time.time() - t0
+                    t0 = time.time()
+                    ok = PCV_OT_render.save(self, scene, image, path, pcv.render_file_format, )
+                    bpy.data.images.remove(image)
+                    stages['write'] += time.time() - t0
+                    if(not ok):
+                        return {'CANCELLED'}
+                
+                d = time.time() - t
+                times.append(d)
+                print(log_format.format(n, i + 1, num_frames,
+                                        rm_ms(datetime.timedelta(seconds=d)),
+                                        rm_ms(datetime.timedelta(seconds=(sum(times) / len(times)) * (num_frames - i - 1)), ), ))
+            
+            while(len(pending)):
+                collect(pending.popleft())
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            executor.shutdown(wait=True, )
+            if(gpu_backend):
+                bgl.glDisable(bgl.GL_PROGRAM_POINT_SIZE)
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+                bgl.glDisable(bgl.GL_BLEND)
+                offscreen.free()
+            scene.frame_set(user_frame)
+        
+        log("stage timings:", 1)
+        for k, v in stages.items():
+            log("{}: {:.3f}s total, {:.3f}s per frame".format(k, v, v / max(num_frames, 1), ), 2)
         
         _d = datetime.timedelta(seconds=time.time() - _t)
         print("PCV: Animation completed in {}.".format(_d))
@@ -5989,35 +7496,19 @@ class PCV_OT_convert(Operator):
             if(mps >= 99):
                 l = nump
         
-        vs = cache['vertices'][:l]
-        ns = cache['normals'][:l]
-        cs = cache['colors'][:l]
-        
-        points = []
-        for i in range(l):
-            c = tuple([int(255 * cs[i][j]) for j in range(3)])
-            points.append(tuple(vs[i]) + tuple(ns[i]) + c)
-        
-        def apply_matrix(points, matrix):
-            matrot = matrix.decompose()[1].to_matrix().to_4x4()
-            r = [None] * len(points)
-            for i, p in enumerate(points):
-                co = matrix @ Vector((p[0], p[1], p[2]))
-                no = matrot @ Vector((p[3], p[4], p[5]))
-                r[i] = (co.x, co.y, co.z, no.x, no.y, no.z, p[6], p[7], p[8])
-            return r
-        
         _, t = os.path.split(pcv.filepath)
         n, _ = os.path.splitext(t)
         m = o.matrix_world.copy()
         
-        points = apply_matrix(points, m)
+        vs = cache['vertices'][:l]
+        ns = cache['normals'][:l]
+        cs = cache['colors'][:l]
         
         g = None
         if(pcv.mesh_type in ('INSTANCER', 'PARTICLES', )):
             # TODO: if normals are missing or align to normal is not required, make just vertices instead of triangles and use that as source for particles and instances, will be a bit faster
             g = PCMeshInstancerMeshGenerator(mesh_type='TRIANGLE', )
-        else:
+        elif(pcv.mesh_type != 'POINT_INSTANCER'):
             g = PCMeshInstancerMeshGenerator(mesh_type=pcv.mesh_type, )
         
         names = {'VERTEX': "{}-vertices",
@@ -6026,6 +7517,7 @@ class PCV_OT_convert(Operator):
                  'CUBE': "{}-cubes",
                  'ICOSPHERE': "{}-icospheres",
                  'INSTANCER': "{}-instancer",
+                 'POINT_INSTANCER': "{}-point-instancer",
                  'PARTICLES': "{}-particles", }
         n = names[pcv.mesh_type].format(n)
         
@@ -6039,16 +7531,18 @@ class PCV_OT_convert(Operator):
             a = False
         if(not pcv.has_vcols):
             c = False
-        d = {'name': n, 'points': points, 'generator': g, 'matrix': Matrix(),
-             'size': s, 'normal_align': a, 'vcols': c, }
-        if(pcv.mesh_type == 'VERTEX'):
-            # faster than instancer.. single vertices can't have normals and colors, so no need for instancer
-            bm = bmesh.new()
-            for p in points:
-                bm.verts.new(p[:3])
+        if(pcv.mesh_type in ('VERTEX', 'POINT_INSTANCER', )):
+            # faster than instancer.. single vertices can't have loop colors, normals and colors are stored as point attributes if blender supports them
             me = bpy.data.meshes.new(n)
-            bm.to_mesh(me)
-            bm.free()
+            PCMeshWriter.vertices(me, vs, )
+            if(pcv.mesh_type == 'VERTEX'):
+                PCMeshWriter.point_attributes(me, ns if pcv.has_normals else None, cs if pcv.has_vcols else None, )
+            else:
+                PCMeshWriter.point_attributes(me, ns if a else None, cs if c else None, )
+            me.update()
+            if(pcv.mesh_type == 'POINT_INSTANCER' and a):
+                # instance rotation is taken from vertex normals
+                PCMeshWriter.vertex_normals(me, ns, )
             o = bpy.data.objects.new(n, me)
             view_layer = context.view_layer
             collection = view_layer.active_layer_collection.collection
@@ -6057,44 +7551,29 @@ class PCV_OT_convert(Operator):
             o.select_set(True)
             view_layer.objects.active = o
         else:
-            
-            if(pcv.mesh_use_instancer2):
-                # import cProfile
-                # import pstats
-                # import io
-                # pr = cProfile.Profile()
-                # pr.enable()
-                
-                d = {
-                    'name': n,
-                    'vs': vs,
-                    'ns': ns,
-                    'cs': cs,
-                    'generator': g,
-                    'matrix': Matrix(),
-                    'size': s,
-                    'with_normal_align': a,
-                    'with_vertex_colors': c,
-                }
-                instancer = PCMeshInstancer2(**d)
-                
-                # pr.disable()
-                # s = io.StringIO()
-                # sortby = 'cumulative'
-                # ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
-                # ps.print_stats()
-                # print(s.getvalue())
-            else:
-                instancer = PCMeshInstancer(**d)
-            
+            # instances are sized and aligned in world space, copies, cache must stay in object space
+            vs, ns = PCVTransform(m).apply(vs.copy(), ns.copy(), )
+            d = {
+                'name': n,
+                'vs': vs,
+                'ns': ns,
+                'cs': cs,
+                'generator': g,
+                'matrix': Matrix(),
+                'size': s,
+                'with_normal_align': a,
+                'with_vertex_colors': c,
+            }
+            instancer = PCMeshInstancer2(**d)
             o = instancer.object
+            o.data.transform(m.inverted())
         
-        me = o.data
-        me.transform(m.inverted())
         o.matrix_world = m
         
         if(pcv.mesh_type == 'INSTANCER'):
             pci = PCInstancer(o, pcv.mesh_size, pcv.mesh_base_sphere_subdivisions, )
+        if(pcv.mesh_type == 'POINT_INSTANCER'):
+            pci = PCPointInstancer(o, pcv.mesh_size, pcv.mesh_base_sphere_subdivisions, a, )
         if(pcv.mesh_type == 'PARTICLES'):
             pcp = PCParticles(o, pcv.mesh_size, pcv.mesh_base_sphere_subdivisions, )
         
@@ -6183,32 +7662,24 @@ class PCV_OT_export(Operator, ExportHelper):
             if(colors):
                 cs = np.column_stack((points['red'], points['green'], points['blue'], ))
         
-        def apply_matrix(m, vs, ns=None, ):
-            vs.shape = (-1, 3)
-            vs = np.c_[vs, np.ones(vs.shape[0])]
-            vs = np.dot(m, vs.T)[0:3].T.reshape((-1))
-            vs.shape = (-1, 3)
-            if(ns is not None):
-                _, rot, _ = m.decompose()
-                rmat = rot.to_matrix().to_4x4()
-                ns.shape = (-1, 3)
-                ns = np.c_[ns, np.ones(ns.shape[0])]
-                ns = np.dot(rmat, ns.T)[0:3].T.reshape((-1))
-                ns.shape = (-1, 3)
-            return vs, ns
-        
         # fabricate matrix
         m = Matrix.Identity(4)
         if(pcv.export_apply_transformation):
             if(o.matrix_world != Matrix.Identity(4)):
                 log("apply transformation..", 1)
-                vs, ns = apply_matrix(o.matrix_world.copy(), vs, ns, )
+                m = o.matrix_world.copy()
         if(pcv.export_convert_axes):
             log("convert axes..", 1)
             axis_forward = '-Z'
             axis_up = 'Y'
             cm = axis_conversion(to_forward=axis_forward, to_up=axis_up).to_4x4()
-            vs, ns = apply_matrix(cm, vs, ns, )
+            m = cm @ m
+        if(m != Matrix.Identity(4)):
+            # both matrices in one pass, on copies, viewport arrays are cache arrays
+            vs = vs.astype(np.float32)
+            if(ns is not None):
+                ns = ns.astype(np.float32)
+            vs, ns = PCVTransform(m).apply(vs, ns, )
         
         # TODO: make whole PCV data type agnostic, load anything, keep original, convert to what is needed for display (float32), use original for export if not set to use viewport/edited data. now i am forcing float32 for x, y, z, nx, ny, nz and uint8 for red, green, blue. 99% of ply files i've seen is like that, but specification is not that strict (read again the best resource: http://paulbourke.net/dataformats/ply/ )
         
@@ -6464,25 +7935,9 @@ class PCV_OT_filter_project(Operator):
         ns = c['normals']
         cs = c['colors']
         
-        # apply parent matrix to points
-        def apply_matrix(m, vs, ns=None, ):
-            vs.shape = (-1, 3)
-            vs = np.c_[vs, np.ones(vs.shape[0])]
-            vs = np.dot(m, vs.T)[0:3].T.reshape((-1))
-            vs.shape = (-1, 3)
-            if(ns is not None):
-                _, rot, _ = m.decompose()
-                rmat = rot.to_matrix().to_4x4()
-                ns.shape = (-1, 3)
-                ns = np.c_[ns, np.ones(ns.shape[0])]
-                ns = np.dot(rmat, ns.T)[0:3].T.reshape((-1))
-                ns.shape = (-1, 3)
-            return vs, ns
-        
+        # apply parent matrix to points, on copies, cache must stay untouched
         m = c['object'].matrix_world.copy()
-        vs, ns = apply_matrix(m, vs, ns, )
-        vs = vs.astype(np.float32)
-        ns = ns.astype(np.float32)
+        vs, ns = PCVTransform(m).apply(vs.copy(), ns.copy(), )
         
         # combine
         l = len(vs)
@@ -6555,19 +8010,7 @@ class PCV_OT_filter_project(Operator):
                     return {'CANCELLED'}
             elif(pcv.filter_project_colorize_from == 'UVTEX'):
                 try:
-                    if(o.active_material is None):
-                        raise Exception("Cannot find active material")
-                    uvtexnode = o.active_material.node_tree.nodes.active
-                    if(uvtexnode is None):
-                        raise Exception("Cannot find active image texture in active material")
-                    if(uvtexnode.type != 'TEX_IMAGE'):
-                        raise Exception("Cannot find active image texture in active material")
-                    uvimage = uvtexnode.image
-                    if(uvimage is None):
-                        raise Exception("Cannot find active image texture with loaded image in active material")
-                    uvimage.update()
-                    uvarray = np.asarray(uvimage.pixels)
-                    uvarray = uvarray.reshape((uvimage.size[1], uvimage.size[0], 4))
+                    texture = PCVTextureSampler.from_object(o)
                     uvlayer = bm.loops.layers.uv.active
                     if(uvlayer is None):
                         raise Exception("Cannot find active UV layout")
@@ -6634,15 +8077,12 @@ class PCV_OT_filter_project(Operator):
                 b = ac[2] * ws[0] + bc[2] * ws[1] + cc[2] * ws[2]
                 col = (r, g, b, )
             elif(pcv.filter_project_colorize_from == 'UVTEX'):
+                # only uv is computed here, all texture colors are sampled at once after projection
                 uvtriangle = []
                 for l in poly.loops:
                     uvtriangle.append(Vector(l[uvlayer].uv.to_tuple() + (0.0, )))
                 uvpoint = barycentric_transform(v, poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, *uvtriangle, )
-                w, h = uvimage.size
-                # x,y % 1.0 to wrap around if uv coordinate is outside 0.0-1.0 range
-                x = int(round(remap(uvpoint.x % 1.0, 0.0, 1.0, 0, w - 1)))
-                y = int(round(remap(uvpoint.y % 1.0, 0.0, 1.0, 0, h - 1)))
-                col = tuple(uvarray[y][x][:3].tolist())
+                col = uvpoint[:2]
             elif(pcv.filter_project_colorize_from == 'GROUP_MONO'):
                 ws = poly_3d_calc([poly.verts[0].co, poly.verts[1].co, poly.verts[2].co, ], v)
                 aw = poly.verts[0][group_layer].get(group_layer_index, 0.0)
@@ -6664,6 +8104,8 @@ class PCV_OT_filter_project(Operator):
             return col
         
         a = np.empty(l, dtype=dt, )
+        uvpoints = []
+        uvindexes = []
         
         log("projecting:", 1)
         prgr = Progress(len(points), 2)
@@ -6724,12 +8166,22 @@ class PCV_OT_filter_project(Operator):
             if(pcv.filter_project_colorize):
                 if(used is not None):
                     col = gen_color(bm, *used)
-                    rp['red'] = col[0]
-                    rp['green'] = col[1]
-                    rp['blue'] = col[2]
+                    if(pcv.filter_project_colorize_from == 'UVTEX'):
+                        uvpoints.append(col)
+                        uvindexes.append(i)
+                    else:
+                        rp['red'] = col[0]
+                        rp['green'] = col[1]
+                        rp['blue'] = col[2]
             
             a[i] = rp
         
+        if(len(uvindexes) > 0):
+            cols = texture.sample(np.array(uvpoints, dtype=np.float64, ))
+            a['red'][uvindexes] = cols[:, 0]
+            a['green'][uvindexes] = cols[:, 1]
+            a['blue'][uvindexes] = cols[:, 2]
+        
         if(discard):
             log("discarding:", 1)
             prgr = Progress(len(a), 2)
@@ -6762,9 +8214,7 @@ class PCV_OT_filter_project(Operator):
         # unapply parent matrix to points
         m = c['object'].matrix_world.copy()
         m = m.inverted()
-        vs, ns = apply_matrix(m, vs, ns, )
-        vs = vs.astype(np.float32)
-        ns = ns.astype(np.float32)
+        vs, ns = PCVTransform(m).apply(vs, ns, )
         
         # cleanup
         if(pcv.filter_project_colorize):
@@ -7005,6 +8455,179 @@ class PCV_OT_filter_remove_color_delete_selected(Operator):
         return {'FINISHED'}
 
 
+class PCV_OT_filter_outliers_statistical(Operator):
+    bl_idname = "point_cloud_visualizer.filter_outliers_statistical"
+    bl_label = "Select Statistical Outliers"
+    bl_description = "Select points with mean distance to nearest neighbors larger than average mean distance plus standard deviation multiplied by ratio"
+    
+    @classmethod
+    def poll(cls, context):
+        if(context.object is None):
+            return False
+        
+        pcv = context.object.point_cloud_visualizer
+        ok = False
+        for k, v in PCVManager.cache.items():
+            if(v['uuid'] == pcv.uuid):
+                if(v['ready']):
+                    if(v['draw']):
+                        ok = True
+        return ok
+    
+    def execute(self, context):
+        log("Statistical Outliers:", 0)
+        _t = time.time()
+        
+        pcv = context.object.point_cloud_visualizer
+        c = PCVManager.cache[pcv.uuid]
+        vs = c['vertices']
+        
+        if(len(vs) < 2):
+            self.report({'INFO'}, "Nothing selected.")
+            return {'CANCELLED'}
+        
+        try:
+            ds = PCVNeighbors(vs).knn_mean_distance(pcv.filter_outliers_statistical_neighbors)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        t = np.mean(ds) + np.std(ds) * pcv.filter_outliers_statistical_std_ratio
+        indexes = np.nonzero(ds > t)[0]
+        
+        log("selected: {} points".format(len(indexes)), 1)
+        
+        if(len(indexes) == 0):
+            self.report({'INFO'}, "Nothing selected.")
+        else:
+            pcv.filter_remove_color_selection = True
+            c['selection_indexes'] = indexes
+        
+        context.area.tag_redraw()
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+        
+        return {'FINISHED'}
+
+
+class PCV_OT_filter_outliers_radius(Operator):
+    bl_idname = "point_cloud_visualizer.filter_outliers_radius"
+    bl_label = "Select Radius Outliers"
+    bl_description = "Select points with less than minimal number of neighbors within radius"
+    
+    @classmethod
+    def poll(cls, context):
+        if(context.object is None):
+            return False
+        
+        pcv = context.object.point_cloud_visualizer
+        ok = False
+        for k, v in PCVManager.cache.items():
+            if(v['uuid'] == pcv.uuid):
+                if(v['ready']):
+                    if(v['draw']):
+                        ok = True
+        return ok
+    
+    def execute(self, context):
+        log("Radius Outliers:", 0)
+        _t = time.time()
+        
+        pcv = context.object.point_cloud_visualizer
+        c = PCVManager.cache[pcv.uuid]
+        vs = c['vertices']
+        
+        try:
+            counts = PCVNeighbors(vs).radius_count(pcv.filter_outliers_radius)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        indexes = np.nonzero(counts < pcv.filter_outliers_radius_neighbors)[0]
+        
+        log("selected: {} points".format(len(indexes)), 1)
+        
+        if(len(indexes) == 0):
+            self.report({'INFO'}, "Nothing selected.")
+        else:
+            pcv.filter_remove_color_selection = True
+            c['selection_indexes'] = indexes
+        
+        context.area.tag_redraw()
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+        
+        return {'FINISHED'}
+
+
+class PCV_OT_filter_estimate_normals(Operator):
+    bl_idname = "point_cloud_visualizer.filter_estimate_normals"
+    bl_label = "Estimate Normals"
+    bl_description = "Estimate point normals from nearest neighbors, existing normals will be replaced"
+    
+    @classmethod
+    def poll(cls, context):
+        if(context.object is None):
+            return False
+        
+        pcv = context.object.point_cloud_visualizer
+        ok = False
+        for k, v in PCVManager.cache.items():
+            if(v['uuid'] == pcv.uuid):
+                if(v['ready']):
+                    if(v['draw']):
+                        ok = True
+        return ok
+    
+    def execute(self, context):
+        log("Estimate Normals:", 0)
+        _t = time.time()
+        
+        o = context.object
+        pcv = o.point_cloud_visualizer
+        c = PCVManager.cache[pcv.uuid]
+        vs = c['vertices']
+        cs = c['colors']
+        
+        if(len(vs) < 3):
+            self.report({'ERROR'}, "Not enough points.")
+            return {'CANCELLED'}
+        
+        viewpoint = None
+        if(pcv.filter_normals_orient == 'CAMERA'):
+            cam = context.scene.camera
+            if(cam is None):
+                self.report({'ERROR'}, "No active scene camera.")
+                return {'CANCELLED'}
+            viewpoint = cam.matrix_world.translation
+        elif(pcv.filter_normals_orient == 'CURSOR'):
+            viewpoint = context.scene.cursor.location
+        if(viewpoint is not None):
+            # points are in object local space
+            viewpoint = o.matrix_world.inverted() @ viewpoint
+            viewpoint = viewpoint.to_tuple()
+        
+        try:
+            ns = PCVNeighbors(vs).pca_normals(pcv.filter_normals_neighbors, viewpoint, )
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        
+        # cached normal lines and other shader data have old normals
+        if('vertex_normals' in c.keys()):
+            del c['vertex_normals']
+        if('extra' in c.keys()):
+            del c['extra']
+        
+        pcv.has_normals = True
+        PCVManager.update(pcv.uuid, vs, ns, cs, )
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+        
+        return {'FINISHED'}
+
+
 class PCV_OT_edit_start(Operator):
     bl_idname = "point_cloud_visualizer.edit_start"
     bl_label = "Start"
@@ -7031,22 +8654,50 @@ class PCV_OT_edit_start(Operator):
         ns = c['normals']
         cs = c['colors']
         
+        # limit edited points to region
+        indexes = None
+        if(pcv.edit_region != 'ALL'):
+            if(pcv.edit_region == 'SELECTION'):
+                if(not pcv.filter_remove_color_selection or 'selection_indexes' not in c.keys()):
+                    self.report({'ERROR'}, "Nothing selected")
+                    return {'CANCELLED'}
+                indexes = np.unique(np.array(c['selection_indexes'], dtype=np.int64, ))
+            else:
+                if(pcv.edit_region == 'CLIP'):
+                    planes = [getattr(pcv, 'clip_plane{}'.format(i)) for i in range(6) if getattr(pcv, 'clip_plane{}_enabled'.format(i))]
+                    if(len(planes) == 0):
+                        self.report({'ERROR'}, "No clip planes enabled")
+                        return {'CANCELLED'}
+                else:
+                    cam = context.scene.camera
+                    if(cam is None):
+                        self.report({'ERROR'}, "No camera in scene")
+                        return {'CANCELLED'}
+                    r = context.scene.render
+                    m = cam.calc_matrix_camera(context.evaluated_depsgraph_get(), x=r.resolution_x, y=r.resolution_y, scale_x=r.pixel_aspect_x, scale_y=r.pixel_aspect_y, )
+                    planes = PCVRegion.frustum_planes(m @ cam.matrix_world.inverted() @ context.object.matrix_world)
+                if('region_index' not in c.keys() or c['region_index'].vs is not vs):
+                    c['region_index'] = PCVRegion(vs)
+                indexes = c['region_index'].query(planes)
+            if(len(indexes) == 0):
+                self.report({'ERROR'}, "No points in region")
+                return {'CANCELLED'}
+            vs = vs[indexes]
+            ns = ns[indexes]
+            cs = cs[indexes]
+        
         # ensure object mode
         bpy.ops.object.mode_set(mode='OBJECT')
         
-        # prepare mesh
-        bm = bmesh.new()
-        for v in vs:
-            bm.verts.new(v)
-        bm.verts.ensure_lookup_table()
-        l = bm.verts.layers.int.new('pcv_indexes')
-        for i in range(len(vs)):
-            bm.verts[i][l] = i
-        # add mesh to scene, activate
+        # prepare mesh, each vertex knows its index in arrays at edit start, normals and colors are taken from them on update
         nm = 'pcv_edit_mesh_{}'.format(pcv.uuid)
         me = bpy.data.meshes.new(nm)
-        bm.to_mesh(me)
-        bm.free()
+        PCMeshWriter.vertices(me, vs, )
+        PCMeshWriter.int_layer(me, 'pcv_indexes', np.arange(len(vs), dtype=np.int32, ), )
+        me.update()
+        c['edit_normals'] = ns
+        c['edit_colors'] = cs
+        # add mesh to scene, activate
         o = bpy.data.objects.new(nm, me)
         view_layer = context.view_layer
         collection = view_layer.active_layer_collection.collection
@@ -7072,6 +8723,9 @@ class PCV_OT_edit_start(Operator):
         pcv.edit_pre_edit_size = pcv.point_size
         pcv.point_size = pcv.edit_overlay_size
         
+        if(indexes is not None):
+            PCVManager.region(pcv.uuid, indexes, )
+        
         return {'FINISHED'}
 
 
@@ -7103,34 +8757,28 @@ class PCV_OT_edit_update(Operator):
         vs = c['vertices']
         ns = c['normals']
         cs = c['colors']
-        # extract edited data
+        if('edit_normals' in c):
+            ns = c['edit_normals']
+            cs = c['edit_colors']
+        # extract edited data, edit mesh have to be written to mesh first
         o = context.object
-        bm = bmesh.from_edit_mesh(o.data)
-        bm.verts.ensure_lookup_table()
-        l = bm.verts.layers.int['pcv_indexes']
-        edit_vs = []
-        edit_indexes = []
-        for v in bm.verts:
-            edit_vs.append(v.co.to_tuple())
-            edit_indexes.append(v[l])
-        # combine
-        u_vs = []
-        u_ns = []
-        u_cs = []
-        for i, indx in enumerate(edit_indexes):
-            u_vs.append(edit_vs[i])
-            u_ns.append(ns[indx])
-            u_cs.append(cs[indx])
+        o.update_from_editmode()
+        me = o.data
+        edit_vs = PCVMeshData.vertices(me)
+        edit_indexes = PCVMeshData.int_layer(me, 'pcv_indexes')
+        if(edit_indexes is None):
+            self.report({'ERROR'}, "Cannot find point indexes in edited mesh")
+            return {'CANCELLED'}
+        # combine, new vertices copy index from vertex they were made from, or get 0 if there was none
+        np.clip(edit_indexes, 0, len(ns) - 1, out=edit_indexes, )
         # display
-        vs = np.array(u_vs, dtype=np.float32, )
-        ns = np.array(u_ns, dtype=np.float32, )
-        cs = np.array(u_cs, dtype=np.float32, )
-        PCVManager.update(uuid, vs, ns, cs, )
-        # update indexes
-        bm.verts.ensure_lookup_table()
-        l = bm.verts.layers.int['pcv_indexes']
-        for i in range(len(vs)):
-            bm.verts[i][l] = i
+        vs = edit_vs
+        ns = ns[edit_indexes]
+        cs = cs[edit_indexes]
+        if('edit_region' in c.keys()):
+            PCVManager.splice(uuid, vs, ns, cs, )
+        else:
+            PCVManager.update(uuid, vs, ns, cs, )
         
         return {'FINISHED'}
 
@@ -7163,6 +8811,13 @@ class PCV_OT_edit_end(Operator):
         # cleanup
         bpy.ops.object.mode_set(mode='EDIT')
         o = context.object
+        c = PCVManager.cache[o.point_cloud_visualizer.edit_is_edit_uuid]
+        c.pop('edit_normals', None)
+        c.pop('edit_colors', None)
+        if('edit_region' in c.keys()):
+            # back to single batch
+            del c['edit_region']
+            PCVManager.update(o.point_cloud_visualizer.edit_is_edit_uuid, c['vertices'], c['normals'], c['colors'], )
         p = o.parent
         me = o.data
         view_layer = context.view_layer
@@ -7212,6 +8867,9 @@ class PCV_OT_edit_cancel(Operator):
                 bpy.data.meshes.remove(me)
                 break
         
+        if(pcv.uuid in PCVManager.cache):
+            PCVManager.cache[pcv.uuid].pop('edit_region', None)
+        
         pcv.edit_initialized = False
         pcv.global_alpha = pcv.edit_pre_edit_alpha
         pcv.edit_pre_edit_alpha = 0.5
@@ -7255,115 +8913,115 @@ class PCV_OT_filter_merge(Operator):
         return {'RUNNING_MODAL'}
     
     def execute(self, context):
-        pcv = context.object.point_cloud_visualizer
-        
-        filepath = self.filepath
-        h, t = os.path.split(filepath)
-        n, e = os.path.splitext(t)
-        if(e != '.ply'):
-            self.report({'ERROR'}, "File at '{}' seems not to be a PLY file.".format(filepath))
-            return {'CANCELLED'}
-        
-        points = []
-        try:
-            points = PlyPointCloudReader(filepath).points
-        except Exception as e:
-            self.report({'ERROR'}, str(e))
-            return {'CANCELLED'}
-        if(len(points) == 0):
-            self.report({'ERROR'}, "No vertices loaded from file at {}".format(filepath))
-            return {'CANCELLED'}
-        
-        if(not set(('x', 'y', 'z')).issubset(points.dtype.names)):
-            # this is very unlikely..
-            self.report({'ERROR'}, "Loaded data seems to miss vertex locations.")
-            return False
-        normals = True
-        if(not set(('nx', 'ny', 'nz')).issubset(points.dtype.names)):
-            normals = False
-        pcv.has_normals = normals
-        if(not pcv.has_normals):
-            pcv.illumination = False
-        vcols = True
-        if(not set(('red', 'green', 'blue')).issubset(points.dtype.names)):
-            vcols = False
-        pcv.has_vcols = vcols
+        log("Merge:", 0)
+        _t = time.time()
         
-        vs = np.column_stack((points['x'], points['y'], points['z'], ))
+        o = context.object
+        pcv = o.point_cloud_visualizer
         
-        if(normals):
-            ns = np.column_stack((points['nx'], points['ny'], points['nz'], ))
-        else:
-            n = len(points)
-            ns = np.column_stack((np.full(n, 0.0, dtype=np.float32, ),
-                                  np.full(n, 0.0, dtype=np.float32, ),
-                                  np.full(n, 1.0, dtype=np.float32, ), ))
+        filepath = self.filepath
+        h, t = os.path.split(filepath)
+        n, e = os.path.splitext(t)
+        if(e != '.ply'):
+            self.report({'ERROR'}, "File at '{}' seems not to be a PLY file.".format(filepath))
+            return {'CANCELLED'}
         
-        if(vcols):
-            preferences = bpy.context.preferences
-            addon_prefs = preferences.addons[__name__].preferences
-            if(addon_prefs.convert_16bit_colors and points['red'].dtype == 'uint16'):
-                r8 = (points['red'] / 256).astype('uint8')
-                g8 = (points['green'] / 256).astype('uint8')
-                b8 = (points['blue'] / 256).astype('uint8')
-                if(addon_prefs.gamma_correct_16bit_colors):
-                    cs = np.column_stack(((r8 / 255) ** (1 / 2.2),
-                                          (g8 / 255) ** (1 / 2.2),
-                                          (b8 / 255) ** (1 / 2.2),
-                                          np.ones(len(points), dtype=float, ), ))
-                else:
-                    cs = np.column_stack((r8 / 255, g8 / 255, b8 / 255, np.ones(len(points), dtype=float, ), ))
-                cs = cs.astype(np.float32)
-            else:
-                # 'uint8'
-                cs = np.column_stack((points['red'] / 255, points['green'] / 255, points['blue'] / 255, np.ones(len(points), dtype=float, ), ))
-                cs = cs.astype(np.float32)
-        else:
-            n = len(points)
-            preferences = bpy.context.preferences
-            addon_prefs = preferences.addons[__name__].preferences
-            col = addon_prefs.default_vertex_color[:]
-            col = tuple([c ** (1 / 2.2) for c in col]) + (1.0, )
-            cs = np.column_stack((np.full(n, col[0], dtype=np.float32, ),
-                                  np.full(n, col[1], dtype=np.float32, ),
-                                  np.full(n, col[2], dtype=np.float32, ),
-                                  np.ones(n, dtype=np.float32, ), ))
+        try:
+            reader = PlyPointCloudChunkReader(filepath)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if(len(reader) == 0):
+            self.report({'ERROR'}, "No vertices loaded from file at {}".format(filepath))
+            return {'CANCELLED'}
         
-        # append
         c = PCVManager.cache[pcv.uuid]
         ovs = c['vertices']
         ons = c['normals']
         ocs = c['colors']
-        vs = np.concatenate((ovs, vs, ))
-        ns = np.concatenate((ons, ns, ))
-        cs = np.concatenate((ocs, cs, ))
+        ol = len(ovs)
+        
+        # incoming points are in space of transform object, bring them to point cloud object space
+        transform = None
+        if(pcv.filter_merge_transform_object is not None):
+            m = o.matrix_world.inverted() @ pcv.filter_merge_transform_object.matrix_world
+            transform = PCVTransform(m)
+        
+        deduplicate = pcv.filter_merge_deduplicate
+        if(deduplicate):
+            neighbors = PCVNeighbors(ovs)
+        
+        # preallocate for all points and fill chunk by chunk, duplicates are trimmed at the end
+        l = ol + len(reader)
+        vs = np.empty((l, 3), dtype=np.float32, )
+        ns = np.empty((l, 3), dtype=np.float32, )
+        cs = np.empty((l, 4), dtype=np.float32, )
+        vs[:ol] = ovs
+        ns[:ol] = ons
+        cs[:ol] = ocs
+        
+        normals = pcv.has_normals
+        vcols = pcv.has_vcols
+        i = ol
+        removed = 0
+        try:
+            for points in reader:
+                if(not set(('x', 'y', 'z')).issubset(points.dtype.names)):
+                    # this is very unlikely..
+                    self.report({'ERROR'}, "Loaded data seems to miss vertex locations.")
+                    return {'CANCELLED'}
+                
+                cvs, cns, ccs, cn, cc = PCVManager.points_to_data(points)
+                normals = (normals and cn)
+                vcols = (vcols or cc)
+                
+                if(transform is not None):
+                    if(cn):
+                        cvs, cns = transform.apply(cvs, cns, )
+                    else:
+                        cvs, _ = transform.apply(cvs, )
+                
+                if(deduplicate):
+                    k = ~neighbors.within(cvs, pcv.filter_merge_tolerance)
+                    removed += len(cvs) - np.count_nonzero(k)
+                    cvs = cvs[k]
+                    cns = cns[k]
+                    ccs = ccs[k]
+                
+                cl = len(cvs)
+                vs[i:i + cl] = cvs
+                ns[i:i + cl] = cns
+                cs[i:i + cl] = ccs
+                i += cl
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        
+        vs = vs[:i]
+        ns = ns[:i]
+        cs = cs[:i]
+        
+        log("merged {} points, removed {} duplicates".format(i - ol, removed), 1)
         
         preferences = bpy.context.preferences
         addon_prefs = preferences.addons[__name__].preferences
         if(addon_prefs.shuffle_points):
-            l = len(vs)
-            dt = [('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('nx', '<f8'), ('ny', '<f8'), ('nz', '<f8'), ('red', '<f8'), ('green', '<f8'), ('blue', '<f8'), ('alpha', '<f8'), ]
-            a = np.empty(l, dtype=dt, )
-            a['x'] = vs[:, 0]
-            a['y'] = vs[:, 1]
-            a['z'] = vs[:, 2]
-            a['nx'] = ns[:, 0]
-            a['ny'] = ns[:, 1]
-            a['nz'] = ns[:, 2]
-            a['red'] = cs[:, 0]
-            a['green'] = cs[:, 1]
-            a['blue'] = cs[:, 2]
-            a['alpha'] = cs[:, 3]
-            np.random.shuffle(a)
-            vs = np.column_stack((a['x'], a['y'], a['z'], ))
-            ns = np.column_stack((a['nx'], a['ny'], a['nz'], ))
-            cs = np.column_stack((a['red'], a['green'], a['blue'], a['alpha'], ))
-            vs = vs.astype(np.float32)
-            ns = ns.astype(np.float32)
-            cs = cs.astype(np.float32)
+            # shuffle all in place with the same permutation, random state is restored before each array, indexing by permutation would copy all arrays again
+            state = np.random.get_state()
+            for a in (vs, ns, cs, ):
+                np.random.set_state(state)
+                np.random.shuffle(a)
+        
+        pcv.has_normals = normals
+        if(not pcv.has_normals):
+            pcv.illumination = False
+        pcv.has_vcols = vcols
         
         PCVManager.update(pcv.uuid, vs, ns, cs, )
         
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+        
         return {'FINISHED'}
 
 
@@ -7410,22 +9068,9 @@ class PCV_OT_filter_join(Operator):
         nns = c2['normals']
         ncs = c2['colors']
         
-        def apply_matrix(m, vs, ns=None, ):
-            vs.shape = (-1, 3)
-            vs = np.c_[vs, np.ones(vs.shape[0])]
-            vs = np.dot(m, vs.T)[0:3].T.reshape((-1))
-            vs.shape = (-1, 3)
-            if(ns is not None):
-                _, rot, _ = m.decompose()
-                rmat = rot.to_matrix().to_4x4()
-                ns.shape = (-1, 3)
-                ns = np.c_[ns, np.ones(ns.shape[0])]
-                ns = np.dot(rmat, ns.T)[0:3].T.reshape((-1))
-                ns.shape = (-1, 3)
-            return vs, ns
-        
-        nvs, nns = apply_matrix(pcv.filter_join_object.matrix_world, nvs, nns, )
-        nvs, nns = apply_matrix(context.object.matrix_world.inverted(), nvs, nns, )
+        # joined object space to this object space in one pass, on copies, other cloud stays untouched
+        m = context.object.matrix_world.inverted() @ pcv.filter_join_object.matrix_world
+        nvs, nns = PCVTransform(m).apply(nvs.copy(), nns.copy(), )
         
         vs = np.concatenate((ovs, nvs, ))
         ns = np.concatenate((ons, nns, ))
@@ -7494,27 +9139,13 @@ class PCV_OT_filter_boolean_intersect(Operator):
         if(o is None):
             raise Exception()
         
-        def apply_matrix(vs, ns, matrix, ):
-            matrot = matrix.decompose()[1].to_matrix().to_4x4()
-            dtv = vs.dtype
-            dtn = ns.dtype
-            rvs = np.zeros(vs.shape, dtv)
-            rns = np.zeros(ns.shape, dtn)
-            for i in range(len(vs)):
-                co = matrix @ Vector(vs[i])
-                no = matrot @ Vector(ns[i])
-                rvs[i] = np.array(co.to_tuple(), dtv)
-                rns[i] = np.array(no.to_tuple(), dtn)
-            return rvs, rns
-        
         c = PCVManager.cache[pcv.uuid]
         vs = c['vertices']
         ns = c['normals']
         cs = c['colors']
         
-        # apply parent matrix to points
+        # points stay in object space, target mesh is brought to it instead
         m = c['object'].matrix_world.copy()
-        # vs, ns = apply_matrix(vs, ns, m)
         
         sc = context.scene
         depsgraph = bpy.context.evaluated_depsgraph_get()
@@ -7711,27 +9342,13 @@ class PCV_OT_filter_boolean_exclude(Operator):
         if(o is None):
             raise Exception()
         
-        def apply_matrix(vs, ns, matrix, ):
-            matrot = matrix.decompose()[1].to_matrix().to_4x4()
-            dtv = vs.dtype
-            dtn = ns.dtype
-            rvs = np.zeros(vs.shape, dtv)
-            rns = np.zeros(ns.shape, dtn)
-            for i in range(len(vs)):
-                co = matrix @ Vector(vs[i])
-                no = matrot @ Vector(ns[i])
-                rvs[i] = np.array(co.to_tuple(), dtv)
-                rns[i] = np.array(no.to_tuple(), dtn)
-            return rvs, rns
-        
         c = PCVManager.cache[pcv.uuid]
         vs = c['vertices']
         ns = c['normals']
         cs = c['colors']
         
-        # apply parent matrix to points
+        # points stay in object space, target mesh is brought to it instead
         m = c['object'].matrix_world.copy()
-        # vs, ns = apply_matrix(vs, ns, m)
         
         sc = context.scene
         depsgraph = bpy.context.evaluated_depsgraph_get()
@@ -7956,100 +9573,43 @@ class PCV_OT_sequence_preload(Operator):
         
         # pcv.sequence_enabled = True
         
-        dirpath = os.path.dirname(pcv.filepath)
-        files = []
-        for (p, ds, fs) in os.walk(dirpath):
-            files.extend(fs)
-            break
-        
-        fs = [f for f in files if f.lower().endswith('.ply')]
-        f = os.path.split(pcv.filepath)[1]
-        
-        pattern = re.compile(r'(\d+)(?!.*(\d+))')
+        try:
+            sequence = PCVSequence.files(pcv.filepath)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
         
-        m = re.search(pattern, f, )
-        if(m is not None):
-            prefix = f[:m.start()]
-            suffix = f[m.end():]
+        if(pcv.sequence_streaming):
+            log('streaming..', 1)
+            # frames are loaded during playback, only list of files is kept
+            cache = sequence
         else:
-            self.report({'ERROR'}, 'Filename does not contain any sequence number')
+            log('preloading..', 1)
+            # this is our sequence with matching filenames, sorted by numbers with missing skipped, now load it all..
+            wm = context.window_manager
+            wm.progress_begin(0, len(sequence))
+            deltas = None
+            consume = None
+            if(pcv.sequence_delta_encoding):
+                # frames are encoded as they come, full arrays are not kept
+                deltas = PCVSequenceDeltas(pcv.sequence_keyframe_interval)
+                consume = deltas.append
+            try:
+                cache, failed = PCVSequence.preload(sequence, PCVManager.color_options(), pcv.sequence_preload_workers, wm.progress_update, consume, )
+            finally:
+                wm.progress_end()
+            if(deltas is not None):
+                deltas.finish()
+                cache = [{'index': f['index'], } for f in deltas.frames]
+            if(len(failed) > 0):
+                for item, e in failed:
+                    log('{}: {}'.format(item['name'], e), 2)
+                self.report({'WARNING'}, "{} file(s) failed to load, first is {}: {}".format(len(failed), failed[0][0]['name'], failed[0][1], ))
+        
+        if(len(cache) == 0):
+            self.report({'ERROR'}, "No files loaded")
             return {'CANCELLED'}
         
-        sel = []
-        
-        for n in fs:
-            m = re.search(pattern, n, )
-            if(m is not None):
-                # some numbers present, lets compare with selected file prefix/suffix
-                pre = n[:m.start()]
-                if(pre == prefix):
-                    # prefixes match
-                    suf = n[m.end():]
-                    if(suf == suffix):
-                        # suffixes match, extract number
-                        si = n[m.start():m.end()]
-                        try:
-                            # try convert it to integer
-                            i = int(si)
-                            # and store as selected file
-                            sel.append((i, n))
-                        except ValueError:
-                            pass
-        
-        # sort by sequence number
-        sel.sort()
-        # fabricate list with missing sequence numbers as None
-        sequence = [[None] for i in range(sel[-1][0])]
-        for i, n in sel:
-            sequence[i - 1] = (i, n)
-        for i in range(len(sequence)):
-            if(sequence[i][0] is None):
-                sequence[i] = [i, None]
-        
-        log('found files:', 1)
-        for i, n in sequence:
-            log('{}: {}'.format(i, n), 2)
-        
-        log('preloading..', 1)
-        # this is our sequence with matching filenames, sorted by numbers with missing as None, now load it all..
-        cache = []
-        for i, n in sequence:
-            if(n is not None):
-                p = os.path.join(dirpath, n)
-                points = []
-                try:
-                    points = PlyPointCloudReader(p).points
-                except Exception as e:
-                    self.report({'ERROR'}, str(e))
-                if(len(points) == 0):
-                    self.report({'ERROR'}, "No vertices loaded from file at {}".format(p))
-                else:
-                    if(not set(('x', 'y', 'z')).issubset(points.dtype.names)):
-                        self.report({'ERROR'}, "Loaded data seems to miss vertex locations.")
-                        return {'CANCELLED'}
-                    
-                    vs = np.column_stack((points['x'], points['y'], points['z'], ))
-                    vs = vs.astype(np.float32)
-                    
-                    if(not set(('nx', 'ny', 'nz')).issubset(points.dtype.names)):
-                        ns = None
-                    else:
-                        ns = np.column_stack((points['nx'], points['ny'], points['nz'], ))
-                        ns = ns.astype(np.float32)
-                    if(not set(('red', 'green', 'blue')).issubset(points.dtype.names)):
-                        cs = None
-                    else:
-                        cs = np.column_stack((points['red'] / 255, points['green'] / 255, points['blue'] / 255, np.ones(len(points), dtype=float, ), ))
-                        cs = cs.astype(np.float32)
-                    
-                    cache.append({'index': i,
-                                  'name': n,
-                                  'path': p,
-                                  'vs': vs,
-                                  'ns': ns,
-                                  'cs': cs,
-                                  'points': points, })
-        
         log('...', 1)
         log('loaded {} item(s)'.format(len(cache)), 1)
         log('initializing..', 1)
@@ -8058,7 +9618,12 @@ class PCV_OT_sequence_preload(Operator):
         
         ci = {'data': cache,
               'uuid': pcv.uuid,
-              'pcv': pcv, }
+              'pcv': pcv,
+              'batches': collections.OrderedDict(), }
+        if(not pcv.sequence_streaming and pcv.sequence_delta_encoding):
+            ci['deltas'] = deltas
+        if(pcv.sequence_streaming):
+            ci['stream'] = PCVSequenceStream(cache, PCVManager.color_options(), pcv.sequence_buffer_size, pcv.sequence_use_cyclic, )
         PCVSequence.cache[pcv.uuid] = ci
         
         log('force frame update..', 1)
@@ -8095,6 +9660,7 @@ class PCV_OT_sequence_clear(Operator):
     def execute(self, context):
         pcv = context.object.point_cloud_visualizer
         
+        PCVSequence.stop(PCVSequence.cache[pcv.uuid])
         del PCVSequence.cache[pcv.uuid]
         if(len(PCVSequence.cache.items()) == 0):
             PCVSequence.deinit()
@@ -8170,7 +9736,7 @@ class PCV_OT_generate_point_cloud(Operator):
             return {'CANCELLED'}
         
         n = pcv.generate_number_of_points
-        r = random.Random(pcv.generate_seed)
+        r = PCVRandomStreams(pcv.generate_seed)
         
         if(pcv.generate_colors in ('CONSTANT', 'UVTEX', 'VCOLS', 'GROUP_MONO', 'GROUP_COLOR', )):
             if(o.type in ('CURVE', 'SURFACE', 'FONT', ) and pcv.generate_colors != 'CONSTANT'):
@@ -8195,7 +9761,7 @@ class PCV_OT_generate_point_cloud(Operator):
                 sampler = PCVVertexSampler(context, o,
                                            colorize=pcv.generate_colors,
                                            constant_color=pcv.generate_constant_color,
-                                           vcols=vcols, uvtex=uvtex, vgroup=vgroup, )
+                                           vcols=vcols, uvtex=uvtex, vgroup=vgroup, rnd=r, )
             except Exception as e:
                 self.report({'ERROR'}, str(e), )
                 return {'CANCELLED'}
@@ -8205,8 +9771,7 @@ class PCV_OT_generate_point_cloud(Operator):
                     sampler = PCVTriangleSurfaceSampler(context, o, n, r,
                                                         colorize=pcv.generate_colors,
                                                         constant_color=pcv.generate_constant_color,
-                                                        vcols=vcols, uvtex=uvtex, vgroup=vgroup,
-                                                        exact_number_of_points=pcv.generate_exact_number_of_points, )
+                                                        vcols=vcols, uvtex=uvtex, vgroup=vgroup, )
                 except Exception as e:
                     self.report({'ERROR'}, str(e), )
                     return {'CANCELLED'}
@@ -8232,7 +9797,7 @@ class PCV_OT_generate_point_cloud(Operator):
                 sampler = PCVParticleSystemSampler(context, o, alive_only=alive_only,
                                                    colorize=pcv.generate_colors,
                                                    constant_color=pcv.generate_constant_color,
-                                                   vcols=vcols, uvtex=uvtex, vgroup=vgroup, )
+                                                   vcols=vcols, uvtex=uvtex, vgroup=vgroup, rnd=r, )
             except Exception as e:
                 self.report({'ERROR'}, str(e), )
                 return {'CANCELLED'}
@@ -8267,6 +9832,64 @@ class PCV_OT_generate_point_cloud(Operator):
         return {'FINISHED'}
 
 
+class PCV_OT_generate_batch(Operator):
+    bl_idname = "point_cloud_visualizer.generate_batch"
+    bl_label = "Generate From Selected"
+    bl_description = "Generate point clouds from all selected objects with generate settings of active object, into active object or into each object"
+    
+    @classmethod
+    def poll(cls, context):
+        if(context.object is None):
+            return False
+        for o in context.selected_objects:
+            if(o.type in ('MESH', 'CURVE', 'SURFACE', 'FONT', )):
+                return True
+        return False
+    
+    def execute(self, context):
+        log("Generate From Selected:", 0)
+        _t = time.time()
+        
+        o = context.object
+        pcv = o.point_cloud_visualizer
+        
+        obs = [ob for ob in context.selected_objects if ob.type in ('MESH', 'CURVE', 'SURFACE', 'FONT', )]
+        if(pcv.generate_batch_mode == 'JOIN'):
+            # clouds live on objects, target of joined cloud has to stay valid
+            if(pcv.uuid in PCVSequence.cache.keys()):
+                self.report({'ERROR'}, "Active object is used for sequence.")
+                return {'CANCELLED'}
+        
+        try:
+            g = PCVBatchSampler(context, obs,
+                                source=pcv.generate_source,
+                                algorithm=pcv.generate_algorithm,
+                                num_samples=pcv.generate_number_of_points,
+                                minimal_distance=pcv.generate_minimal_distance,
+                                sampling_exponent=pcv.generate_sampling_exponent,
+                                alive_only=(pcv.generate_source_psys != 'ALL'),
+                                colorize=pcv.generate_colors,
+                                constant_color=pcv.generate_constant_color,
+                                seed=pcv.generate_seed, )
+        except Exception as e:
+            self.report({'ERROR'}, str(e), )
+            return {'CANCELLED'}
+        
+        if(pcv.generate_batch_mode == 'JOIN'):
+            vs, ns, cs = g.join(o.matrix_world)
+            c = PCVControl(o)
+            c.draw(vs, ns, cs)
+        else:
+            for ob, (vs, ns, cs) in zip(g.objects, g.results):
+                c = PCVControl(ob)
+                c.draw(vs, ns, cs)
+        
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
+        
+        return {'FINISHED'}
+
+
 class PCV_OT_reset_runtime(Operator):
     bl_idname = "point_cloud_visualizer.reset_runtime"
     bl_label = "Reset Runtime"
@@ -8318,9 +9941,17 @@ class PCV_OT_generate_volume_point_cloud(Operator):
         
         o = context.object
         pcv = o.point_cloud_visualizer
+        if(o.type not in ('MESH', 'CURVE', 'SURFACE', 'FONT', )):
+            self.report({'ERROR'}, "Object does not have geometry data.")
+            return {'CANCELLED'}
+        
         n = pcv.generate_number_of_points
-        r = random.Random(pcv.generate_seed)
-        g = PCVRandomVolumeSampler(o, n, r, )
+        r = PCVRandomStreams(pcv.generate_seed)
+        try:
+            g = PCVRandomVolumeSampler(context, o, n, r, )
+        except Exception as e:
+            self.report({'ERROR'}, str(e), )
+            return {'CANCELLED'}
         vs = g.vs
         ns = g.ns
         cs = g.cs
@@ -8413,35 +10044,17 @@ class PCV_OT_color_adjustment_shader_apply(Operator):
         c = PCVManager.cache[pcv.uuid]
         vs = c['vertices']
         ns = c['normals']
-        cs = c['colors']
+        # copy, cached colors can be shared with sequence frames and their batches
+        cs = c['colors'].astype(np.float32)
+        
+        _t = time.time()
+        log("{}:".format(self.__class__.__name__), 0, )
+        
+        # the same pipeline as used by viewport shader
+        PCVColorAdjustment.from_pcv(pcv).apply(cs)
         
-        cs = cs * (2 ** pcv.color_adjustment_shader_exposure)
-        cs = np.clip(cs, 0.0, 1.0, )
-        cs = cs ** (1 / pcv.color_adjustment_shader_gamma)
-        cs = np.clip(cs, 0.0, 1.0, )
-        cs = (cs - 0.5) * pcv.color_adjustment_shader_contrast + 0.5 + pcv.color_adjustment_shader_brightness
-        cs = np.clip(cs, 0.0, 1.0, )
-        
-        h = pcv.color_adjustment_shader_hue
-        s = pcv.color_adjustment_shader_saturation
-        v = pcv.color_adjustment_shader_value
-        if(h > 1.0):
-            h = h % 1.0
-        for _i, ca in enumerate(cs):
-            col = Color(ca[:3])
-            _h, _s, _v = col.hsv
-            _h = (_h + h) % 1.0
-            _s += s
-            _v += v
-            col.hsv = (_h, _s, _v)
-            cs[_i][0] = col.r
-            cs[_i][1] = col.g
-            cs[_i][2] = col.b
-        cs = np.clip(cs, 0.0, 1.0, )
-        
-        if(pcv.color_adjustment_shader_invert):
-            cs = 1.0 - cs
-        cs = np.clip(cs, 0.0, 1.0, )
+        _d = datetime.timedelta(seconds=time.time() - _t)
+        log("completed in {}.".format(_d), 1)
         
         bpy.ops.point_cloud_visualizer.color_adjustment_shader_reset()
         pcv.color_adjustment_shader_enabled = False
@@ -8988,14 +10601,17 @@ class PCV_PT_render(Panel):
         sub = l.column()
         
         c = sub.column()
+        r = c.row()
+        r.prop(pcv, 'render_backend', expand=True, )
         c.prop(pcv, 'render_display_percent')
         c.prop(pcv, 'render_point_size')
         c.prop(pcv, 'render_supersampling')
         r = c.row()
         r.prop(pcv, 'render_smoothstep')
+        r.prop(pcv, 'render_smoothstep_cache', toggle=True, )
         ok = False
         # if(not pcv.illumination and not pcv.override_default_shader):
-        if(not pcv.override_default_shader):
+        if(not pcv.override_default_shader and pcv.render_backend == 'GPU'):
             ok = True
         r.enabled = ok
         
@@ -9009,6 +10625,7 @@ class PCV_PT_render(Panel):
         r = s.row(align=True, )
         c = r.column(align=True)
         c.prop(pcv, 'render_path', text='', )
+        c.prop(pcv, 'render_file_format', text='', )
         
         r = sub.row(align=True)
         c0 = r.column(align=True)
@@ -9031,6 +10648,10 @@ class PCV_PT_render(Panel):
         r.operator('point_cloud_visualizer.render')
         r.operator('point_cloud_visualizer.render_animation')
         
+        r = sub.row(align=True)
+        r.prop(pcv, 'render_passes', expand=True, )
+        sub.operator('point_cloud_visualizer.render_passes')
+        
         sub.enabled = PCV_OT_render.poll(context)
 
 
@@ -9075,7 +10696,7 @@ class PCV_PT_convert(Panel):
         cc = c.column()
         cc.prop(pcv, 'mesh_size')
         
-        if(pcv.mesh_type in ('INSTANCER', 'PARTICLES', )):
+        if(pcv.mesh_type in ('INSTANCER', 'POINT_INSTANCER', 'PARTICLES', )):
             cc.prop(pcv, 'mesh_base_sphere_subdivisions')
         
         cc_n = cc.row()
@@ -9091,11 +10712,7 @@ class PCV_PT_convert(Panel):
         if(pcv.mesh_type == 'VERTEX'):
             cc.enabled = False
         
-        # c.operator('point_cloud_visualizer.convert')
-        
-        r = c.row(align=True)
-        r.operator('point_cloud_visualizer.convert')
-        r.prop(pcv, 'mesh_use_instancer2', toggle=True, text='', icon='AUTO', )
+        c.operator('point_cloud_visualizer.convert')
         
         c.enabled = PCV_OT_convert.poll(context)
 
@@ -9280,6 +10897,86 @@ class PCV_PT_filter_remove_color(Panel):
         c.enabled = PCV_OT_filter_remove_color.poll(context)
 
 
+class PCV_PT_filter_outliers(Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "View"
+    bl_label = "Remove Outliers"
+    bl_parent_id = "PCV_PT_filter"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    @classmethod
+    def poll(cls, context):
+        o = context.active_object
+        if(o is None):
+            return False
+        
+        if(o):
+            pcv = o.point_cloud_visualizer
+            if(pcv.edit_is_edit_mesh):
+                return False
+            if(pcv.edit_initialized):
+                return False
+        return True
+    
+    def draw(self, context):
+        pcv = context.object.point_cloud_visualizer
+        l = self.layout
+        c = l.column()
+        
+        a = c.column(align=True)
+        a.prop(pcv, 'filter_outliers_statistical_neighbors')
+        a.prop(pcv, 'filter_outliers_statistical_std_ratio')
+        a.operator('point_cloud_visualizer.filter_outliers_statistical')
+        
+        a = c.column(align=True)
+        a.prop(pcv, 'filter_outliers_radius')
+        a.prop(pcv, 'filter_outliers_radius_neighbors')
+        a.operator('point_cloud_visualizer.filter_outliers_radius')
+        
+        # selection is shared with remove color filter
+        cc = c.column(align=True)
+        r = cc.row(align=True)
+        r.operator('point_cloud_visualizer.filter_remove_color_delete_selected')
+        r.operator('point_cloud_visualizer.filter_remove_color_deselect', text="", icon='X', )
+        
+        c.enabled = PCV_OT_filter_outliers_statistical.poll(context)
+
+
+class PCV_PT_filter_normals(Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "View"
+    bl_label = "Normals"
+    bl_parent_id = "PCV_PT_filter"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    @classmethod
+    def poll(cls, context):
+        o = context.active_object
+        if(o is None):
+            return False
+        
+        if(o):
+            pcv = o.point_cloud_visualizer
+            if(pcv.edit_is_edit_mesh):
+                return False
+            if(pcv.edit_initialized):
+                return False
+        return True
+    
+    def draw(self, context):
+        pcv = context.object.point_cloud_visualizer
+        l = self.layout
+        c = l.column()
+        
+        c.prop(pcv, 'filter_normals_neighbors')
+        c.prop(pcv, 'filter_normals_orient')
+        c.operator('point_cloud_visualizer.filter_estimate_normals')
+        
+        c.enabled = PCV_OT_filter_estimate_normals.poll(context)
+
+
 class PCV_PT_filter_merge(Panel):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
@@ -9307,6 +11004,12 @@ class PCV_PT_filter_merge(Panel):
         l = self.layout
         c = l.column()
         
+        c.prop(pcv, 'filter_merge_transform_object')
+        r = c.row(align=True)
+        r.prop(pcv, 'filter_merge_deduplicate', toggle=True, text='', icon='CHECKBOX_HLT' if pcv.filter_merge_deduplicate else 'CHECKBOX_DEHLT', )
+        cc = r.column(align=True)
+        cc.prop(pcv, 'filter_merge_tolerance')
+        cc.active = pcv.filter_merge_deduplicate
         c.operator('point_cloud_visualizer.filter_merge')
         
         c.enabled = PCV_OT_filter_merge.poll(context)
@@ -9524,6 +11227,7 @@ class PCV_PT_edit(Panel):
         pcv = context.object.point_cloud_visualizer
         l = self.layout
         c = l.column()
+        c.prop(pcv, 'edit_region')
         c.operator('point_cloud_visualizer.edit_start', text='Enable Edit Mode', )
 
 
@@ -9603,9 +11307,26 @@ class PCV_PT_sequence(Panel):
         
         # c.label(text='Experimental', icon='ERROR', )
         
+        r = c.row()
+        r.prop(pcv, 'sequence_streaming')
+        r = r.row()
+        r.prop(pcv, 'sequence_buffer_size')
+        r.enabled = pcv.sequence_streaming
+        r = c.row()
+        r.prop(pcv, 'sequence_preload_workers')
+        r.enabled = not pcv.sequence_streaming
+        r = c.row()
+        r.prop(pcv, 'sequence_delta_encoding')
+        r = r.row()
+        r.prop(pcv, 'sequence_keyframe_interval')
+        r.enabled = pcv.sequence_delta_encoding
+        r.active = not pcv.sequence_streaming
         c.operator('point_cloud_visualizer.sequence_preload')
         if(pcv.uuid in PCVSequence.cache.keys()):
-            c.label(text="Loaded {} item(s)".format(len(PCVSequence.cache[pcv.uuid]['data'])))
+            if('stream' in PCVSequence.cache[pcv.uuid]):
+                c.label(text="Streaming {} item(s)".format(len(PCVSequence.cache[pcv.uuid]['data'])))
+            else:
+                c.label(text="Loaded {} item(s)".format(len(PCVSequence.cache[pcv.uuid]['data'])))
             # c.enabled = pcv.sequence_enabled
         else:
             c.label(text="Loaded {} item(s)".format(0))
@@ -9617,6 +11338,7 @@ class PCV_PT_sequence(Panel):
         # c.prop(pcv, 'sequence_frame_start')
         # c.prop(pcv, 'sequence_frame_offset')
         c.prop(pcv, 'sequence_use_cyclic')
+        c.prop(pcv, 'sequence_batch_budget')
         # c.enabled = False
         # if(pcv.sequence_enabled):
         #     c.enabled = True
@@ -9684,7 +11406,6 @@ class PCV_PT_generate(Panel):
             if(pcv.generate_algorithm in ('WEIGHTED_RANDOM_IN_TRIANGLE', )):
                 c.prop(pcv, 'generate_number_of_points')
                 c.prop(pcv, 'generate_seed')
-                c.prop(pcv, 'generate_exact_number_of_points')
             if(pcv.generate_algorithm in ('POISSON_DISK_SAMPLING', )):
                 c.prop(pcv, 'generate_minimal_distance')
                 c.prop(pcv, 'generate_sampling_exponent')
@@ -9696,6 +11417,9 @@ class PCV_PT_generate(Panel):
             third_label_two_thirds_prop(pcv, 'generate_constant_color', c, )
         
         c.operator('point_cloud_visualizer.generate_from_mesh')
+        r = c.row(align=True)
+        r.operator('point_cloud_visualizer.generate_batch')
+        r.prop(pcv, 'generate_batch_mode', text='', )
         c.operator('point_cloud_visualizer.reset_runtime', text="Remove Generated", )
         
         c.enabled = PCV_OT_generate_point_cloud.poll(context)
@@ -10142,10 +11866,19 @@ class PCV_properties(PropertyGroup):
     
     render_point_size: IntProperty(name="Size", default=3, min=1, max=100, subtype='PIXEL', description="Point size", )
     render_display_percent: FloatProperty(name="Count", default=100.0, min=0.0, max=100.0, precision=0, subtype='PERCENTAGE', description="Adjust percentage of points rendered", )
-    render_path: StringProperty(name="Output Path", default="//pcv_render_###.png", description="Directory/name to save rendered images, # characters defines the position and length of frame numbers, filetype is always png", subtype='FILE_PATH', )
+    render_path: StringProperty(name="Output Path", default="//pcv_render_###.png", description="Directory/name to save rendered images, # characters defines the position and length of frame numbers, extension is set by output format", subtype='FILE_PATH', )
     render_resolution_x: IntProperty(name="Resolution X", default=1920, min=4, max=65536, description="Number of horizontal pixels in rendered image", subtype='PIXEL', )
     render_resolution_y: IntProperty(name="Resolution Y", default=1080, min=4, max=65536, description="Number of vertical pixels in rendered image", subtype='PIXEL', )
     render_resolution_percentage: IntProperty(name="Resolution %", default=100, min=1, max=100, description="Percentage scale for render resolution", subtype='PERCENTAGE', )
+    render_backend: EnumProperty(name="Backend", items=[('GPU', "GPU", "Render with gpu to offscreen buffer"),
+                                                        ('CPU', "CPU", "Render with software rasterizer, works without gpu, e.g. on render farm nodes with blender in background, smooth circles are not supported"), ], default='GPU', description="Render backend", )
+    render_file_format: EnumProperty(name="Format", items=[('PNG', "PNG", "8 bit RGBA PNG"),
+                                                           ('OPEN_EXR', "OpenEXR", "32 bit float RGBA OpenEXR"), ], default='PNG', description="Output file format", )
+    render_passes: EnumProperty(name="Passes", items=[('COLOR', "Color", "Point colors, with illumination if enabled"),
+                                                      ('DEPTH', "Depth", "Depth with current depth shader settings"),
+                                                      ('NORMAL', "Normal", "Normals as colors"),
+                                                      ('POSITION', "Position", "Positions as colors"), ], default={'COLOR', 'DEPTH', }, options={'ENUM_FLAG'}, description="Passes rendered by Passes, each is saved to image with pass name appended", )
+    render_smoothstep_cache: BoolProperty(name="Reuse Order", default=True, description="Keep depth order of points between renders and reuse it when camera, object and points did not change", )
     render_smoothstep: BoolProperty(name="Smooth Circles", default=False, description="Currently works only for basic shader with/without illumination and generally is much slower than Supersampling, use only when Supersampling fails", )
     render_supersampling: IntProperty(name="Supersampling", default=1, soft_min=1, soft_max=4, min=1, max=10, description="Render larger image and then resize back, 1 - disabled, 2 - render 200%, 3 - render 300%, ...", )
     
@@ -10176,6 +11909,7 @@ class PCV_properties(PropertyGroup):
                                                 ('CUBE', "Cube", ""),
                                                 ('ICOSPHERE', "Ico Sphere", ""),
                                                 ('INSTANCER', "Instancer", ""),
+                                                ('POINT_INSTANCER', "Point Instancer", ""),
                                                 ('PARTICLES', "Particle System", ""), ], default='CUBE', description="Instance mesh type", )
     mesh_size: FloatProperty(name="Size", description="Mesh instance size, instanced mesh has size 1.0", default=0.01, min=0.000001, precision=4, max=100.0, )
     mesh_normal_align: BoolProperty(name="Align To Normal", description="Align instance to point normal", default=True, )
@@ -10183,7 +11917,6 @@ class PCV_properties(PropertyGroup):
     mesh_all: BoolProperty(name="All", description="Convert all points", default=True, )
     mesh_percentage: FloatProperty(name="Subset", default=100.0, min=0.0, max=100.0, precision=0, subtype='PERCENTAGE', description="Convert random subset of points by given percentage", )
     mesh_base_sphere_subdivisions: IntProperty(name="Sphere Subdivisions", default=2, min=1, max=6, description="Particle instance (Ico Sphere) subdivisions, instance mesh can be change later", )
-    mesh_use_instancer2: BoolProperty(name="Use Faster Conversion", description="Faster (especially with icosphere) Numpy implementation, use if you don't mind all triangles in result", default=False, )
     
     export_use_viewport: BoolProperty(name="Use Viewport Points", default=True, description="When checked, export points currently displayed in viewport or when unchecked, export data loaded from original ply file", )
     export_apply_transformation: BoolProperty(name="Apply Transformation", default=False, description="Apply parent object transformation to points", )
@@ -10202,6 +11935,17 @@ class PCV_properties(PropertyGroup):
     filter_remove_color_delta_value_use: BoolProperty(name="Use Δ Value", description="", default=True, )
     filter_remove_color_selection: BoolProperty(default=False, options={'HIDDEN', }, )
     
+    filter_outliers_statistical_neighbors: IntProperty(name="Neighbors", default=16, min=1, max=256, subtype='NONE', description="Number of nearest neighbors used to calculate mean distance of each point", )
+    filter_outliers_statistical_std_ratio: FloatProperty(name="Std Ratio", default=2.0, min=0.0, max=100.0, precision=2, description="Points with mean distance larger than average mean distance plus standard deviation multiplied by this value are outliers, the lower value, the more points are selected", )
+    filter_outliers_radius: FloatProperty(name="Radius", default=0.05, min=0.000001, max=10000.0, precision=3, subtype='DISTANCE', description="Radius in which neighbors are counted", )
+    filter_outliers_radius_neighbors: IntProperty(name="Min Neighbors", default=4, min=1, subtype='NONE', description="Points with less neighbors within radius are outliers", )
+    
+    filter_normals_neighbors: IntProperty(name="Neighbors", default=16, min=3, max=256, subtype='NONE', description="Number of nearest neighbors used to fit plane at each point", )
+    filter_normals_orient: EnumProperty(name="Orient", items=[('NONE', "None", "Do not orient normals, normal direction along fitted plane normal is arbitrary"),
+                                                              ('CAMERA', "Scene Camera", "Flip normals to face active scene camera"),
+                                                              ('CURSOR', "3D Cursor", "Flip normals to face 3D cursor"),
+                                                              ], default='CAMERA', description="Normals orientation", )
+    
     def _project_positive_radio_update(self, context):
         if(not self.filter_project_negative and not self.filter_project_positive):
             self.filter_project_negative = True
@@ -10251,6 +11995,10 @@ class PCV_properties(PropertyGroup):
     
     filter_join_object: PointerProperty(type=bpy.types.Object, name="Object", description="", poll=_filter_join_object_poll, )
     
+    filter_merge_transform_object: PointerProperty(type=bpy.types.Object, name="Transform", description="Optional object, points from merged file are transformed from its space to point cloud object space", )
+    filter_merge_deduplicate: BoolProperty(name="Remove Duplicates", default=False, description="Skip merged points closer than tolerance to existing points", )
+    filter_merge_tolerance: FloatProperty(name="Tolerance", default=0.001, min=0.000001, max=10.0, precision=4, subtype='DISTANCE', description="Merged points closer than this distance to existing points are considered duplicates", )
+    
     edit_initialized: BoolProperty(default=False, options={'HIDDEN', }, )
     edit_is_edit_mesh: BoolProperty(default=False, options={'HIDDEN', }, )
     edit_is_edit_uuid: StringProperty(default="", options={'HIDDEN', }, )
@@ -10272,12 +12020,22 @@ class PCV_properties(PropertyGroup):
     
     edit_overlay_alpha: FloatProperty(name="Overlay Alpha", default=0.5, min=0.0, max=1.0, precision=2, subtype='FACTOR', description="Overlay point alpha", update=_edit_overlay_alpha_update, )
     edit_overlay_size: IntProperty(name="Overlay Size", default=3, min=1, max=10, subtype='PIXEL', description="Overlay point size", update=_edit_overlay_size_update, )
+    edit_region: EnumProperty(name="Region", items=[('ALL', "All Points", "Edit whole point cloud"),
+                                                    ('CLIP', "Clip Planes", "Edit only points inside enabled clip planes"),
+                                                    ('CAMERA', "Camera", "Edit only points inside scene camera view"),
+                                                    ('SELECTION', "Selection", "Edit only points selected by color filter"), ], default='ALL', description="Points extracted to helper mesh, the rest of point cloud is left untouched", )
     
     # sequence_enabled: BoolProperty(default=False, options={'HIDDEN', }, )
     # sequence_frame_duration: IntProperty(name="Frames", default=1, min=1, description="", )
     # sequence_frame_start: IntProperty(name="Start Frame", default=1, description="", )
     # sequence_frame_offset: IntProperty(name="Offset", default=0, description="", )
     sequence_use_cyclic: BoolProperty(name="Cycle Forever", default=True, description="Cycle preloaded point clouds (ply_index = (current_frame % len(ply_files)) - 1)", )
+    sequence_streaming: BoolProperty(name="Stream", default=False, description="Do not preload whole sequence, read frames from disk in background during playback, only a few frames ahead are kept in memory", )
+    sequence_preload_workers: IntProperty(name="Workers", default=0, min=0, max=256, description="Number of files read at once when preloading, 0 uses number of processors", )
+    sequence_batch_budget: IntProperty(name="Frame Cache (MB)", default=256, min=0, max=65536, description="Memory for drawing data of already shown frames kept for reuse, 0 disables it", )
+    sequence_delta_encoding: BoolProperty(name="Delta", default=False, description="Keep preloaded frames as keyframes plus changed points against previous frame, saves memory on mostly static sequences", )
+    sequence_keyframe_interval: IntProperty(name="Keyframes", default=50, min=1, max=10000, description="Store full frame every n frames, jumping around timeline applies changes from nearest previous keyframe", )
+    sequence_buffer_size: IntProperty(name="Buffer", default=10, min=1, max=1000, description="Number of frames read ahead in playback direction when streaming", )
     
     generate_source: EnumProperty(name="Source", items=[('VERTICES', "Vertices", "Use mesh vertices"),
                                                         ('SURFACE', "Surface", "Use triangulated mesh surface"),
@@ -10291,6 +12049,9 @@ class PCV_properties(PropertyGroup):
                                                               ], default='WEIGHTED_RANDOM_IN_TRIANGLE', description="Point generating algorithm", )
     generate_number_of_points: IntProperty(name="Approximate Number Of Points", default=100000, min=1, description="Number of points to generate, some algorithms may not generate exact number of points.", )
     generate_seed: IntProperty(name="Seed", default=0, min=0, description="Random number generator seed", )
+    generate_batch_mode: EnumProperty(name="Batch", items=[('JOIN', "Join", "Generate one point cloud on active object from all selected objects"),
+                                                           ('SEPARATE', "Separate", "Generate point cloud on each selected object"),
+                                                           ], default='JOIN', description="Where to put point clouds generated from selected objects", )
     generate_colors: EnumProperty(name="Colors", items=[('CONSTANT', "Constant Color", "Use constant color value"),
                                                         ('VCOLS', "Vertex Colors", "Use active vertex colors"),
                                                         ('UVTEX', "UV Texture", "Generate colors from active image texture node in active material using active UV layout"),
@@ -10298,7 +12059,6 @@ class PCV_properties(PropertyGroup):
                                                         ('GROUP_COLOR', "Vertex Group Colorized", "Use active vertex group, result will be colored from red (1.0) to blue (0.0) like in weight paint viewport"),
                                                         ], default='CONSTANT', description="Color source for generated point cloud", )
     generate_constant_color: FloatVectorProperty(name="Color", description="Constant color", default=(0.7, 0.7, 0.7, ), min=0, max=1, subtype='COLOR', size=3, )
-    generate_exact_number_of_points: BoolProperty(name="Exact Number of Samples", default=False, description="Generate exact number of points, if selected algorithm result is less points, more points will be calculated on random polygons at the end, if result is more points, points will be shuffled and sliced to match exact value", )
     generate_minimal_distance: FloatProperty(name="Minimal Distance", default=0.1, precision=3, subtype='DISTANCE', description="Poisson Disk minimal distance between points, the smaller value, the slower calculation", )
     generate_sampling_exponent: IntProperty(name="Sampling Exponent", default=5, min=1, description="Poisson Disk presampling exponent, lower values are faster but less even, higher values are slower exponentially", )
     
@@ -10747,7 +12507,7 @@ def _update_panel_bl_category(self, context, ):
     _sub_panels = (
         PCV_PT_clip,
         PCV_PT_edit, PCV_PT_filter, PCV_PT_filter_simplify, PCV_PT_filter_project, PCV_PT_filter_boolean, PCV_PT_filter_remove_color,
-        PCV_PT_filter_merge, PCV_PT_filter_join, PCV_PT_filter_color_adjustment, PCV_PT_render, PCV_PT_convert, PCV_PT_generate, PCV_PT_export, PCV_PT_sequence,
+        PCV_PT_filter_outliers, PCV_PT_filter_normals, PCV_PT_filter_merge, PCV_PT_filter_join, PCV_PT_filter_color_adjustment, PCV_PT_render, PCV_PT_convert, PCV_PT_generate, PCV_PT_export, PCV_PT_sequence,
         PCV_PT_development,
         PCV_PT_debug,
     )
@@ -10831,21 +12591,24 @@ class PCV_preferences(AddonPreferences):
 def watcher(scene):
     PCVSequence.deinit()
     PCVManager.deinit()
+    PCVTextureSampler.clear()
+    PCVRasterizer.clear()
 
 
 classes = (
     PCV_properties, PCV_preferences,
     
     PCV_PT_panel, PCV_PT_clip, PCV_PT_edit,
-    PCV_PT_filter, PCV_PT_filter_simplify, PCV_PT_filter_project, PCV_PT_filter_boolean, PCV_PT_filter_remove_color, PCV_PT_filter_merge,
-    PCV_PT_filter_join, PCV_PT_filter_color_adjustment,
+    PCV_PT_filter, PCV_PT_filter_simplify, PCV_PT_filter_project, PCV_PT_filter_boolean, PCV_PT_filter_remove_color, PCV_PT_filter_outliers,
+    PCV_PT_filter_normals, PCV_PT_filter_merge, PCV_PT_filter_join, PCV_PT_filter_color_adjustment,
     PCV_PT_render, PCV_PT_convert, PCV_PT_generate, PCV_PT_export, PCV_PT_sequence,
     
-    PCV_OT_load, PCV_OT_draw, PCV_OT_erase, PCV_OT_render, PCV_OT_render_animation, PCV_OT_convert, PCV_OT_reload, PCV_OT_export,
+    PCV_OT_load, PCV_OT_draw, PCV_OT_erase, PCV_OT_render, PCV_OT_render_passes, PCV_OT_render_animation, PCV_OT_convert, PCV_OT_reload, PCV_OT_export,
     PCV_OT_filter_simplify, PCV_OT_filter_remove_color, PCV_OT_filter_remove_color_delete_selected, PCV_OT_filter_remove_color_deselect,
+    PCV_OT_filter_outliers_statistical, PCV_OT_filter_outliers_radius, PCV_OT_filter_estimate_normals,
     PCV_OT_filter_project, PCV_OT_filter_merge, PCV_OT_filter_boolean_intersect, PCV_OT_filter_boolean_exclude,
     PCV_OT_edit_start, PCV_OT_edit_update, PCV_OT_edit_end, PCV_OT_edit_cancel,
-    PCV_OT_sequence_preload, PCV_OT_sequence_clear, PCV_OT_generate_point_cloud, PCV_OT_reset_runtime,
+    PCV_OT_sequence_preload, PCV_OT_sequence_clear, PCV_OT_generate_point_cloud, PCV_OT_generate_batch, PCV_OT_reset_runtime,
     PCV_OT_color_adjustment_shader_reset, PCV_OT_color_adjustment_shader_apply, PCV_OT_filter_join,
     
     PCV_PT_development,
@@ -10868,6 +12631,8 @@ def register():
 def unregister():
     PCVSequence.deinit()
     PCVManager.deinit()
+    PCVTextureSampler.clear()
+    PCVRasterizer.clear()
     
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)